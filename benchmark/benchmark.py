@@ -1,9 +1,157 @@
 import subprocess
 import re
 import sys
+import os
+import glob
+import shutil
+import hashlib
+import queue
+import json
+import statistics
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+from prover_worker import ProverWorker
+from resource_monitor import ProcessTreeMonitor
+from results_store import ResultsStore
+import r1cs
+import ptau
 
 regex_circuit_info = re.compile(r'(linear constraints|non-linear constraints|wires): (\d+)')
-regex_avg_times = re.compile(r'(Avg\. .* time):\s*([0-9\.]*) ms')
+regex_phase = re.compile(r'phase (\w+): wall ([0-9\.]+) ms, cpu ([0-9\.]+) ms, peak rss (\d+) kB')
+
+CIRCUIT_DIR = '../circom_snarkjs_workdir'
+BUILD_DIR = CIRCUIT_DIR + '/build'
+CACHE_DIR = CIRCUIT_DIR + '/.cache'
+PTAU_FILE = CIRCUIT_DIR + '/powersOfTau28_hez_final_23.ptau'
+PTAU_CACHE_DIR = CIRCUIT_DIR + '/.ptau'
+
+CSV_HEADER = ';'.join(
+    ['vector length', 'optimization', 'lin. constr.', 'non-lin. constr.', 'P time', 'V time', 'startup time', 'key load time', 'cold P time', 'cold V time'] +
+    [f'{phase} {stat}' for phase in ['P', 'V'] for stat in ['median', 'p95', 'stddev', 'ci low', 'ci high']] +
+    ['samples'] +
+    [f'{phase} {stat}' for phase in ['compile', 'setup', 'extract_vkey'] for stat in ['wall', 'cpu', 'peak rss']] +
+    ['witness wall', 'witness cpu', 'witness peak rss', 'proving wall', 'proving cpu', 'proving peak rss', 'worker peak rss']
+)
+COMPILE_ONLY_CSV_HEADER = 'vector length;optimization;lin. constr.;non-lin. constr.;wires;compile wall;compile cpu;compile peak rss'
+BREAKDOWN_CSV_HEADER = 'vector length;optimization;component;depth;constraints;own constraints;wires;own wires'
+BREAKDOWN_DEPTH = 4 # deeper components (e.g. the levels of the recursive NTT) are only included in the totals
+RECORDS_CSV_HEADER = 'vector length;optimization;repetition;test case;P time;V time;witness wall;proving wall;witness peak rss;proving peak rss'
+
+COMPILE_PHASES = ['compile', 'setup', 'extract_vkey'] # make targets run one after another by the docker-compose command 'compile'
+
+CONFIDENCE_LEVEL = 0.95
+BOOTSTRAP_RESAMPLES = 10000
+
+BUILD_ARTIFACTS = [
+    'main.r1cs',
+    'main.sym',
+    'main_js',
+    'circuit_final.zkey',
+    'verification_key.json',
+]
+
+OPTIONS = [
+    {
+        'options': ['--help', '-h'],
+        'needs_parameter': False,
+        'maps_to': 'help',
+        'description': 'Prints this message'
+    },
+    {
+        'options': ['--no-cache'],
+        'needs_parameter': False,
+        'maps_to': 'no_cache',
+        'description': 'Always compile the circuit and run the trusted setup,\n\t\t\teven if cached build artifacts exist.'
+    },
+    {
+        'options': ['--jobs', '-j'],
+        'needs_parameter': True,
+        'maps_to': 'jobs',
+        'description': 'Number of configurations benchmarked concurrently (default: 1).\n\t\t\tEach one gets its own build directory, key registration\n\t\t\tand test pattern file.'
+    },
+    {
+        'options': ['--pin'],
+        'needs_parameter': False,
+        'maps_to': 'pin',
+        'description': 'Pin each concurrent configuration to its own disjoint set of\n\t\t\tCPUs: the compilation and setup in docker, the pattern\n\t\t\tgenerator and the prover and verifier.'
+    },
+    {
+        'options': ['--compile-only'],
+        'needs_parameter': False,
+        'maps_to': 'compile_only',
+        'description': 'Only compile the circuits and report their constraints and\n\t\t\twires, without trusted setup and proving (cf. --sizes).'
+    },
+    {
+        'options': ['--sizes', '-s'],
+        'needs_parameter': True,
+        'maps_to': 'sizes',
+        'description': 'Range of exponents of the vector lengths, e.g. 4-13 for\n\t\t\t2^4 to 2^13 (default: 4-13).'
+    },
+    {
+        'options': ['--test-cases', '-m'],
+        'needs_parameter': True,
+        'maps_to': 'test_cases',
+        'description': 'Number of test cases generated per configuration (default: 10).'
+    },
+    {
+        'options': ['--warmup', '-w'],
+        'needs_parameter': True,
+        'maps_to': 'warmup',
+        'description': 'Number of test cases run before measuring (default: 1).\n\t\t\tThe first one is reported as cold run, all of them\n\t\t\tare excluded from the statistics.'
+    },
+    {
+        'options': ['--repetitions', '-r'],
+        'needs_parameter': True,
+        'maps_to': 'repetitions',
+        'description': 'Number of times all test cases are run and measured (default: 1).'
+    },
+    {
+        'options': ['--db'],
+        'needs_parameter': True,
+        'maps_to': 'db_file',
+        'description': 'Store every result in the given SQLite database. Configurations\n\t\t\tthat the run already measured are skipped and their stored\n\t\t\trows are printed instead.'
+    },
+    {
+        'options': ['--run-id'],
+        'needs_parameter': True,
+        'maps_to': 'run_id',
+        'description': 'Id of the run in the database (default: a new one, derived\n\t\t\tfrom the current time). Passing the id of an interrupted\n\t\t\trun resumes it.'
+    },
+    {
+        'options': ['--resume'],
+        'needs_parameter': False,
+        'maps_to': 'resume',
+        'description': 'Resume the latest run in the database for the current circuit\n\t\t\tsources on this host.'
+    },
+    {
+        'options': ['--force'],
+        'needs_parameter': False,
+        'maps_to': 'force',
+        'description': 'Resume a run even if it was started with different parameters\n\t\t\t(--sizes, --test-cases, --warmup, --repetitions, --jobs, --pin).'
+    },
+    {
+        'options': ['--export'],
+        'needs_parameter': False,
+        'maps_to': 'export',
+        'description': 'Do not benchmark, but print the results of a run in the database\n\t\t\t(--run-id, or the latest one with --resume) as CSV.'
+    },
+    {
+        'options': ['--breakdown'],
+        'needs_parameter': True,
+        'maps_to': 'breakdown_file',
+        'description': 'Write the constraints and wires per component instance of\n\t\t\tevery compiled circuit to the given CSV file (cf. r1cs.py).'
+    },
+    {
+        'options': ['--records'],
+        'needs_parameter': True,
+        'maps_to': 'records_file',
+        'description': 'Write the prover and verifier time of every measured\n\t\t\ttest case to the given CSV file.'
+    },
+]
+
+OPTIONS_DICT = { o:opt for opt in OPTIONS for o in opt['options'] }
 
 def eprint(*args, **kwargs):
     '''
@@ -24,6 +172,20 @@ def eprint_output_and_errormsg(output:str, errormsg:str):
     eprint(errormsg)
     eprint('---------------------------------------')
 
+def pinned(command:str, cpus:set[int]|None) -> str:
+    '''
+        Prefixes a shell command with `taskset`, so that it and all its
+        descendants only run on the given CPUs.
+
+        :param command: the command
+        :param cpus: the set of CPUs, or `None` to leave the command as is
+        :return: the (prefixed) command
+    '''
+    if cpus is None:
+        return command
+
+    return f'taskset -c {",".join([ str(cpu) for cpu in sorted(cpus) ])} {command}'
+
 def execute_command(command:str, **kwargs):
     '''
         Takes a command as string and executes it in a subprocess.
@@ -44,55 +206,527 @@ def execute_command(command:str, **kwargs):
         **kwargs
     )
 
-def set_key_files():
+def usage(*args):
+    '''
+        Prints the usage message (preceded by an optional error message)
+        to stderr and terminates the process with exit code 1.
+    '''
+    if len(args) > 0:
+        eprint(*args)
+
+    eprint(f'Usage: {sys.argv[0]} [Options]')
+    eprint()
+    eprint('Options:')
+    for opt in OPTIONS:
+        eprint(f'\t{", ".join(opt["options"])}\t{opt["description"]}')
+
+    sys.exit(1)
+
+def parse_cli_arguments(argv:list[str]) -> dict:
+    '''
+        Parses the command-line arguments into a dictionary that maps the
+        `maps_to` entries of `OPTIONS` to their values. Options without
+        parameter map to `True`. On error, the usage message is printed and
+        the execution is terminated.
+
+        :param argv: The CLI arguments as obtained by e.g. `sys.argv`
+        :return: the configuration dictionary
+    '''
+    config = {}
+
+    i = 1
+    while i < len(argv):
+        if argv[i] not in OPTIONS_DICT:
+            usage(f'Unable to parse option "{argv[i]}"')
+
+        opt = OPTIONS_DICT[argv[i]]
+
+        if opt['needs_parameter']:
+            if i+1 >= len(argv):
+                usage(f'Option "{argv[i]}" needs a parameter')
+            config[opt['maps_to']] = argv[i+1]
+            i += 2
+        else:
+            config[opt['maps_to']] = True
+            i += 1
+
+    return config
+
+def int_option(config:dict, key:str, name:str, default:int, minimum:int) -> int:
+    '''
+        Reads an integer option from the configuration dictionary.
+        On error, the usage message is printed and the execution is terminated.
+
+        :param config: the configuration, cf. `parse_cli_arguments`
+        :param key: the key of the option in `config`
+        :param name: name of the option for error messages
+        :param default: value if the option was not given
+        :param minimum: smallest allowed value
+        :return: the value of the option
+    '''
+    try:
+        value = int(config.get(key, default))
+    except ValueError:
+        usage(f'The {name} needs to be an integer')
+
+    if value < minimum:
+        usage(f'The {name} needs to be at least {minimum}')
+
+    return value
+
+def hash_files(paths:list[str]) -> str:
+    '''
+        Computes a SHA-256 digest over the names and contents of the given files.
+
+        :param paths: paths to the files, hashed in the given order
+        :return: the hex digest
+    '''
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(path.encode())
+        with open(path, 'rb') as f:
+            h.update(f.read())
+
+    return h.hexdigest()
+
+def circuit_source_hash() -> str:
+    '''
+        Computes a digest over everything the build of the circuit depends on
+        besides its parameters: the `.circom` files of the project, the
+        circuits of circomlib and the Makefile.
+
+        :return: the hex digest
+    '''
+    sources = sorted(
+        path for path in glob.glob(CIRCUIT_DIR + '/*.circom')
+        if not os.path.basename(path).startswith('.tmp.')
+    )
+    sources += sorted(glob.glob(CIRCUIT_DIR + '/circomlib/circuits/**/*.circom', recursive=True))
+    sources += [CIRCUIT_DIR + '/Makefile']
+
+    return hash_files(sources)
+
+def ptau_fingerprint(path:str=PTAU_FILE) -> str:
+    '''
+        Computes a fingerprint of a powers-of-tau file. Since these files are
+        several gigabytes large, only their name, their size and their first
+        and last MiB are hashed instead of the whole content.
+
+        :param path: path to the ptau file
+        :return: the hex digest, or 'missing' if the file does not exist
+    '''
+    if not os.path.exists(path):
+        return 'missing'
+
+    chunk = 2**20
+    size = os.path.getsize(path)
+
+    h = hashlib.sha256()
+    h.update(f'{os.path.basename(path)}:{size}'.encode())
+    with open(path, 'rb') as f:
+        h.update(f.read(chunk))
+        f.seek(max(0, size - chunk))
+        h.update(f.read(chunk))
+
+    return h.hexdigest()
+
+def build_cache_key(n:int, optimization:str) -> str:
+    '''
+        Computes the key under which the build artifacts for one configuration
+        are cached. It covers the circuit sources (cf. `circuit_source_hash`),
+        the vector length, the compilation flags and the ptau file, so any
+        change to one of them leads to a new build.
+
+        :param n: vector length
+        :param optimization: compilation flags for circom
+        :return: the cache key as hex digest
+    '''
+    h = hashlib.sha256()
+    h.update(circuit_source_hash().encode())
+    h.update(f'N={n};CFLAGS={optimization};'.encode())
+    h.update(ptau_fingerprint().encode())
+
+    return h.hexdigest()
+
+def restore_cached_build(key:str, build_dir:str=BUILD_DIR) -> str|None:
+    '''
+        Looks up the build artifacts for a cache key and, if they exist,
+        places them in the build directory, replacing its content.
+        Files are hard-linked where possible to avoid copying large zkeys.
+
+        :param key: the cache key, cf. `build_cache_key`
+        :param build_dir: the build directory to place the artifacts in
+        :return: the compiler output stored with the artifacts, or None on a cache miss
+    '''
+    entry = os.path.join(CACHE_DIR, key)
+    if not os.path.isdir(entry):
+        return None
+
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+    copy_artifacts(entry, build_dir)
+
+    with open(os.path.join(entry, 'compiler_output.txt'), 'r') as f:
+        return f.read()
+
+def store_build_in_cache(key:str, compiler_output:str, build_dir:str=BUILD_DIR):
+    '''
+        Stores the artifacts of the build directory together with the
+        compiler output under the given cache key. The entry is first
+        assembled in a temporary directory and then renamed, so that an
+        interrupted run never leaves an incomplete entry behind.
+
+        :param key: the cache key, cf. `build_cache_key`
+        :param compiler_output: the stdout of the compilation
+        :param build_dir: the build directory containing the artifacts
+    '''
+    entry = os.path.join(CACHE_DIR, key)
+    tmp_entry = entry + f'.tmp{os.getpid()}_{os.path.basename(build_dir)}'
+
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    os.makedirs(tmp_entry)
+    copy_artifacts(build_dir, tmp_entry)
+
+    with open(os.path.join(tmp_entry, 'compiler_output.txt'), 'w') as f:
+        f.write(compiler_output)
+
+    shutil.rmtree(entry, ignore_errors=True)
+    os.rename(tmp_entry, entry)
+
+def copy_artifacts(src_dir:str, dst_dir:str):
+    '''
+        Copies the build artifacts (cf. `BUILD_ARTIFACTS`) from one directory
+        to another, using hard links where the file system allows it.
+
+        :param src_dir: directory containing the artifacts
+        :param dst_dir: existing directory to copy the artifacts to
+    '''
+    def link_or_copy(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    for artifact in BUILD_ARTIFACTS:
+        src = os.path.join(src_dir, artifact)
+        dst = os.path.join(dst_dir, artifact)
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, copy_function=link_or_copy)
+        else:
+            link_or_copy(src, dst)
+
+def run_compile_phases(n:int, optimization:str, build_dir:str, phases:list[str], keep_build:bool=False, ptau_file:str|None=None, cpus:set[int]|None=None) -> tuple[str, str]:
+    '''
+        Runs make targets of `COMPILE_PHASES` via the docker-compose command
+        'compile', each one wrapped by `resource_monitor.py`.
+
+        The container does not inherit the affinity of the docker client, so
+        the CPUs are passed to it as `CPUS`, and the 'compile' command runs
+        every phase with `taskset`.
+
+        :param n: vector length
+        :param optimization: compilation flags for circom
+        :param build_dir: the build directory, must be located inside `CIRCUIT_DIR`
+        :param phases: the make targets to run, in order
+        :param keep_build: whether to keep the content of the build directory, e.g. to run the setup after the compilation
+        :param ptau_file: the powers-of-tau file for the setup, must be located inside `CIRCUIT_DIR` (default: the one of the Makefile)
+        :param cpus: optional set of CPUs the phases are pinned to
+        :return: a tuple of the stdout and the stderr of the make targets
+    '''
+    container_path = lambda path: './' + os.path.relpath(path, CIRCUIT_DIR) # the Makefile runs inside CIRCUIT_DIR
+
+    env = f'-e N={n} -e CFLAGS={optimization} -e DIR={container_path(build_dir)} -e PHASES="{" ".join(phases)}"'
+    if keep_build:
+        env += ' -e KEEP_BUILD=1'
+    if ptau_file is not None:
+        env += f' -e PTAU={container_path(ptau_file)}'
+    if cpus is not None:
+        env += f' -e CPUS={",".join([ str(cpu) for cpu in sorted(cpus) ])}'
+
+    docker = execute_command(f'docker compose run --remove-orphans {env} compile', shell=True)
+    output = docker.stdout.read().decode()
+    errormsg = docker.stderr.read().decode()
+
+    return (output, errormsg)
+
+def compile_circuit(n:int, optimization:str, use_cache:bool=True, build_dir:str=BUILD_DIR, cpus:set[int]|None=None) -> str:
+    '''
+        Makes sure the build directory contains the compiled circuit and the
+        prover and verifier keys for the given configuration.
+
+        If the artifacts for the configuration are cached (cf. `build_cache_key`),
+        they are restored from the cache. Otherwise, the circuit is compiled and
+        the trusted setup is run via the docker-compose command 'compile', and
+        the result is added to the cache.
+
+        Between the compilation and the setup, the smallest sufficient power of
+        tau is read from the compiled circuit, and a ptau file of exactly this
+        power is prepared from `PTAU_FILE` (cf. `ptau.prepare`). Truncated ptau
+        files are kept in `PTAU_CACHE_DIR`, so only configurations that need
+        the full power ever open `PTAU_FILE` for the setup.
+
+        :param n: vector length
+        :param optimization: compilation flags for circom
+        :param use_cache: whether to look up and store artifacts in the cache
+        :param build_dir: the build directory, must be located inside `CIRCUIT_DIR`
+        :param cpus: optional set of CPUs the compilation and the setup are pinned to
+        :return: the output of the compiler
+    '''
+    key = build_cache_key(n, optimization)
+
+    if use_cache:
+        output = restore_cached_build(key, build_dir)
+        if output is not None:
+            return output
+
+    (output, errormsg) = run_compile_phases(n, optimization, build_dir, ['compile'], cpus=cpus)
+
+    if len(regex_circuit_info.findall(output)) == 0:
+        eprint('Error: It looks like the circuit could not be compiled.')
+        eprint('Here is the output of the compiler:\n')
+        eprint_output_and_errormsg(output, errormsg)
+        sys.exit(1)
+
+    power = ptau.required_power(os.path.join(build_dir, 'main.r1cs'))
+    ptau_file = ptau.prepare(PTAU_FILE, power, os.path.join(PTAU_CACHE_DIR, ptau_fingerprint()[:16]))
+
+    (setup_output, errormsg) = run_compile_phases(n, optimization, build_dir, ['setup', 'extract_vkey'], keep_build=True, ptau_file=ptau_file, cpus=cpus)
+    output += setup_output
+
+    if not os.path.exists(os.path.join(build_dir, 'verification_key.json')):
+        eprint(f'Error: It looks like the trusted setup with {os.path.basename(ptau_file)} (power {power} needed) failed.')
+        eprint('Here is the output of the setup:\n')
+        eprint_output_and_errormsg(setup_output, errormsg)
+        sys.exit(1)
+
+    if use_cache:
+        store_build_in_cache(key, output, build_dir)
+
+    return output
+
+def circuit_breakdown(n:int, optimization:str, directory:str) -> list[tuple]:
+    '''
+        Computes the constraints and wires per component instance of a compiled
+        circuit (cf. `r1cs.analyze`), with component arrays merged and down to
+        `BREAKDOWN_DEPTH`.
+
+        :param n: vector length
+        :param optimization: compilation flags for circom
+        :param directory: directory containing `main.r1cs` and `main.sym`
+        :return: one row per component, in the order of `BREAKDOWN_CSV_HEADER`
+    '''
+    rows = r1cs.analyze(os.path.join(directory, 'main.r1cs'), os.path.join(directory, 'main.sym'), max_depth=BREAKDOWN_DEPTH)
+
+    return [
+        (n, optimization, component, depth, total_c, own_c, total_w, own_w)
+        for (component, depth, own_c, total_c, own_w, total_w) in rows
+    ]
+
+def compile_only(n:int, optimization:str, use_cache:bool=True, build_dir:str=BUILD_DIR, cpus:set[int]|None=None, breakdown:list|None=None, **kwargs) -> tuple:
+    '''
+        Only compiles the circuit for the given configuration and returns its
+        size, without trusted setup and proving. This is much faster than
+        `benchmark_with_params` and therefore suited for large vector lengths.
+
+        If a complete build of the configuration is cached, its compiler output
+        is used and nothing is compiled. The result of a compile-only run is
+        not cached, since it lacks the keys. The compiled circuit stays in the
+        build directory.
+
+        The output is a tuple in the order of `COMPILE_ONLY_CSV_HEADER`:
+            - vector length
+            - optimization flags
+            - number of linear constraints, non-linear constraints and wires
+            - wall time, CPU time (in ms) and peak RSS (in kB) of the compilation, cf. `resource_monitor.py`
+
+        :param n: vector length
+        :param optimization: compilation flags for circom
+        :param use_cache: whether to look up the compiler output in the cache
+        :param build_dir: the build directory, must be located inside `CIRCUIT_DIR`
+        :param cpus: optional set of CPUs the compilation is pinned to
+        :param breakdown: optional list to which the breakdown of the circuit is appended, cf. `circuit_breakdown`
+        :param kwargs: ignored, for compatibility with `benchmark_with_params` in `run_sweep`
+        :return: a tuple of the metrics described above
+    '''
+    cache_entry = os.path.join(CACHE_DIR, build_cache_key(n, optimization))
+    cached_output = os.path.join(cache_entry, 'compiler_output.txt')
+
+    if use_cache and os.path.exists(cached_output):
+        with open(cached_output, 'r') as f:
+            output = f.read()
+        circuit_dir = cache_entry
+    else:
+        circuit_dir = build_dir
+        (output, errormsg) = run_compile_phases(n, optimization, build_dir, ['compile'], cpus=cpus)
+
+        if len(regex_circuit_info.findall(output)) == 0:
+            eprint('Error: It looks like the circuit could not be compiled.')
+            eprint('Here is the output of the compiler:\n')
+            eprint_output_and_errormsg(output, errormsg)
+            sys.exit(1)
+
+    circuit_info = {key: int(value) for key, value in regex_circuit_info.findall(output)}
+    phase = { p: (wall, cpu, rss) for (p, wall, cpu, rss) in regex_phase.findall(output) }.get('compile', ('', '', ''))
+
+    if breakdown is not None:
+        breakdown += circuit_breakdown(n, optimization, circuit_dir)
+
+    return (
+        n,
+        optimization,
+        circuit_info['linear constraints'],
+        circuit_info['non-linear constraints'],
+        circuit_info.get('wires', ''),
+        *phase
+    )
+
+def node_environment(build_dir:str) -> dict:
+    '''
+        Returns the environment for calls of the node app that belong to the
+        circuit in the given build directory. Every build directory other
+        than the default one gets its own persistant storage inside of it,
+        so that concurrent configurations do not overwrite each other's keys.
+
+        :param build_dir: the build directory of the circuit
+        :return: a copy of the current environment, possibly extended by VEINSNARK_STORAGE
+    '''
+    env = dict(os.environ)
+    if build_dir != BUILD_DIR:
+        env['VEINSNARK_STORAGE'] = os.path.join(build_dir, '.node-persist')
+
+    return env
+
+def set_key_files(build_dir:str=BUILD_DIR, cpus:set[int]|None=None):
     '''
         Calles the node app and specifies the paths to the  prover and
-        verifier keys of the SNARK.
+        verifier keys and the wasm file of the SNARK in the given build directory.
+
+        :param build_dir: the build directory of the circuit
+        :param cpus: optional set of CPUs the node app is pinned to
     '''
-    execute_command('node ../node_app set_zkey_file ../circom_snarkjs_workdir/build/circuit_final.zkey')
-    execute_command('node ../node_app set_vkey_file ../circom_snarkjs_workdir/build/verification_key.json')
+    env = node_environment(build_dir)
+
+    for (command, file) in [
+        ('set_zkey_file', 'circuit_final.zkey'),
+        ('set_vkey_file', 'verification_key.json'),
+        ('set_wasm_file', 'main_js/main.wasm'),
+    ]:
+        execute_command(pinned(f'node ../node_app {command} {os.path.join(build_dir, file)}', cpus), shell=True, env=env).communicate()
+
+def summarize(times:list[float]) -> list[float]:
+    '''
+        Computes robust statistics of a series of measurements: the median,
+        the 95th percentile, the sample standard deviation and a confidence
+        interval for the mean at level `CONFIDENCE_LEVEL`.
+
+        The confidence interval is obtained with the percentile bootstrap
+        (`BOOTSTRAP_RESAMPLES` resamples), which makes no assumption on the
+        distribution of the times. The resampling is seeded, so the same
+        measurements always give the same interval.
 
-def benchmark_with_params(n:int, optimization:str, m:int=10) -> tuple[int, str, int, int, float, float]:
+        :param times: the measured times, at least one
+        :return: the list [median, p95, stddev, ci low, ci high]
+    '''
+    times = np.array(times, dtype=np.float64)
+
+    rng = np.random.default_rng(0)
+    means = rng.choice(times, size=(BOOTSTRAP_RESAMPLES, len(times))).mean(axis=1)
+    alpha = (1 - CONFIDENCE_LEVEL) / 2
+
+    return [
+        float(np.median(times)),
+        float(np.percentile(times, 95)),
+        float(times.std(ddof=1)) if len(times) > 1 else 0.0,
+        float(np.quantile(means, alpha)),
+        float(np.quantile(means, 1-alpha)),
+    ]
+
+def benchmark_with_params(n:int, optimization:str, m:int=10, warmup:int=1, repetitions:int=1, use_cache:bool=True, build_dir:str=BUILD_DIR, cpus:set[int]|None=None, records:list|None=None, breakdown:list|None=None) -> tuple:
     '''
         Takes parameters to run one test pattern (i.e. a set of multiple
         test cases of equal size) and executes the benchmarking.
 
         The following steps are taken:
-            - Compile the circuit for size n using the given flags. (This is done via the docker-compose command 'compile'. A Makefile inside the Dockercontainer then takes care of everything.)
+            - Compile the circuit for size n using the given flags. (This is done via the docker-compose command 'compile'. A Makefile inside the Dockercontainer then takes care of everything.) If the circuit was built before with the same sources and parameters, the cached artifacts are used instead (cf. `compile_circuit`).
+            - Register the prover and verifier keys of the build directory in the node app (cf. `set_key_files`)
             - Generate a test pattern for size n with m test cases. For details, refer to the documentation of the pattern generator module
-            - Call the node app for testing with the given test pattern. At the end, this will print the average prover and verifier time.
+            - Start a prover worker of the node app (cf. `ProverWorker`) and load the keys into it
+            - Run `warmup` test cases without measuring them, then run all test cases of the test pattern `repetitions` times.
+
+        All files of the run (build artifacts, key registration and test pattern)
+        live in `build_dir`, so several runs with different build directories can
+        execute concurrently.
 
         The individual steps may produce output like information on the circuit size or execution times. This output is read and parsed using regular expressions.
 
-        The output is a six-tuple containing the relevant metrics in the order:
+        The first warmup test case is run right after the keys are loaded and is
+        reported separately as cold run, since it includes one-time costs like
+        setting up the curve and instantiating the wasm module. The statistics
+        only cover the measured (warm) test cases, so startup, key loading and
+        JIT warmup are not folded into the prover time.
+
+        The output is a tuple containing the relevant metrics in the order (all times in ms):
             - vector length
             - optimization flags
             - number of linear constraints in the circuit
             - number of non-linear constraints in the circuit
-            - average prover time (taken over all n test cases)
-            - average verifier time (taken over all n test cases)
+            - average prover time (taken over the measured test cases)
+            - average verifier time (taken over the measured test cases)
+            - startup time of the prover worker (from spawning node until it is ready)
+            - time for loading the keys into the prover worker
+            - prover time of the cold run
+            - verifier time of the cold run
+            - median, p95, stddev and confidence interval of the prover time (cf. `summarize`)
+            - the same statistics of the verifier time
+            - number of measured test cases, i.e. `m * repetitions`
+            - wall time, CPU time and peak RSS (in kB) of each phase in `COMPILE_PHASES`, as measured in the docker container by `resource_monitor.py` (empty if the build was cached before the phases were measured)
+            - average wall time and CPU time and the largest peak RSS (in kB) of the witness computation
+            - average wall time and CPU time and the largest peak RSS (in kB) of the Groth16 prover, without the witness computation
+            - peak RSS (in kB) of the prover worker and its descendants during all measured test cases, sampled from `/proc`
+
+        The peak RSS of the witness computation and the prover is measured by
+        the node app for every test case on its own: it resets the peak RSS of
+        its process (`/proc/self/clear_refs`) before each phase and reads it
+        (`VmHWM`) afterwards. These columns are empty if the kernel does not
+        support this.
+
+        If `records` is given, one tuple in the order of `RECORDS_CSV_HEADER` is
+        appended to it for every measured test case.
 
         :param n:  vector length
         :param cflags: compilation flags for circom (mostly just '--O1' or '--O2')
         :param m: number of test cases to be generated for this test pattern
-        :return: a six-tuple of relevant metrics (see description above)
+        :param warmup: number of test cases run before measuring, at least 1
+        :param repetitions: number of times all test cases are measured
+        :param use_cache: whether to use cached build artifacts
+        :param build_dir: the build directory, must be located inside `CIRCUIT_DIR`
+        :param cpus: if given, every step (compilation, setup, pattern generation and the node app) is pinned to this set of CPUs
+        :param records: optional list to which the per-case measurements are appended
+        :param breakdown: optional list to which the breakdown of the circuit is appended, cf. `circuit_breakdown`
+        :return: a tuple of relevant metrics (see description above)
     '''
-    docker = execute_command(f'docker compose run --remove-orphans -e N={n} -e CFLAGS={optimization} compile')
-    output = docker.stdout.read().decode()
-    errormsg = docker.stderr.read().decode()
+    assert warmup >= 1, 'At least one warmup test case is needed for the cold run'
+
+    output = compile_circuit(n, optimization, use_cache, build_dir, cpus)
 
     res = regex_circuit_info.findall(output)
     circuit_info = {key: int(value) for key, value in res}
 
-    if len(circuit_info) == 0:
-        eprint('Error: It looks like the circuit could not be compiled.')
-        eprint('Here is the output of the compiler:\n')
-        eprint_output_and_errormsg(output, errormsg)
-        sys.exit(1)
+    # builds cached before the phases were measured have no phase lines, their columns stay empty
+    phases = {
+        phase: {'wall': float(wall), 'cpu': float(cpu), 'peak_rss': int(rss)}
+        for (phase, wall, cpu, rss) in regex_phase.findall(output)
+    }
+
+    if breakdown is not None:
+        breakdown += circuit_breakdown(n, optimization, build_dir)
+
 
+    set_key_files(build_dir, cpus)
 
+    pattern_file = os.path.join(build_dir, '.tmp.mytestpattern.json')
     pattern_generator = execute_command(
-        f'python3 ../pattern_generation/pattern_generator.py test_pattern {n} {m} > .tmp.mytestpattern.json',
+        pinned(f'python3 ../pattern_generation/pattern_generator.py test_pattern {n} {m} fft', cpus) + f' > {pattern_file}',
         shell=True
     )
     errormsg = pattern_generator.stderr.read().decode()
@@ -104,41 +738,210 @@ def benchmark_with_params(n:int, optimization:str, m:int=10) -> tuple[int, str,
         sys.exit(1)
 
 
-    node = execute_command('node ../node_app test .tmp.mytestpattern.json')
-    output = node.stdout.read().decode()
-    errormsg = node.stderr.read().decode()
+    with open(pattern_file, 'r') as f:
+        pattern = json.load(f)
+
+    testcases = [
+        {
+            'model': pattern['model'],
+            'probe': pattern['probes'][i],
+            'miura': pattern['miura'][i],
+            'convolution': pattern['convolutions'][i],
+        }
+        for i in range(len(pattern['probes']))
+    ]
+
+    try:
+        with ProverWorker(
+            '../node_app',
+            cpus=cpus,
+            env=node_environment(build_dir)
+        ) as worker:
+            key_load_time = worker.load()
+            warmup_results = [ worker.test(testcases[i % m]) for i in range(warmup) ]
+            with ProcessTreeMonitor(worker.process.pid) as monitor:
+                results = [ (r, i, worker.test(testcases[i])) for r in range(repetitions) for i in range(m) ]
+            startup_time = worker.startup_time
+            errormsg = worker.stderr()
+    except RuntimeError as e:
+        eprint(f'Error: Could not run test pattern: {e}')
+        sys.exit(1)
 
-    if len(errormsg) > 0:
-        eprint('Error: Could not run test pattern.')
+    all_results = warmup_results + [ res for (_, _, res) in results ]
+    if not all( [res['passed'] for res in all_results] ):
+        eprint(f'Error: {sum([not res["passed"] for res in all_results])}/{len(all_results)} test cases failed.')
         eprint('Here is the output of the node app:\n')
-        eprint_output_and_errormsg(output, errormsg)
+        eprint_output_and_errormsg('', errormsg)
         sys.exit(1)
 
-    res = regex_avg_times.findall(output)
-    avg_times = {key: float(value) for key, value in res}
+    cold = warmup_results[0]
+    prover_times = [ res['prover_time'] for (_, _, res) in results ]
+    verifier_times = [ res['verifier_time'] for (_, _, res) in results ]
 
-    if any( [kw not in avg_times for kw in ['Avg. prover time', 'Avg. verifier time']]):
-        eprint('Error: Could not parse Avg. prover time or Avg. verifier time from output of node app.')
-        eprint('Here is the output of the node app:\n')
-        eprint_output_and_errormsg(output, errormsg)
-        sys.exit(1)
+    if records is not None:
+        records += [
+            (n, optimization, r, i, res['prover_time'], res['verifier_time'], res['witness_time'], res['proving_time'], *[ '' if res.get(key) is None else res[key] for key in ['witness_peak_rss', 'proving_peak_rss'] ])
+            for (r, i, res) in results
+        ]
+
+    mean_of = lambda key: statistics.mean([ res[key] for (_, _, res) in results ])
+    peaks = lambda key: [ res.get(key) for (_, _, res) in results if res.get(key) is not None ]
+    max_of = lambda key: max(peaks(key)) if len(peaks(key)) > 0 else ''
 
     return (
         n,
         optimization,
         circuit_info['linear constraints'],
         circuit_info['non-linear constraints'],
-        avg_times['Avg. prover time'],
-        avg_times['Avg. verifier time']
+        statistics.mean(prover_times),
+        statistics.mean(verifier_times),
+        startup_time,
+        key_load_time,
+        cold['prover_time'],
+        cold['verifier_time'],
+        *summarize(prover_times),
+        *summarize(verifier_times),
+        len(results),
+        *[ phases.get(phase, {}).get(stat, '') for phase in COMPILE_PHASES for stat in ['wall', 'cpu', 'peak_rss'] ],
+        mean_of('witness_time'),
+        mean_of('witness_cpu_time'),
+        max_of('witness_peak_rss'),
+        mean_of('proving_time'),
+        mean_of('proving_cpu_time'),
+        max_of('proving_peak_rss'),
+        monitor.result()['peak_rss']
     )
 
-def main():
+def partition_cpus(jobs:int) -> list[set[int]]:
+    '''
+        Splits the CPUs available to this process into `jobs` disjoint sets
+        of (almost) equal size, consisting of consecutive CPU numbers.
+
+        :param jobs: number of sets
+        :return: a list of `jobs` sets of CPU numbers
+    '''
+    cpus = sorted(os.sched_getaffinity(0))
+
+    if len(cpus) < jobs:
+        eprint(f'Error: Cannot pin {jobs} concurrent configurations to only {len(cpus)} CPUs.')
+        sys.exit(1)
+
+    return [ set(cpus[i*len(cpus)//jobs : (i+1)*len(cpus)//jobs]) for i in range(jobs) ]
+
+def run_sweep(configurations:list[tuple[int, str]], jobs:int=1, pin:bool=False, records_file:str|None=None, store:ResultsStore|None=None, benchmark=benchmark_with_params, breakdown_file:str|None=None, **params):
+    '''
+        Benchmarks the given configurations and prints one CSV row for each.
+
+        With `jobs == 1`, the configurations run one after another in the
+        default build directory. Otherwise, up to `jobs` configurations run
+        concurrently, each in its own build directory inside `CIRCUIT_DIR`.
+        If `pin` is set, every concurrent slot gets its own disjoint set of
+        CPUs (cf. `partition_cpus`), and everything a configuration runs
+        (compilation and setup in docker, pattern generation, prover and
+        verifier) is pinned to the CPUs of its slot. Hence, the compilation of
+        one configuration does not compete with the measured proofs of another.
+        Only the truncation of ptau files (cf. `ptau.prepare`), which is done
+        once per power and mostly I/O, runs unpinned in this process.
+
+        Rows are printed in the order of `configurations`, each one as soon
+        as it and all configurations before it are finished. If `records_file`
+        is given, the per-case measurements are written to it in the same order
+        (cf. `RECORDS_CSV_HEADER`). Likewise, if `breakdown_file` is given,
+        the constraints and wires per component are written to it
+        (cf. `BREAKDOWN_CSV_HEADER`).
+
+        If a results store is given, every finished row is saved in its current
+        run right away. Configurations the run already contains are not measured
+        again; their stored rows are printed instead (without per-case records
+        and breakdown).
+
+        :param configurations: list of (vector length, optimization) pairs
+        :param jobs: maximum number of concurrent configurations
+        :param pin: whether to pin concurrent configurations to disjoint CPUs
+        :param records_file: optional path of a CSV file for the per-case measurements
+        :param store: optional results store with a started run (cf. `ResultsStore.begin_run`)
+        :param benchmark: the function measuring one configuration, `benchmark_with_params` or `compile_only`
+        :param breakdown_file: optional path of a CSV file for the breakdown of the circuits
+        :param params: further keyword arguments for `benchmark`, e.g. `m` or `use_cache`
+    '''
+    columns = CSV_HEADER.split(';')
+
+    stored = {}
+    if store is not None:
+        for (n, opt) in configurations:
+            row = store.lookup(n, opt)
+            if row is not None:
+                stored[(n, opt)] = [ row.get(col, '') for col in columns ]
+
+    if len(stored) > 0:
+        eprint(f'Skipping {len(stored)} configurations that were already measured in run "{store.run_id}".')
+
+    # additional CSV files, filled by `benchmark` through the keyword argument of the same name
+    tables = {}
+    for (name, path, header) in [('records', records_file, RECORDS_CSV_HEADER), ('breakdown', breakdown_file, BREAKDOWN_CSV_HEADER)]:
+        if path is not None:
+            tables[name] = open(path, 'w')
+            print(header, file=tables[name], flush=True)
+
+    def emit(n, opt, res, table_rows):
+        print(';'.join([str(val) for val in res]), flush=True)
+        if store is not None and (n, opt) not in stored:
+            store.save(n, opt, dict(zip(columns, res)))
+        for (name, rows) in table_rows.items():
+            for row in rows:
+                print(';'.join([str(val) for val in row]), file=tables[name])
+            tables[name].flush()
+
+    def run(n, opt, **kwargs):
+        table_rows = { name: [] for name in tables }
+        res = benchmark(n, opt, **kwargs, **table_rows, **params)
+        return (res, table_rows)
+
+    if jobs == 1:
+        for (n, opt) in configurations:
+            if (n, opt) in stored:
+                emit(n, opt, stored[(n, opt)], {})
+                continue
+
+            eprint(f'Benchmarking for size {n} with {opt}...\r', end='')
+            emit(n, opt, *run(n, opt))
+    else:
+        slots = queue.Queue()
+        for cpus in (partition_cpus(jobs) if pin else [None]*jobs):
+            slots.put(cpus)
+
+        def run_in_slot(n, opt):
+            cpus = slots.get()
+            try:
+                build_dir = os.path.join(CIRCUIT_DIR, f'build_{n}_{opt.lstrip("-")}')
+                return run(n, opt, build_dir=build_dir, cpus=cpus)
+            finally:
+                slots.put(cpus)
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                (n, opt): executor.submit(run_in_slot, n, opt)
+                for (n, opt) in configurations if (n, opt) not in stored
+            }
+
+            for (i, (n, opt)) in enumerate(configurations):
+                if (n, opt) in stored:
+                    emit(n, opt, stored[(n, opt)], {})
+                    continue
+
+                eprint(f'Benchmarking {len(futures)} configurations with {jobs} jobs, {i} done...\r', end='')
+                emit(n, opt, *futures[(n, opt)].result())
+
+    for table in tables.values():
+        table.close()
+
+def main(argv:list[str]):
     '''
         Main Function of this Program.
 
         The following steps are taken:
-            - Set the prover and verifier keys in the node app
-            - For specified problem sizes, benchmark the circuit and store the result
+            - Parse the command-line arguments (cf. `OPTIONS`)
+            - For specified problem sizes, benchmark the circuit (cf. `run_sweep`)
             - print the results as CSV
 
         As soon as a one measurement is finished, its result will be printed to
@@ -146,19 +949,70 @@ def main():
         are available. The output is in CSV format.
     '''
 
-    print('vector length;optimization;lin. constr.;non-lin. constr.;P time;V time')
-
-    set_key_files()
-
-    benchmarks = []
-
-    for i in range(4, 14):
-        n = 2**i
-        for opt in ['--O1', '--O2']:
-            eprint(f'Benchmarking for size {n} with {opt}...\r', end='')
-            res = benchmark_with_params(n, opt)
-            print(';'.join([str(val) for val in res]))
-            benchmarks += res
+    config = parse_cli_arguments(argv)
+    if 'help' in config:
+        usage()
+
+    use_cache = 'no_cache' not in config
+
+    jobs = int_option(config, 'jobs', 'number of jobs', default=1, minimum=1)
+    m = int_option(config, 'test_cases', 'number of test cases', default=10, minimum=1)
+    warmup = int_option(config, 'warmup', 'number of warmup test cases', default=1, minimum=1)
+    repetitions = int_option(config, 'repetitions', 'number of repetitions', default=1, minimum=1)
+
+    try:
+        (smallest, largest) = [ int(e) for e in config.get('sizes', '4-13').split('-') ]
+    except ValueError:
+        usage('The sizes need to be given as range of exponents, e.g. 4-13')
+
+    if 'compile_only' in config:
+        ignored = [ key for key in ['db_file', 'records_file', 'pin', 'test_cases', 'warmup', 'repetitions'] if key in config ]
+        if len(ignored) > 0:
+            usage('The options --db, --records, --pin, -m, --warmup and --repetitions cannot be combined with --compile-only')
+
+    store = None
+    if 'db_file' in config:
+        store = ResultsStore(config['db_file'])
+        source_hash = circuit_source_hash()
+
+        run_id = config.get('run_id')
+        if run_id is None and 'resume' in config:
+            run_id = store.latest_run_id(source_hash)
+            if run_id is None:
+                usage('There is no run to resume in the database')
+
+        if 'export' in config:
+            if run_id is None:
+                usage('Specify the run to export with --run-id or --resume')
+            print(CSV_HEADER)
+            for row in store.export(run_id, CSV_HEADER.split(';')):
+                print(';'.join([str(val) for val in row]))
+            return
+
+        run_id = run_id or ResultsStore.new_run_id()
+        try:
+            parameters = {'m': m, 'warmup': warmup, 'repetitions': repetitions, 'sizes': [smallest, largest], 'jobs': jobs, 'pin': 'pin' in config}
+            store.begin_run(run_id, source_hash, parameters, force='force' in config)
+        except ValueError as e:
+            usage(str(e))
+        eprint(f'Storing results in run "{run_id}" of "{config["db_file"]}".')
+    elif any([ key in config for key in ['run_id', 'resume', 'export', 'force'] ]):
+        usage('The options --run-id, --resume, --export and --force need a database (--db)')
+
+    configurations = [ (2**i, opt) for i in range(smallest, largest+1) for opt in ['--O1', '--O2'] ]
+
+    if 'compile_only' in config:
+        print(COMPILE_ONLY_CSV_HEADER)
+        run_sweep(configurations, jobs, benchmark=compile_only, breakdown_file=config.get('breakdown_file'), use_cache=use_cache)
+        return
+
+    print(CSV_HEADER)
+
+    run_sweep(
+        configurations, jobs, 'pin' in config, config.get('records_file'), store,
+        breakdown_file=config.get('breakdown_file'),
+        m=m, warmup=warmup, repetitions=repetitions, use_cache=use_cache
+    )
 
 if __name__=='__main__':
-    main()
+    main(sys.argv)
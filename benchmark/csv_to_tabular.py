@@ -1,5 +1,8 @@
 import pandas as pd
+import numpy as np
+import json
 import sys
+import os
 
 REQUIRED_CSV_HEADERS = [
     'vector length',
@@ -10,46 +13,119 @@ REQUIRED_CSV_HEADERS = [
     'V time'
 ]
 
+KEY_COLUMNS = ['vector length', 'optimization']
+
+# metrics of the comparison mode, each one a column of the merged data frame (cf. `load_generations`)
+COMPARED_METRICS = ['P time', 'V time', 'constraints']
+
+DEFAULT_TITLE = 'Your title goes here'
+
+OPTIONS = [
+    {
+        'options': ['--help', '-h'],
+        'needs_parameter': False,
+        'maps_to': 'help',
+        'description': 'Prints this message'
+    },
+    {
+        'options': ['--title', '-t'],
+        'needs_parameter': True,
+        'maps_to': 'title',
+        'description': f'Title of the tabular (default: "{DEFAULT_TITLE}").'
+    },
+    {
+        'options': ['--baseline', '-b'],
+        'needs_parameter': True,
+        'maps_to': 'baseline',
+        'description': 'Comparison mode: the CSV file the speedups are computed\n\t\t\tagainst (default: the first file).'
+    },
+    {
+        'options': ['--metric', '-m'],
+        'needs_parameter': True,
+        'maps_to': 'metric',
+        'description': 'Comparison mode: the metric shown in the tabular, one of\n\t\t\t' + ', '.join(COMPARED_METRICS) + ' (default: P time).'
+    },
+    {
+        'options': ['--summary', '-s'],
+        'needs_parameter': True,
+        'maps_to': 'summary_file',
+        'description': 'Comparison mode: write the values and speedups of all metrics\n\t\t\tto the given file, as JSON if it ends with .json, otherwise as CSV.'
+    },
+]
+
+OPTIONS_DICT = { o:opt for opt in OPTIONS for o in opt['options'] }
+
 def eprint(*args, **kwargs):
     '''
     Print an error message to stderr. (Simple wrapper around `print()`)
     '''
     print(*args, file=sys.stderr, **kwargs)
 
-def usage():
+def usage(*args):
     '''
     Print a usage message to describe how to use the script.
-    The message is printed to stderr.
+    The message (preceded by an optional error message) is printed to stderr.
     At the end, the function terminates the execution with exit code 1.
     '''
+    if len(args) > 0:
+        eprint(*args)
+        eprint()
 
-    eprint(f'Usage: {sys.argv[0]} <filename>')
+    eprint(f'Usage: {sys.argv[0]} [Options] <filename> [filename...]')
     eprint()
-    eprint('The filename must point to a CSV file with the following header:')
+    eprint('The filenames must point to CSV files with (at least) the following header:')
     eprint(f'\t{";".join(REQUIRED_CSV_HEADERS)}')
     eprint()
     eprint(f'The output of the script is printed to stdout.')
-    eprint(f'The script produces LaTeX code for a tabular with')
+    eprint(f'With one file, the script produces LaTeX code for a tabular with')
     eprint(f'the code from the benchmarking.')
+    eprint()
+    eprint(f'With several files (comparison mode), every file is treated as one')
+    eprint(f'generation of the circuit. The rows are aligned on vector length and')
+    eprint(f'optimization, and the tabular shows one metric of every generation')
+    eprint(f'together with its speedup over the baseline.')
+    eprint()
+    eprint('Options:')
+    for opt in OPTIONS:
+        eprint(f'\t{", ".join(opt["options"])}\t{opt["description"]}')
     sys.exit(1)
 
-def parse_cli_params(argv:list[str]) -> str:
+def parse_cli_params(argv:list[str]) -> dict:
     '''
-    Takes the script arguments (argv) and parses them.
-    Exactly one argument is expected, which is interpreted as filename.
+    Takes the script arguments (argv) and parses them: options (cf. `OPTIONS`)
+    followed by at least one filename.
     On error, the function prints the usage message and terminates execution.
 
     :param argv: The CLI arguments as obtained by e.g. `sys.argv()`
-    :returns: the filename as specified in the parameters or termination on failure
+    :returns: the configuration dictionary, with the filenames under `filenames`, or termination on failure
     '''
+    config = {}
+
+    i = 1
+    while i < len(argv) and argv[i].startswith('-'):
+        if argv[i] not in OPTIONS_DICT:
+            usage(f'Unable to parse option "{argv[i]}"')
+
+        opt = OPTIONS_DICT[argv[i]]
+
+        if opt['needs_parameter']:
+            if i+1 >= len(argv):
+                usage(f'Option "{argv[i]}" needs a parameter')
+            config[opt['maps_to']] = argv[i+1]
+            i += 2
+        else:
+            config[opt['maps_to']] = True
+            i += 1
 
-    if len(argv) != 2:
-        eprint(f'Exactly one argument required,  {len(argv)} given.')
+    if 'help' in config:
         usage()
 
-    filename = argv[1]
+    if i >= len(argv):
+        usage('At least one filename required, none given.')
+
+    config['filenames'] = argv[i:]
 
-    return filename
+    return config
 
 def check_df_header(df:pd.DataFrame):
     '''
@@ -64,15 +140,54 @@ def check_df_header(df:pd.DataFrame):
     # eprint('debug: ', headers)
     for req in REQUIRED_CSV_HEADERS:
         if req not in headers:
-            eprint(f'Couldn\'t find required header "{req}" in headers of provided CSV file.')
-            usage()
+            usage(f'Couldn\'t find required header "{req}" in headers of provided CSV file.')
+
+def format_int(values:pd.Series) -> pd.Series:
+    '''
+    :param values: integers
+    :returns: the integers with thin spaces as thousands separators
+    '''
+    return values.map(lambda v: f'{int(v):,}'.replace(',', ' '))
+
+def latex_escape(text:str) -> str:
+    '''
+    :param text: plain text, e.g. a file name
+    :returns: the text with the special characters of LaTeX escaped
+    '''
+    for (char, escaped) in [('\\', '\\textbackslash{}'), ('_', '\\_'), ('&', '\\&'), ('%', '\\%'), ('#', '\\#'), ('$', '\\$')]:
+        text = text.replace(char, escaped)
+    return text
 
-def df_to_tabular(df:pd.DataFrame) -> str:
+def vlen_cells(vlen:pd.Series) -> tuple[pd.Series, pd.Series]:
+    '''
+    Computes the first cell and the line ending of every row of a tabular
+    with one block of rows per vector length: the first row of a block
+    gets a `\\multirow` spanning the whole block, the other rows an empty
+    cell. Blocks are separated by additional space.
+
+    :param vlen: the vector length of every row, rows of equal length adjacent
+    :returns: a tuple of the first cells and the line endings
+    '''
+    vlen = vlen.reset_index(drop=True)
+    first = vlen != vlen.shift()
+    last = vlen != vlen.shift(-1)
+    colspan = vlen.groupby(vlen).transform('size')
+
+    beginning = pd.Series('\t', index=vlen.index)
+    beginning[first] = '\t\\multirow{' + colspan[first].astype(str) + '}{*}{' + format_int(vlen[first]) + '}'
+
+    ending = pd.Series(' \\\\', index=vlen.index)
+    ending[last & (vlen.index != len(vlen)-1)] = ' \\\\[0.75em]'
+
+    return (beginning, ending)
+
+def df_to_tabular(df:pd.DataFrame, title:str=DEFAULT_TITLE) -> str:
     '''
     Takes a pandas data frame that contains all required headers (cf. `REQUIRED_CSV_HEADERS`)
     and compiles the data to a LaTeX tabular.
 
     :param df: a pandas data frame
+    :param title: the title of the tabular
     :returns: The compiled LaTeX code as string or termination on failure
     '''
 
@@ -81,45 +196,154 @@ def df_to_tabular(df:pd.DataFrame) -> str:
     # --------- prologue ---------
 
     mystr += '\\begin{tabular}{rrrrrr}\n'
-    mystr += '\t\\multicolumn{6}{l}{\large\\textbf{Your title goes here}}\\\\\n'
+    mystr += f'\t\\multicolumn{{6}}{{l}}{{\\large\\textbf{{{title}}}}}\\\\\n'
     mystr += '\t\\toprule\n'
     mystr += '\t$n$ & \\makecell{Compilation\\\\Flags} & \\makecell{Linear\\\\Constraints} & \\makecell{Non-Linear\\\\Constraints} & \\makecell{Prover\\\\Time [s]}  & \\makecell{Verifier\\\\Time [ms]} \\\\\n'
     mystr += '\t\\midrule\n'
 
     # --------- main part --------
 
-    previous_vlen = None
+    df = df.reset_index(drop=True)
+    (str_beginning, str_ending) = vlen_cells(df['vector length'])
 
-    for i in range(len(df)):
-        current_row = list(df.take([i]).values[0])
-        # print(current_row)
+    rows = \
+        str_beginning + \
+        '&' + df['optimization'].str.replace('--', '-{}-') + ' & ' + \
+        format_int(df['lin. constr.']) + ' & ' + \
+        format_int(df['non-lin. constr.']) + ' & ' + \
+        (df['P time']/1000).map(lambda t: f'{t:,.3f}'.replace(',', ' ')) + ' & ' + \
+        df['V time'].astype(int).astype(str) + \
+        str_ending
 
-        str_beginning = '\t'
-        str_ending = ' \\\\'
+    mystr += ''.join(rows + '\n')
 
-        if current_row[0] != previous_vlen:
-            colspan = 0
-            for j in range(i,len(df)):
-                if df['vector length'].iloc[j] != current_row[0]:
-                    break
-                colspan += 1
+    # ---------- epilogue ----------
 
-            str_beginning += f'\\multirow{{2}}{{*}}{{' + f'{current_row[0]:,}'.replace(',', ' ') + '}'
-        else:
-            str_ending += '[0.75em]'
+    mystr += '\t\\bottomrule\n'
+    mystr += '\\end{tabular}'
 
+    return mystr
 
-        mystr += \
-            str_beginning + \
-            f'&{current_row[1].replace("--", "-{}-")} & ' + \
-            f'{current_row[2]:,} & '.replace(',', ' ') + \
-            f'{current_row[3]:,} & '.replace(',', ' ') + \
-            f'{current_row[4]/1000:,.3f} & '.replace(',', ' ') + \
-            f'{int(current_row[5])}' + \
-            str_ending + '\n'
+def load_generations(filenames:list[str]) -> tuple[pd.DataFrame, list[str]]:
+    '''
+    Loads several benchmark CSV files and aligns them on vector length and
+    optimization. Every file is one generation of the circuit, labeled with
+    its file name without extension. If a file contains a configuration
+    several times, the rows are averaged.
+
+    The result has one row per configuration that occurs in any file, and
+    a two-level column index (metric, generation) with the metrics of
+    `COMPARED_METRICS`, where `constraints` is the sum of linear and
+    non-linear constraints. Configurations missing in a file are NaN.
+
+    :param filenames: paths to the CSV files
+    :returns: a tuple of the merged data frame and the labels of the generations, in the order of `filenames`
+    '''
+    frames = []
+    labels = []
+
+    for filename in filenames:
+        try:
+            df = pd.read_csv(filename, sep=';')
+        except FileNotFoundError:
+            usage(f'Unable to open file "{filename}"')
+        check_df_header(df)
+
+        label = os.path.splitext(os.path.basename(filename))[0]
+        if label in labels:
+            usage(f'Two files have the label "{label}", rename one of them.')
+        labels.append(label)
+
+        frames.append(df[REQUIRED_CSV_HEADERS].assign(
+            constraints=df['lin. constr.'] + df['non-lin. constr.'],
+            generation=label,
+        ))
+
+    merged = pd.concat(frames).pivot_table(
+        index=KEY_COLUMNS,
+        columns='generation',
+        values=COMPARED_METRICS,
+        aggfunc='mean',
+    )
+
+    return (merged.reindex(columns=pd.MultiIndex.from_product([COMPARED_METRICS, labels])), labels)
+
+def speedups(merged:pd.DataFrame, baseline:str) -> pd.DataFrame:
+    '''
+    Computes the speedup of every generation over the baseline, i.e. the
+    ratio baseline / generation, for every metric. For constraints, this is
+    the factor by which the circuit got smaller.
 
-        previous_vlen = current_row[0]
+    :param merged: the merged data frame, cf. `load_generations`
+    :param baseline: the label of the baseline generation
+    :returns: a data frame with the same shape as `merged`
+    '''
+    return pd.concat(
+        { metric: merged[metric].rdiv(merged[(metric, baseline)], axis=0) for metric in COMPARED_METRICS },
+        axis=1,
+    )
 
+def geometric_means(ratios:pd.DataFrame) -> pd.DataFrame:
+    '''
+    :param ratios: speedups, cf. `speedups`
+    :returns: the geometric mean of every column over the configurations where it is defined, per optimization
+    '''
+    return np.exp(np.log(ratios).groupby(level='optimization').mean())
+
+def comparison_to_tabular(merged:pd.DataFrame, ratios:pd.DataFrame, labels:list[str], metric:str, title:str=DEFAULT_TITLE) -> str:
+    '''
+    Compiles the comparison of one metric to a LaTeX tabular, with one column
+    per generation. Every cell contains the value and the speedup over the
+    baseline. The last rows contain the geometric mean of the speedups per
+    optimization.
+
+    :param merged: the merged data frame, cf. `load_generations`
+    :param ratios: the speedups, cf. `speedups`
+    :param labels: the labels of the generations, in the order of the columns
+    :param metric: the metric to show, one of `COMPARED_METRICS`
+    :param title: the title of the tabular
+    :returns: The compiled LaTeX code as string
+    '''
+    if metric == 'P time':
+        (unit, values) = ('Prover Time [s]', merged[metric].div(1000).map(lambda t: f'{t:,.3f}'.replace(',', ' '), na_action='ignore'))
+    elif metric == 'V time':
+        (unit, values) = ('Verifier Time [ms]', merged[metric].map(lambda t: f'{t:.0f}', na_action='ignore'))
+    else:
+        (unit, values) = ('Constraints', merged[metric].map(lambda c: f'{int(c):,}'.replace(',', ' '), na_action='ignore'))
+
+    # configurations missing in the baseline show the value without speedup
+    cells = (values + (' ($' + ratios[metric].map(lambda r: f'{r:.2f}', na_action='ignore') + '\\times$)').fillna('')).fillna('--')
+    cols = 2 + len(labels)
+
+    mystr = ''
+
+    # --------- prologue ---------
+
+    mystr += '\\begin{tabular}{rr' + 'r'*len(labels) + '}\n'
+    mystr += f'\t\\multicolumn{{{cols}}}{{l}}{{\\large\\textbf{{{title}}}}}\\\\\n'
+    mystr += f'\t\\multicolumn{{{cols}}}{{l}}{{{unit} (speedup over {latex_escape(labels[0])})}}\\\\\n'
+    mystr += '\t\\toprule\n'
+    mystr += '\t$n$ & \\makecell{Compilation\\\\Flags} & ' + ' & '.join([ f'\\makecell{{{latex_escape(l)}}}' for l in labels ]) + ' \\\\\n'
+    mystr += '\t\\midrule\n'
+
+    # --------- main part --------
+
+    index = merged.index.to_frame(index=False)
+    (str_beginning, str_ending) = vlen_cells(index['vector length'])
+
+    rows = str_beginning + '&' + index['optimization'].str.replace('--', '-{}-')
+    for label in labels:
+        rows += ' & ' + cells[label].reset_index(drop=True)
+    mystr += ''.join(rows + str_ending + '\n')
+
+    # ---------- geometric means ----------
+
+    mystr += '\t\\midrule\n'
+    means = geometric_means(ratios[metric])
+    for (optimization, row) in means.iterrows():
+        mystr += f'\t\\makecell{{geo.\\ mean}} & {optimization.replace("--", "-{}-")} & ' + ' & '.join([
+            '--' if pd.isna(row[label]) else f'${row[label]:.2f}\\times$' for label in labels
+        ]) + ' \\\\\n'
 
     # ---------- epilogue ----------
 
@@ -128,23 +352,83 @@ def df_to_tabular(df:pd.DataFrame) -> str:
 
     return mystr
 
+def comparison_summary(merged:pd.DataFrame, ratios:pd.DataFrame) -> pd.DataFrame:
+    '''
+    :param merged: the merged data frame, cf. `load_generations`
+    :param ratios: the speedups, cf. `speedups`
+    :returns: a long table with one row per configuration and generation, containing the value and the speedup of every metric
+    '''
+    summary = pd.concat({ 'value': merged, 'speedup': ratios }, axis=1) \
+        .stack(level=2, future_stack=True) \
+        .dropna(how='all') \
+        .rename_axis(KEY_COLUMNS + ['generation']) \
+        .reset_index()
+
+    summary.columns = [ ' '.join([ c for c in reversed(col) if c != 'value' ]).strip() if isinstance(col, tuple) else col for col in summary.columns ]
+
+    return summary
+
+def write_summary(summary:pd.DataFrame, ratios:pd.DataFrame, path:str):
+    '''
+    Writes the comparison to a file. A JSON file contains the rows of the
+    summary and the geometric means of the speedups per optimization and
+    generation, a CSV file (`;`-separated) only the rows.
+
+    :param summary: the summary, cf. `comparison_summary`
+    :param ratios: the speedups, cf. `speedups`
+    :param path: the output file
+    '''
+    if not path.endswith('.json'):
+        summary.to_csv(path, sep=';', index=False)
+        return
+
+    means = {
+        metric: {
+            optimization: { label: (None if pd.isna(v) else float(v)) for (label, v) in row.items() }
+            for (optimization, row) in geometric_means(ratios[metric]).iterrows()
+        }
+        for metric in COMPARED_METRICS
+    }
+
+    with open(path, 'w') as f:
+        json.dump({
+            'rows': json.loads(summary.to_json(orient='records')),
+            'geometric mean speedups': means,
+        }, f, indent=2)
+
 def main(argv):
     '''
     Main function of the program.
-    Takes the CLI arguments (argv) with a filename
-    and tries to compile the CSV file under the specified filename
-    to LaTeX tabular.
+    Takes the CLI arguments (argv) with one or more filenames. A single CSV
+    file is compiled to a LaTeX tabular; several files are compared against
+    the baseline (cf. `comparison_to_tabular`).
     '''
+    config = parse_cli_params(argv)
+    title = config.get('title', DEFAULT_TITLE)
+
+    if len(config['filenames']) == 1 and 'baseline' not in config and 'summary_file' not in config:
+        df = pd.read_csv(config['filenames'][0], sep=';')
+        check_df_header(df)
+
+        print(df_to_tabular(df, title))
+        return
 
+    filenames = config['filenames']
+    if 'baseline' in config:
+        # the baseline is always the first generation
+        filenames = [config['baseline']] + [ f for f in filenames if f != config['baseline'] ]
 
-    filename = parse_cli_params(argv)
+    metric = config.get('metric', 'P time')
+    if metric not in COMPARED_METRICS:
+        usage(f'Unknown metric "{metric}", expected one of {", ".join(COMPARED_METRICS)}.')
 
-    df = pd.read_csv(filename, sep=';')
-    check_df_header(df)
+    (merged, labels) = load_generations(filenames)
+    ratios = speedups(merged, labels[0])
 
-    mystr = df_to_tabular(df)
+    print(comparison_to_tabular(merged, ratios, labels, metric, title))
 
-    print(mystr)
+    if 'summary_file' in config:
+        write_summary(comparison_summary(merged, ratios), ratios, config['summary_file'])
 
 
 if __name__ == '__main__':
@@ -1,7 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
 import pandas as pd
+import multiprocessing
+import hashlib
 import sys
 import os
 from matplotlib.ticker import FormatStrFormatter
@@ -9,6 +10,12 @@ from matplotlib.ticker import ScalarFormatter
 import io
 import yaml
 
+from concurrent.futures import ProcessPoolExecutor
+
+import scaling
+
+CACHE_DIR = '.plot_cache' # parsed input files, cf. `load_input`
+
 OPTIONS = [
      {
         'options': ['--help', '-h'],
@@ -40,6 +47,18 @@ OPTIONS = [
         'maps_to': 'title',
         'description': 'Sets the title of the plot'
     },
+    {
+        'options': ['--jobs', '-j'],
+        'needs_parameter': True,
+        'maps_to': 'jobs',
+        'description': 'Number of figures rendered in parallel in batch mode (default: 1).'
+    },
+    {
+        'options': ['--no-cache'],
+        'needs_parameter': False,
+        'maps_to': 'no_cache',
+        'description': f'Parse all input files again instead of reading them\n\t\t\tfrom the cache in {CACHE_DIR}.'
+    },
 ]
 
 OPTIONS_DICT = { o:opt for opt in OPTIONS for o in opt['options'] }
@@ -55,7 +74,7 @@ def die(*args, **kwargs):
     sys.exit(1)
 
 def usage(*args, **kwargs):
-    if len(*args) > 0:
+    if len(args) > 0:
         eprint(*args)
 
     eprint(f'Usage: {sys.argv[0]} [Options] <plot decription file>')
@@ -81,6 +100,29 @@ def usage(*args, **kwargs):
     eprint('\t\tdescription')
     eprint('\t\tpath')
     eprint('\t\tcolumn')
+    eprint('\t')
+    eprint('\tOptionally, an input file description can contain')
+    eprint('\t\tband: [<lower column>, <upper column>]')
+    eprint('\tto draw a shaded error band between two columns,')
+    eprint('\te.g. ["P ci low", "P ci high"] as written by benchmark.py.')
+    eprint('\t')
+    eprint('\tWith')
+    eprint('\t\tfit: <best|' + '|'.join(scaling.MODELS.keys()) + '>')
+    eprint('\t\tfit_until: <vector length>   (optional)')
+    eprint('\tthe fitted complexity model (cf. scaling.py) is drawn as dashed line,')
+    eprint('\textrapolated up to fit_until.')
+    eprint('\t')
+    eprint('\tBatch Mode:')
+    eprint('\tIf the file contains a list')
+    eprint('\t\tfigures: <list of figure descriptions>')
+    eprint('\tall figures are rendered in one run. Each figure description needs')
+    eprint('\tan "output" file and can contain')
+    eprint('\t\tplot_options: <dict, merged into the top-level plot_options>')
+    eprint('\t\tinput_files: <list, replaces the top-level input_files>')
+    eprint('\t\tcolumn: <column, replaces the column of every input file>')
+    eprint('\t\tband: <list of two columns, replaces the band of every input file>')
+    eprint('\t\tonly_O2: <true|false>')
+    eprint('\tThe top-level input_files are then optional.')
 
     sys.exit(1)
 
@@ -143,63 +185,170 @@ def parse_cli_arguments(argv) -> dict:
 
     return config
 
+def check_input_files(input_files):
+    if not isinstance(input_files, list):
+        die('Error in input yml file: "input_files" must be a list')
+
+    for in_f in input_files:
+        if not isinstance(in_f, dict):
+            die('Error in input yml file: each "input_files" entry must be a dict')
+
+        required_fields = ['description', 'path', 'column']
+
+        for rf in required_fields:
+            if rf not in in_f.keys():
+                die(f'Error in input yml file: One of the "input_files" entries is missing the required "{rf}" field')
+
+        if 'band' in in_f and in_f['band'] is not None and (not isinstance(in_f['band'], list) or len(in_f['band']) != 2):
+            die('Error in input yml file: "band" must be a list of two column names')
+
+        if 'fit' in in_f and in_f['fit'] != 'best' and in_f['fit'] not in scaling.MODELS:
+            die(f'Error in input yml file: "fit" must be "best" or one of {", ".join(scaling.MODELS.keys())}')
+
 def check_yaml(yml:dict):
     # print(yml)
 
-    if 'plot_options' not in yml or 'input_files' not in yml:
+    if 'plot_options' not in yml or ('input_files' not in yml and 'figures' not in yml):
         eprint('The input yml file must contain at least the following entries:')
         eprint('\tplot_options')
-        eprint('\tinput_files')
+        eprint('\tinput_files (or figures)')
         sys.exit(1)
 
     if not isinstance(yml['plot_options'], dict):
         die('Error in input yml file: "plot_options" must be a dictionary')
 
-    if not isinstance(yml['input_files'], list):
-        die('Error in input yml file: "input_files" must be a list')
-
-    for in_f in yml['input_files']:
-        if not isinstance(in_f, dict):
-            die('Error in input yml file: each "input_files" entry must be a dict')
+    if 'figures' not in yml:
+        check_input_files(yml['input_files'])
+        return
 
-        required_fields = ['description', 'path', 'column']
+    if not isinstance(yml['figures'], list):
+        die('Error in input yml file: "figures" must be a list')
 
-        for rf in required_fields:
-            if rf not in in_f.keys():
-                die(f'Error in input yml file: One of the "input_files" entries is missing the required "{rf}" field')
+    for fig in yml['figures']:
+        if not isinstance(fig, dict) or 'output' not in fig:
+            die('Error in input yml file: each "figures" entry must be a dict with an "output" file')
 
+        if not isinstance(fig.get('plot_options', {}), dict):
+            die('Error in input yml file: "plot_options" of a figure must be a dictionary')
 
-def draw_plot(df:pd.DataFrame, column_to_plot:str, description:str, **kwargs):
+        if 'input_files' not in fig and 'input_files' not in yml:
+            die(f'Error in input yml file: the figure "{fig["output"]}" has no input files')
 
-    ax = sns.lineplot(
-        data=df,
-        x='vector length',
-        y=column_to_plot,
-        errorbar=None,
-        **kwargs
-    )
+        # the overrides of the figure are applied before checking, so they may fill in missing fields
+        check_input_files(figure_input_files(yml, fig))
 
-    ax.text(df['vector length'].max(), df[column_to_plot].iloc[-1], description)
+def figure_input_files(yml:dict, fig:dict) -> list[dict]:
+    '''
+    Computes the input file descriptions of one figure in batch mode: the
+    ones of the figure or else the top-level ones, with the `column` and
+    `band` of the figure (if any) applied to each of them.
 
-if __name__ == '__main__':
-    config = parse_cli_arguments(sys.argv)
-    if 'help' in config:
-        usage()
+    :param yml: the whole plot description
+    :param fig: one entry of `figures`
+    :return: new input file descriptions, the ones in `yml` are not modified
+    '''
+    overrides = { key: fig[key] for key in ['column', 'band'] if key in fig }
 
-    # print(config)
+    return [ {**in_f, **overrides} for in_f in fig.get('input_files', yml.get('input_files', [])) ]
 
+def load_input(path:str, use_cache:bool=True) -> pd.DataFrame:
+    '''
+    Reads a `;`-separated CSV file. Since the same files appear in many
+    figures, every file is parsed only once per process, and the parsed data
+    frame is stored in `CACHE_DIR` in a columnar pickle. Later runs read it
+    from there as long as the path, size and modification time of the CSV
+    file are unchanged.
+
+    :param path: path to the CSV file
+    :param use_cache: whether to use the cache in `CACHE_DIR`
+    :return: the data frame, which must not be modified by the caller
+    '''
+    if path in load_input.parsed:
+        return load_input.parsed[path]
 
     try:
-        with open(config['input_file']) as f:
-            yml = yaml.safe_load(f)
+        stat = os.stat(path)
     except FileNotFoundError:
-        die(f'Unable to open file "{config["input_file"]}"')
+        die(f'Unable to open file "{path}"')
 
-    check_yaml(yml)
+    key = hashlib.sha256(f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()
+    cached = os.path.join(CACHE_DIR, key + '.pkl')
 
-    plt_opts = yml['plot_options']
+    if use_cache and os.path.exists(cached):
+        df = pd.read_pickle(cached)
+    else:
+        df = pd.read_csv(path, sep=';')
+        if use_cache:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            df.to_pickle(cached + f'.tmp{os.getpid()}')
+            os.replace(cached + f'.tmp{os.getpid()}', cached)
 
-    plt.figure(figsize=(10, 5))
+    load_input.parsed[path] = df
+    return df
+
+load_input.parsed = {}
+
+def draw_fit(ax, df:pd.DataFrame, column:str, model:str, fit_until:int|None=None):
+    '''
+    Fits a complexity model to a column (cf. `scaling.fit_column`) and draws it
+    as dashed line in the color of the last drawn line, from the smallest
+    vector length up to `fit_until` or the largest vector length.
+    '''
+    fits = scaling.fit_column(df, column)
+    fits = fits if model == 'best' else [ f for f in fits if f['model'] == model ]
+    if len(fits) == 0:
+        die(f'Error: Too few vector lengths to fit the model "{model}" to "{column}"')
+
+    n_max = max(df['vector length'].max(), fit_until or 0)
+    n = np.geomspace(df['vector length'].min(), n_max, 200)
+
+    ax.plot(n, scaling.predict(fits[0], n), linestyle='--', linewidth=1, color=ax.get_lines()[-1].get_color())
+
+def draw_plot(ax, df:pd.DataFrame, column_to_plot:str, description:str, band:list[str]|None=None, fit:str|None=None, fit_until:int|None=None, **kwargs):
+    '''
+    Draws one column against the vector length with `ax.plot`. If the data
+    contains several rows per vector length (e.g. both optimizations), they
+    are averaged first. Remaining keyword arguments (e.g. `marker`) are
+    passed to `ax.plot`.
+    '''
+    columns = [column_to_plot] + (band or [])
+    data = df[['vector length'] + columns]
+    if data['vector length'].duplicated().any():
+        data = data.groupby('vector length', as_index=False).mean()
+    data = data.sort_values('vector length')
+
+    x = data['vector length'].to_numpy()
+    y = data[column_to_plot].to_numpy()
+
+    line = ax.plot(x, y, **kwargs)[0]
+
+    if band is not None:
+        ax.fill_between(
+            x,
+            data[band[0]].to_numpy(),
+            data[band[1]].to_numpy(),
+            color=line.get_color(),
+            alpha=0.25,
+            linewidth=0
+        )
+
+    if fit is not None:
+        draw_fit(ax, df, column_to_plot, fit, fit_until)
+
+    ax.text(x[-1], y[-1], description)
+
+def render_figure(plt_opts:dict, input_files:list[dict], only_O2:bool=False, output_file:str|None=None, use_cache:bool=True):
+    '''
+    Renders one figure and stores it in `output_file` or, if no file is
+    given, shows it on display.
+
+    :param plt_opts: the plot options, cf. `usage`
+    :param input_files: the input file descriptions, cf. `usage`
+    :param only_O2: whether to plot only rows with optimization --O2
+    :param output_file: the file to store the figure in
+    :param use_cache: whether to use the cache of parsed inputs, cf. `load_input`
+    '''
+    fig = plt.figure(figsize=(10, 5))
     ax = plt.axes()
     ax.set_facecolor((0.9, 0.9, 0.9))
     plt.grid(visible=True, which="major", ls="-", color="white", axis='y', lw=1)
@@ -211,28 +360,108 @@ if __name__ == '__main__':
     ax.spines['right'].set_visible(False)
 
 
-    for in_f in yml['input_files']:
-        desc = in_f['description']
-        path = in_f['path']
-        column = in_f['column']
+    for in_f in input_files:
+        in_f = dict(in_f)
+        desc = in_f.pop('description')
+        path = in_f.pop('path')
+        column = in_f.pop('column')
 
-        del in_f['description']
-        del in_f['path']
-        del in_f['column']
+        band = in_f.pop('band', None)
+        fit = in_f.pop('fit', None)
+        fit_until = in_f.pop('fit_until', None)
 
-        df = pd.read_csv(path, sep=';')
+        df = load_input(path, use_cache)
 
-        if 'only_O2' in config.keys():
+        if only_O2:
             df = df[ df['optimization'] == '--O2' ]
 
+        for col in [column] + (band or []):
+            if col not in df.columns:
+                die(f'Error: Column "{col}" not found in "{path}"')
+
         if 'y_scaling' in plt_opts:
-            df[column] *= plt_opts['y_scaling']
+            df = df.assign(**{ col: df[col] * plt_opts['y_scaling'] for col in [column] + (band or []) })
 
-        draw_plot(df, column_to_plot=column, description=desc, **in_f)
+        draw_plot(ax, df, column_to_plot=column, description=desc, band=band, fit=fit, fit_until=fit_until, **in_f)
 
     plt.ylabel('')
 
-    if 'output_file' in config.keys():
-        plt.savefig(config['output_file'], orientation='landscape',  dpi=500)
+    if output_file is not None:
+        plt.savefig(output_file, orientation='landscape',  dpi=500)
+        plt.close(fig)
     else:
         plt.show()
+
+def render_batch_figure(args:tuple) -> str:
+    '''
+    Renders one figure of the batch mode (cf. `render_figure`) and returns its
+    output file. Runs in the worker processes of `render_batch`.
+    '''
+    render_figure(*args)
+    return args[3]
+
+def render_batch(yml:dict, only_O2:bool=False, jobs:int=1, use_cache:bool=True):
+    '''
+    Renders all figures of a plot description with a `figures` list.
+
+    All input files are loaded before the first figure is rendered. With
+    `jobs > 1`, the figures are rendered by forked worker processes, which
+    inherit the loaded inputs instead of parsing them again.
+
+    :param yml: the plot description
+    :param only_O2: whether to plot only rows with optimization --O2 in every figure
+    :param jobs: number of figures rendered in parallel
+    :param use_cache: whether to use the cache of parsed inputs, cf. `load_input`
+    '''
+    tasks = [
+        (
+            {**yml['plot_options'], **fig.get('plot_options', {})},
+            figure_input_files(yml, fig),
+            only_O2 or fig.get('only_O2', False),
+            fig['output'],
+            use_cache,
+        )
+        for fig in yml['figures']
+    ]
+
+    for (_, input_files, _, _, _) in tasks:
+        for in_f in input_files:
+            load_input(in_f['path'], use_cache)
+
+    if jobs == 1:
+        for output_file in map(render_batch_figure, tasks):
+            eprint(f'Wrote {output_file}')
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork')) as executor:
+        for output_file in executor.map(render_batch_figure, tasks):
+            eprint(f'Wrote {output_file}')
+
+if __name__ == '__main__':
+    config = parse_cli_arguments(sys.argv)
+    if 'help' in config:
+        usage()
+
+    # print(config)
+
+
+    try:
+        with open(config['input_file']) as f:
+            yml = yaml.safe_load(f)
+    except FileNotFoundError:
+        die(f'Unable to open file "{config["input_file"]}"')
+
+    check_yaml(yml)
+
+    use_cache = 'no_cache' not in config
+
+    if 'figures' in yml:
+        try:
+            jobs = int(config.get('jobs', 1))
+        except ValueError:
+            die('Error: The number of jobs needs to be an integer')
+
+        plt.switch_backend('Agg')
+        render_batch(yml, 'only_O2' in config, max(jobs, 1), use_cache)
+    else:
+        render_figure(yml['plot_options'], yml['input_files'], 'only_O2' in config, config.get('output_file'), use_cache)
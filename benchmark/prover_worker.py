@@ -0,0 +1,146 @@
+import subprocess
+import threading
+import json
+import time
+
+class ProverWorker:
+    '''
+        A long-lived prover and verifier process of the node app (its `serve`
+        command) that is driven over a pipe with one JSON object per line.
+
+        In contrast to calling `node ../node_app test` for every measurement,
+        node, snarkjs and the keys of the circuit are loaded only once. This
+        allows to measure the cold start (starting node and loading the keys)
+        separately from the warm path (proving and verifying with everything
+        in memory).
+
+        The node app prints its log messages to stderr while serving. They are
+        collected in the background and available as `stderr()`, e.g. to be
+        shown if a request fails.
+
+        Usage:
+            with ProverWorker('../node_app', env=env) as worker:
+                worker.load()
+                res = worker.test(testcase)
+
+        If `cpus` is given, node is started with `taskset`, so that the affinity
+        is set before node starts and all its threads inherit it. (Setting it
+        with `preexec_fn` is unsafe when the worker is started from a thread,
+        and setting it afterwards would miss the threads node already started.)
+
+        :param node_app: path to the node app
+        :param cpus: optional set of CPUs the worker is pinned to
+        :param kwargs: further keyword arguments for `subprocess.Popen`, e.g. `env`
+    '''
+
+    def __init__(self, node_app:str='../node_app', cpus:set[int]|None=None, **kwargs):
+        t0 = time.perf_counter()
+
+        pinning = [] if cpus is None else ['taskset', '-c', ','.join([ str(cpu) for cpu in sorted(cpus) ])]
+
+        self.process = subprocess.Popen(
+            pinning + ['node', node_app, 'serve'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            **kwargs
+        )
+
+        self._stderr_lines = []
+        self._stderr_thread = threading.Thread(target=self._collect_stderr, daemon=True)
+        self._stderr_thread.start()
+
+        ready = self._read()
+        if not ready.get('ready', False):
+            raise RuntimeError(f'The prover worker did not start properly: {ready}')
+
+        self.startup_time = (time.perf_counter() - t0) * 1000 # ms, as all times of the node app
+
+    def _collect_stderr(self):
+        '''
+            Reads the stderr of the worker until it is closed, so that the
+            worker never blocks on a full pipe.
+        '''
+        for line in self.process.stderr:
+            self._stderr_lines.append(line)
+
+    def _read(self) -> dict:
+        '''
+            Reads one answer of the worker.
+
+            :return: the answer as dictionary
+        '''
+        line = self.process.stdout.readline()
+        if line == '':
+            self.process.wait()
+            raise RuntimeError(f'The prover worker terminated unexpectedly (exit code {self.process.returncode}).')
+
+        return json.loads(line)
+
+    def request(self, cmd:str, **kwargs) -> dict:
+        '''
+            Sends one request to the worker and waits for the answer.
+
+            :param cmd: the command, i.e. one of 'load', 'test', 'prove', 'verify' and 'exit'
+            :param kwargs: the arguments of the command, cf. `serve` in the node app
+            :return: the answer without the field 'ok'
+        '''
+        self.process.stdin.write(json.dumps({'cmd': cmd, **kwargs}) + '\n')
+        self.process.stdin.flush()
+
+        res = self._read()
+        if not res.pop('ok', False):
+            raise RuntimeError(f'The prover worker failed on "{cmd}": {res.get("error")}')
+
+        return res
+
+    def load(self, **files) -> float:
+        '''
+            Loads the keys of the circuit into the memory of the worker.
+            Without arguments, the files registered with `set_zkey_file` etc. are used.
+
+            :param files: optional paths `zkey_file`, `vkey_file` and `wasm_file`
+            :return: the time in ms it took to load the keys
+        '''
+        return self.request('load', **files)['load_time']
+
+    def test(self, testcase:dict) -> dict:
+        '''
+            Runs one test case, i.e. proves it, checks the outputs and verifies the proof.
+
+            :param testcase: a dictionary with the keys 'model', 'probe', 'miura' and 'convolution'
+            :return: a dictionary with the keys 'passed', 'prover_time' and 'verifier_time'
+        '''
+        return self.request('test', testcase=testcase)
+
+    def stderr(self) -> str:
+        '''
+            :return: everything the worker printed to stderr so far
+        '''
+        return ''.join(self._stderr_lines)
+
+    def close(self):
+        '''
+            Asks the worker to terminate and waits for it.
+            If the worker does not react, it is killed.
+        '''
+        if self.process.poll() is None:
+            try:
+                self.request('exit')
+            except (RuntimeError, BrokenPipeError):
+                pass
+
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+        self._stderr_thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
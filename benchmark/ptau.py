@@ -0,0 +1,195 @@
+'''
+Selects and prepares the smallest powers-of-tau file that suffices for the
+trusted setup of a circuit.
+
+The Groth16 setup of snarkjs needs a ptau file whose power is at least the
+bit length of (constraints + public inputs + outputs) of the circuit. It only
+reads the first entries of every section of the file, but opening the
+2^23 file of the Hermez ceremony still costs setup time and memory at every
+size. This module writes truncated copies of the file for smaller powers,
+which contain exactly the prefixes of the sections the setup uses, and keeps
+them in a cache directory.
+
+Usage as script:
+
+    python3 ptau.py <ptau file>                      # prints the power of the file
+    python3 ptau.py <ptau file> <power> <output>     # writes a truncated copy
+'''
+
+import threading
+import struct
+import mmap
+import sys
+import os
+
+import r1cs
+
+SECTION_HEADER = 1
+SECTION_CONTRIBUTIONS = 7
+
+# section type: (point type, number of points for power p) of the sections written by `truncate`
+SECTIONS = {
+    2: ('G1', lambda p: 2**(p+1) - 1), # tauG1
+    3: ('G2', lambda p: 2**p),         # tauG2
+    4: ('G1', lambda p: 2**p),         # alphaTauG1
+    5: ('G1', lambda p: 2**p),         # betaTauG1
+    6: ('G2', lambda p: 1),            # betaG2
+}
+LAGRANGE_SECTIONS = { 12: 'G1', 13: 'G2', 14: 'G1', 15: 'G1' } # Lagrange bases of all powers, in ascending order
+
+COPY_CHUNK = 2**26
+
+_lock = threading.Lock()
+
+class PTau:
+    '''
+    This class gives access to a powers-of-tau file in the binary format of
+    snarkjs, without reading the file into memory.
+
+    The file has the same container format as R1CS files (cf. `r1cs.R1CS`):
+    the magic `ptau`, a version and sections, each starting with its type
+    (`uint32`) and size (`uint64`). The header section contains the size of
+    field elements `n8`, the prime, the power of the file and the power of the
+    ceremony it was taken from. A point of G1 takes `2*n8`, a point of G2
+    `4*n8` bytes.
+
+    :param path: path to the ptau file
+    '''
+
+    MAGIC = b'ptau'
+
+    def __init__(self, path:str):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.version, n_sections) = struct.unpack_from('<4sII', self.mm, 0)
+        if magic != PTau.MAGIC:
+            raise ValueError(f'"{path}" is not a ptau file')
+
+        self.sections = {}
+        offset = 12
+        for _ in range(n_sections):
+            (section_type, size) = struct.unpack_from('<IQ', self.mm, offset)
+            self.sections[section_type] = (offset + 12, size)
+            offset += 12 + size
+
+        (offset, _) = self.sections[SECTION_HEADER]
+        (self.n8,) = struct.unpack_from('<I', self.mm, offset)
+        (self.power, self.ceremony_power) = struct.unpack_from('<II', self.mm, offset+4+self.n8)
+
+        self.point_size = { 'G1': 2*self.n8, 'G2': 4*self.n8 }
+
+    def section(self, section_type:int) -> memoryview:
+        '''
+        :param section_type: type of the section
+        :return: the content of the section, a view into the file
+        '''
+        (offset, size) = self.sections[section_type]
+        return memoryview(self.mm)[offset : offset+size]
+
+    def lagrange_size(self, section_type:int, power:int) -> int:
+        '''
+        Computes the size of the prefix of a Lagrange section that covers
+        everything the setup of a circuit of the given power reads.
+
+        The Lagrange sections contain the bases of all powers from 0 up to the
+        power of the file (some snarkjs versions store one power more), so
+        the number of stored powers is derived from the size of the section.
+
+        :param section_type: type of a section in `LAGRANGE_SECTIONS`
+        :param power: the power of the truncated file
+        :return: the size of the prefix in bytes
+        '''
+        point_size = self.point_size[LAGRANGE_SECTIONS[section_type]]
+        stored = (self.sections[section_type][1] // point_size).bit_length() # the powers 0, 1, ..., stored-1
+        extra = stored - (self.power + 1)
+
+        return (2**(power + 1 + extra) - 1) * point_size
+
+def required_power(r1cs_path:str) -> int:
+    '''
+    :param r1cs_path: path to the R1CS file of a circuit
+    :return: the smallest power of a ptau file that suffices for the Groth16 setup of the circuit
+    '''
+    header = r1cs.R1CS(r1cs_path)
+    return (header.n_constraints + header.n_pub_in + header.n_pub_out).bit_length()
+
+def truncate(source:str, power:int, output:str):
+    '''
+    Writes a copy of a ptau file with a smaller power. The new file contains
+    the header with the new power, the prefixes of the point sections
+    (cf. `SECTIONS` and `LAGRANGE_SECTIONS`) and the contributions, like
+    the files written by `snarkjs powersoftau truncate`.
+
+    The copy is written to a temporary file first and then renamed, so an
+    interrupted run never leaves an incomplete file behind.
+
+    :param source: path to the ptau file, which must be prepared for phase 2
+    :param power: the power of the new file, at most the power of the source
+    :param output: path of the new file
+    '''
+    ptau = PTau(source)
+
+    if power > ptau.power:
+        raise ValueError(f'Cannot truncate "{source}" of power {ptau.power} to power {power}')
+    for section_type in LAGRANGE_SECTIONS:
+        if section_type not in ptau.sections:
+            raise ValueError(f'"{source}" is not prepared for phase 2 (no section of type {section_type})')
+
+    header = bytearray(ptau.section(SECTION_HEADER))
+    struct.pack_into('<I', header, 4+ptau.n8, power)
+
+    sections = [ (SECTION_HEADER, header) ]
+    sections += [ (t, ptau.section(t)[: count(power) * ptau.point_size[point]]) for (t, (point, count)) in SECTIONS.items() ]
+    sections += [ (SECTION_CONTRIBUTIONS, ptau.section(SECTION_CONTRIBUTIONS)) ]
+    sections += [ (t, ptau.section(t)[: ptau.lagrange_size(t, power)]) for t in LAGRANGE_SECTIONS ]
+
+    tmp_output = output + f'.tmp{os.getpid()}_{threading.get_ident()}'
+    with open(tmp_output, 'wb') as f:
+        f.write(struct.pack('<4sII', PTau.MAGIC, ptau.version, len(sections)))
+        for (section_type, content) in sections:
+            f.write(struct.pack('<IQ', section_type, len(content)))
+            for i in range(0, len(content), COPY_CHUNK):
+                f.write(content[i : i+COPY_CHUNK])
+
+    os.rename(tmp_output, output)
+
+def prepare(source:str, power:int, cache_dir:str) -> str:
+    '''
+    Returns the smallest ptau file for the given power, creating it if needed.
+
+    Truncated files are stored in `cache_dir` as `<name of source>_<power>.ptau`.
+    A new file is truncated from the smallest cached file of sufficient power,
+    or from the source if there is none. If the source itself is not larger
+    than needed, it is returned as is.
+
+    :param source: path to the ptau file of the ceremony
+    :param power: the required power, cf. `required_power`
+    :param cache_dir: directory of the truncated files, created if it does not exist
+    :return: path to a ptau file of exactly the given power (or the source)
+    '''
+    power = max(power, 1)
+    (stem, ext) = os.path.splitext(os.path.basename(source))
+    cached = lambda p: os.path.join(cache_dir, f'{stem}_{p:02d}{ext}')
+
+    with _lock:
+        source_power = PTau(source).power
+        if power >= source_power:
+            return source
+
+        if not os.path.exists(cached(power)):
+            os.makedirs(cache_dir, exist_ok=True)
+            larger = [ p for p in range(power+1, source_power) if os.path.exists(cached(p)) ]
+            truncate(cached(larger[0]) if len(larger) > 0 else source, power, cached(power))
+
+    return cached(power)
+
+if __name__ == '__main__':
+    match sys.argv[1:]:
+        case [path]:
+            print(PTau(path).power)
+        case [path, power, output]:
+            truncate(path, int(power), output)
+        case _:
+            print(__doc__, file=sys.stderr)
+            sys.exit(1)
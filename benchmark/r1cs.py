@@ -0,0 +1,271 @@
+'''
+A parser for the R1CS files and symbol files that circom writes (`main.r1cs`
+and `main.sym`), and a breakdown of the constraints and wires of a circuit
+by the component instances they belong to.
+
+Usage as script:
+
+    python3 r1cs.py [--depth D] [--no-collapse] <r1cs file> [sym file]
+
+The symbol file defaults to the R1CS file with the extension `.sym`.
+'''
+
+import numpy as np
+import struct
+import mmap
+import sys
+import re
+
+SECTION_HEADER = 1
+SECTION_CONSTRAINTS = 2
+SECTION_WIRE2LABEL = 3
+
+class R1CS:
+    '''
+    This class gives access to an R1CS file in the binary format of iden3
+    (as written by circom), without reading the file into memory.
+
+    The file is memory-mapped. Opening it only parses the header and the
+    offsets of the sections. The wires of the constraints are exposed as
+    NumPy views into the mapped file (cf. `constraint_wires`), so even the
+    constraint system of large circuits is never copied as a whole.
+
+    The format consists of the magic `r1cs`, a version, and sections of the
+    following types, each starting with its type (`uint32`) and size (`uint64`):
+        - 1: header with the size of field elements `n8`, the prime, and the numbers of wires, outputs, inputs, labels and constraints
+        - 2: constraints, each one three linear combinations A, B and C, stored as number of terms followed by (wire id, coefficient) pairs
+        - 3: the label id of every wire
+
+    :param path: path to the R1CS file
+    '''
+
+    MAGIC = b'r1cs'
+
+    def __init__(self, path:str):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, n_sections) = struct.unpack_from('<4sII', self.mm, 0)
+        if magic != R1CS.MAGIC:
+            raise ValueError(f'"{path}" is not an R1CS file')
+        if version != 1:
+            raise ValueError(f'Unsupported version {version} of R1CS file "{path}"')
+
+        self.sections = {}
+        offset = 12
+        for _ in range(n_sections):
+            (section_type, size) = struct.unpack_from('<IQ', self.mm, offset)
+            self.sections[section_type] = (offset + 12, size)
+            offset += 12 + size
+
+        for section_type in [SECTION_HEADER, SECTION_CONSTRAINTS]:
+            if section_type not in self.sections:
+                raise ValueError(f'R1CS file "{path}" has no section of type {section_type}')
+
+        (offset, _) = self.sections[SECTION_HEADER]
+        (self.n8,) = struct.unpack_from('<I', self.mm, offset)
+        self.prime = int.from_bytes(self.mm[offset+4 : offset+4+self.n8], 'little')
+        (
+            self.n_wires,
+            self.n_pub_out,
+            self.n_pub_in,
+            self.n_prv_in,
+            self.n_labels,
+            self.n_constraints,
+        ) = struct.unpack_from('<IIIIQI', self.mm, offset+4+self.n8)
+
+    def constraint_wires(self):
+        '''
+        Iterates over the constraints and yields the wires they use.
+        The coefficients are skipped.
+
+        :return: a generator of tuples (a, b, c), each a `uint32` array (a view into the file) of the wire ids of the linear combination
+        '''
+        (offset, _) = self.sections[SECTION_CONSTRAINTS]
+        term_size = 4 + self.n8
+
+        for _ in range(self.n_constraints):
+            combinations = []
+            for _ in range(3):
+                (n_terms,) = struct.unpack_from('<I', self.mm, offset)
+                combinations.append(np.ndarray((n_terms,), dtype='<u4', buffer=self.mm, offset=offset+4, strides=(term_size,)))
+                offset += 4 + n_terms * term_size
+            yield tuple(combinations)
+
+    def wire_labels(self) -> np.ndarray:
+        '''
+        :return: the label id of every wire, a `uint64` array (a view into the file)
+        '''
+        (offset, _) = self.sections[SECTION_WIRE2LABEL]
+        return np.frombuffer(self.mm, dtype='<u8', count=self.n_wires, offset=offset)
+
+def component_of(signal:str) -> str:
+    '''
+    :param signal: the full name of a signal, e.g. `main.ntt_p.ntt.out[3]`
+    :return: the name of the component instance it belongs to, e.g. `main.ntt_p.ntt`
+    '''
+    return signal.rsplit('.', 1)[0] if '.' in signal else signal
+
+def read_sym(path:str, n_wires:int) -> list[str]:
+    '''
+    Reads a symbol file and assigns every wire to a component instance.
+
+    Every line of the file has the form `label,wire,component,name`, where
+    the wire is -1 if the optimizer removed the signal. A wire often carries
+    several labels, e.g. the output of a subcomponent and the signal of the
+    parent it is assigned to. The wire is attributed to the deepest of these
+    components, which is the one whose template created the signal.
+
+    :param path: path to the symbol file
+    :param n_wires: number of wires of the circuit
+    :return: the component of every wire, `''` for wires without a label (like the constant wire 0)
+    '''
+    components = [''] * n_wires
+
+    with open(path, 'r') as f:
+        for line in f:
+            (_, wire, _, name) = line.rstrip('\n').split(',', 3)
+            wire = int(wire)
+            if wire < 0:
+                continue
+
+            component = component_of(name)
+            if component.count('.') >= components[wire].count('.') or components[wire] == '':
+                components[wire] = component
+
+    return components
+
+def common_component(components:set[str]) -> str:
+    '''
+    :param components: names of component instances
+    :return: the deepest component that contains all of them
+    '''
+    parts = [ c.split('.') for c in components ]
+    prefix = []
+    for level in zip(*parts):
+        if any([ p != level[0] for p in level ]):
+            break
+        prefix.append(level[0])
+
+    return '.'.join(prefix)
+
+def breakdown(r1cs:R1CS, wire_components:list[str]) -> dict[str, dict[str, int]]:
+    '''
+    Attributes every constraint and every wire to a component instance.
+
+    A constraint is attributed to the deepest component that contains the
+    components of all its wires (cf. `read_sym`), since a template can only
+    constrain its own signals and the inputs and outputs of its subcomponents.
+    With `--O1` or `--O2`, the optimizer substitutes signals across templates,
+    so the attribution is a close approximation rather than exact.
+
+    :param r1cs: the constraint system
+    :param wire_components: the component of every wire, cf. `read_sym`
+    :return: a dictionary mapping component names to their own numbers of `constraints` and `wires`
+    '''
+    counts = {}
+    get = lambda c: counts.setdefault(c, {'constraints': 0, 'wires': 0})
+
+    for c in wire_components:
+        if c != '':
+            get(c)['wires'] += 1
+
+    for (a, b, c) in r1cs.constraint_wires():
+        wires = np.unique(np.concatenate((a, b, c)))
+        components = { wire_components[w] for w in wires if wire_components[w] != '' }
+        get(common_component(components) if len(components) > 0 else 'main')['constraints'] += 1
+
+    return counts
+
+def collapse_arrays(counts:dict[str, dict[str, int]]) -> dict[str, dict[str, int]]:
+    '''
+    Merges the instances of component arrays, e.g. `main.b2f[0]` and
+    `main.b2f[1]` into `main.b2f[*]`, by summing their numbers.
+
+    :param counts: as returned by `breakdown`
+    :return: the merged dictionary
+    '''
+    merged = {}
+    for (component, c) in counts.items():
+        entry = merged.setdefault(re.sub(r'\[\d+\]', '[*]', component), {'constraints': 0, 'wires': 0})
+        entry['constraints'] += c['constraints']
+        entry['wires'] += c['wires']
+
+    return merged
+
+def hierarchy(counts:dict[str, dict[str, int]], max_depth:int|None=None) -> list[tuple[str, int, int, int, int, int]]:
+    '''
+    Rolls the numbers of every component up to its ancestors and flattens
+    the tree in depth-first order. Components deeper than `max_depth` are
+    only included in the totals of their ancestors.
+
+    :param counts: numbers per component, cf. `breakdown` or `collapse_arrays`
+    :param max_depth: maximal depth of listed components, where `main` has depth 0
+    :return: a list of tuples (component, depth, own constraints, total constraints, own wires, total wires)
+    '''
+    totals = {}
+    for (component, c) in counts.items():
+        parts = component.split('.')
+        for i in range(1, len(parts)+1):
+            entry = totals.setdefault('.'.join(parts[:i]), {'constraints': 0, 'wires': 0})
+            entry['constraints'] += c['constraints']
+            entry['wires'] += c['wires']
+
+    rows = []
+    for component in sorted(totals.keys(), key=lambda c: c.split('.')):
+        depth = component.count('.')
+        if max_depth is not None and depth > max_depth:
+            continue
+
+        own = counts.get(component, {'constraints': 0, 'wires': 0})
+        rows.append((
+            component, depth,
+            own['constraints'], totals[component]['constraints'],
+            own['wires'], totals[component]['wires'],
+        ))
+
+    return rows
+
+def analyze(r1cs_path:str, sym_path:str|None=None, max_depth:int|None=None, collapse:bool=True) -> list[tuple[str, int, int, int, int, int]]:
+    '''
+    Computes the hierarchical breakdown of a compiled circuit.
+
+    :param r1cs_path: path to the R1CS file
+    :param sym_path: path to the symbol file, defaults to the R1CS file with extension `.sym`
+    :param max_depth: cf. `hierarchy`
+    :param collapse: whether to merge the instances of component arrays, cf. `collapse_arrays`
+    :return: cf. `hierarchy`
+    '''
+    r1cs = R1CS(r1cs_path)
+    sym_path = sym_path or re.sub(r'\.r1cs$', '', r1cs_path) + '.sym'
+
+    counts = breakdown(r1cs, read_sym(sym_path, r1cs.n_wires))
+    if collapse:
+        counts = collapse_arrays(counts)
+
+    return hierarchy(counts, max_depth)
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    max_depth = None
+    collapse = True
+
+    while len(args) > 0 and args[0].startswith('-'):
+        match args[0]:
+            case '--depth' if len(args) > 1:
+                max_depth = int(args[1])
+                args = args[2:]
+            case '--no-collapse':
+                collapse = False
+                args = args[1:]
+            case _:
+                args = []
+
+    if len(args) not in [1, 2]:
+        print(__doc__, file=sys.stderr)
+        sys.exit(1)
+
+    print(f'{"component":<60} {"constraints":>12} {"(own)":>10} {"wires":>12} {"(own)":>10}')
+    for (component, depth, own_c, total_c, own_w, total_w) in analyze(*args, max_depth=max_depth, collapse=collapse):
+        name = '  ' * depth + component.rsplit('.', 1)[-1]
+        print(f'{name:<60} {total_c:>12} {own_c:>10} {total_w:>12} {own_w:>10}')
@@ -0,0 +1,348 @@
+import pandas as pd
+import math
+import sys
+
+KEY_COLUMNS = ['vector length', 'optimization']
+CONSTRAINT_COLUMNS = ['lin. constr.', 'non-lin. constr.']
+TIME_COLUMNS = ['P time', 'V time']
+
+EXIT_REGRESSION = 1
+EXIT_USAGE = 2
+EXIT_INCOMPLETE = 3
+
+OPTIONS = [
+    {
+        'options': ['--help', '-h'],
+        'needs_parameter': False,
+        'maps_to': 'help',
+        'description': 'Prints this message'
+    },
+    {
+        'options': ['--time-threshold', '-t'],
+        'needs_parameter': True,
+        'maps_to': 'time_threshold',
+        'description': 'Relative slowdown of the prover or verifier time that counts as\n\t\t\tregression, if it is also significant (default: 0.1, i.e. 10%).'
+    },
+    {
+        'options': ['--alpha', '-a'],
+        'needs_parameter': True,
+        'maps_to': 'alpha',
+        'description': 'Significance level for the comparison of times (default: 0.01).'
+    },
+    {
+        'options': ['--constraint-tolerance', '-c'],
+        'needs_parameter': True,
+        'maps_to': 'constraint_tolerance',
+        'description': 'Number of additional constraints that is still accepted\n\t\t\t(default: 0).'
+    },
+    {
+        'options': ['--allow-missing'],
+        'needs_parameter': False,
+        'maps_to': 'allow_missing',
+        'description': 'Accept a partial fresh run, i.e. configurations of the baseline\n\t\t\tthat are missing in the fresh CSV.'
+    },
+]
+
+OPTIONS_DICT = { o:opt for opt in OPTIONS for o in opt['options'] }
+
+def eprint(*args, **kwargs):
+    '''
+    Print an error message to stderr. (Simple wrapper around `print()`)
+    '''
+    print(*args, file=sys.stderr, **kwargs)
+
+def usage(*args):
+    '''
+    Prints the usage message (and the given error message, if any) to stderr
+    and terminates the execution with exit code `EXIT_USAGE`.
+    '''
+    if len(args) > 0:
+        eprint(*args)
+        eprint()
+
+    eprint(f'Usage: {sys.argv[0]} [Options] <baseline CSV> <fresh CSV>')
+    eprint()
+    eprint('Compares a fresh benchmark run against a baseline, row by row for')
+    eprint('every vector length and optimization both files contain.')
+    eprint()
+    eprint('Options:')
+    for opt in OPTIONS:
+        eprint(f'\t{", ".join(opt["options"])}\t{opt["description"]}')
+    eprint()
+    eprint('Exit Codes:')
+    eprint('\t0\tno regression')
+    eprint(f'\t{EXIT_REGRESSION}\tat least one regression')
+    eprint(f'\t{EXIT_USAGE}\tinvalid arguments or input files')
+    eprint(f'\t{EXIT_INCOMPLETE}\tno regression, but nothing compared or configurations of the\n\t\tbaseline missing in the fresh run (unless --allow-missing)')
+
+    sys.exit(EXIT_USAGE)
+
+def parse_cli_arguments(argv:list[str]) -> dict:
+    '''
+    Parses the command-line arguments: options (cf. `OPTIONS`) followed by
+    the paths to the baseline and the fresh CSV file.
+
+    :param argv: The CLI arguments as obtained by e.g. `sys.argv`
+    :return: the configuration dictionary, with the paths under `baseline` and `fresh`
+    '''
+    config = {}
+
+    i = 1
+    while i < len(argv) and argv[i].startswith('-'):
+        if argv[i] not in OPTIONS_DICT:
+            usage(f'Unable to parse option "{argv[i]}"')
+
+        opt = OPTIONS_DICT[argv[i]]
+
+        if opt['needs_parameter']:
+            if i+1 >= len(argv):
+                usage(f'Option "{argv[i]}" needs a parameter')
+            config[opt['maps_to']] = argv[i+1]
+            i += 2
+        else:
+            config[opt['maps_to']] = True
+            i += 1
+
+    if 'help' in config:
+        usage()
+
+    if len(argv) - i != 2:
+        usage(f'Expected exactly two CSV files, got {len(argv) - i}.')
+
+    (config['baseline'], config['fresh']) = argv[i:]
+
+    return config
+
+def load_csv(path:str) -> pd.DataFrame:
+    '''
+    Reads a benchmark CSV and checks that it has the columns needed for the comparison.
+
+    :param path: path to a `;`-separated CSV as written by `benchmark.py`
+    :return: the data frame
+    '''
+    try:
+        df = pd.read_csv(path, sep=';')
+    except FileNotFoundError:
+        usage(f'Unable to open file "{path}"')
+
+    for col in KEY_COLUMNS + CONSTRAINT_COLUMNS + TIME_COLUMNS:
+        if col not in df.columns:
+            usage(f'Couldn\'t find required header "{col}" in "{path}".')
+
+    return df
+
+def stats_of(row:pd.Series, column:str) -> tuple[float, float|None, int|None, float|None]:
+    '''
+    Collects what a row tells about the distribution of a time column.
+    Rows of older benchmarks only have the mean, rows of `benchmark.py`
+    with repetitions also have the standard deviation, the number of samples
+    and the lower bound of a confidence interval of the mean.
+
+    :param row: a row of a benchmark CSV
+    :param column: 'P time' or 'V time'
+    :return: a tuple (mean, stddev, samples, ci low), with None for unknown entries
+    '''
+    prefix = column.split(' ')[0]
+    get = lambda col: row[col] if col in row.index and not pd.isna(row[col]) else None
+
+    samples = get('samples')
+    return (
+        float(row[column]),
+        get(f'{prefix} stddev'),
+        None if samples is None else int(samples),
+        get(f'{prefix} ci low'),
+    )
+
+def regularized_beta(x:float, a:float, b:float) -> float:
+    '''
+    Computes the regularized incomplete beta function I_x(a, b) with the
+    continued fraction of Numerical Recipes (modified Lentz's method).
+
+    :param x: the upper limit of integration, in [0, 1]
+    :param a: first shape parameter, positive
+    :param b: second shape parameter, positive
+    :return: I_x(a, b)
+    '''
+    if x <= 0 or x >= 1:
+        return 0.0 if x <= 0 else 1.0
+
+    # the continued fraction converges quickly only for x < (a+1)/(a+b+2), use the symmetry otherwise
+    if x > (a+1) / (a+b+2):
+        return 1 - regularized_beta(1-x, b, a)
+
+    front = math.exp(a*math.log(x) + b*math.log(1-x) - (math.lgamma(a) + math.lgamma(b) - math.lgamma(a+b))) / a
+
+    tiny = 1e-300
+    (c, d) = (1.0, 1 - (a+b) * x / (a+1))
+    d = 1 / (d if abs(d) > tiny else tiny)
+    f = d
+    for i in range(1, 300):
+        for numerator in [
+            i * (b-i) * x / ((a+2*i-1) * (a+2*i)),
+            -(a+i) * (a+b+i) * x / ((a+2*i) * (a+2*i+1)),
+        ]:
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            f *= c * d
+        if abs(c * d - 1) < 1e-15:
+            break
+
+    return front * f
+
+def welch_test(mean_1:float, std_1:float, n_1:int, mean_2:float, std_2:float, n_2:int) -> float:
+    '''
+    Welch's t-test for equal means of two samples with possibly different
+    variances. The statistic is compared against the Student-t distribution
+    with the Welch–Satterthwaite degrees of freedom, which, unlike the normal
+    approximation, does not overstate the significance for few samples.
+
+    :param mean_1: mean of the first sample
+    :param std_1: sample standard deviation of the first sample
+    :param n_1: size of the first sample, at least 2
+    :param mean_2: mean of the second sample
+    :param std_2: sample standard deviation of the second sample
+    :param n_2: size of the second sample, at least 2
+    :return: the two-sided p-value
+    '''
+    (v_1, v_2) = (std_1**2 / n_1, std_2**2 / n_2)
+    if v_1 + v_2 == 0:
+        return 1.0 if mean_1 == mean_2 else 0.0
+
+    t = (mean_1 - mean_2) / math.sqrt(v_1 + v_2)
+    df = (v_1 + v_2)**2 / (v_1**2 / (n_1-1) + v_2**2 / (n_2-1))
+
+    # P(|T| >= |t|) for T ~ t(df)
+    return regularized_beta(df / (df + t**2), df/2, 0.5)
+
+def compare_times(baseline:tuple, fresh:tuple, threshold:float, alpha:float) -> tuple[str, str]:
+    '''
+    Decides whether a time got significantly worse. A slowdown counts only
+    if the fresh mean exceeds the baseline by more than `threshold` (relative)
+    and the difference is significant, as far as the data allows to tell:
+        - If both rows have a standard deviation and a number of samples,
+          Welch's t-test (cf. `welch_test`) must reject equal means at level `alpha`.
+        - Otherwise, if the fresh row has a confidence interval, its lower
+          bound must exceed the baseline by more than `threshold`.
+        - Otherwise, only the relative threshold is applied.
+    Speedups are detected the same way, with the roles of the rows swapped
+    where the data permits.
+
+    :param baseline: statistics of the baseline, cf. `stats_of`
+    :param fresh: statistics of the fresh run, cf. `stats_of`
+    :param threshold: relative change that is considered relevant
+    :param alpha: significance level
+    :return: a tuple of the verdict ('regression', 'improvement' or 'ok') and an explanation
+    '''
+    (b_mean, b_std, b_n, _) = baseline
+    (f_mean, f_std, f_n, f_ci_low) = fresh
+
+    ratio = f_mean / b_mean if b_mean > 0 else math.inf
+    change = f'{b_mean:.1f} -> {f_mean:.1f} ms ({(ratio-1)*100:+.1f}%)'
+
+    if abs(ratio - 1) <= threshold:
+        return ('ok', change)
+
+    if None not in [b_std, b_n, f_std, f_n] and b_n > 1 and f_n > 1:
+        p = welch_test(f_mean, f_std, f_n, b_mean, b_std, b_n)
+        change += f', p = {p:.2g}'
+        if p >= alpha:
+            return ('ok', change + ', not significant')
+    elif f_ci_low is not None and ratio > 1 and f_ci_low <= b_mean * (1 + threshold):
+        return ('ok', change + ', within confidence interval')
+
+    return ('regression' if ratio > 1 else 'improvement', change)
+
+def compare(baseline:pd.DataFrame, fresh:pd.DataFrame, threshold:float, alpha:float, tolerance:int) -> list[tuple]:
+    '''
+    Compares all rows of the fresh run with the rows of the baseline that have
+    the same vector length and optimization. Constraint counts are compared
+    exactly (up to `tolerance` additional constraints), times with `compare_times`.
+    Configurations of the baseline that the fresh run lacks are reported as
+    `missing`, configurations that only the fresh run has as `skipped`.
+
+    :param baseline: the baseline data frame
+    :param fresh: the data frame of the fresh run
+    :param threshold: relative change of times that is considered relevant
+    :param alpha: significance level for times
+    :param tolerance: number of additional constraints that is accepted
+    :return: a list of tuples (vector length, optimization, column, verdict, explanation)
+    '''
+    merged = pd.merge(
+        baseline.groupby(KEY_COLUMNS, as_index=False).first(),
+        fresh.groupby(KEY_COLUMNS, as_index=False).first(),
+        on=KEY_COLUMNS, how='outer', suffixes=(' (baseline)', ' (fresh)'), indicator=True
+    ).sort_values(KEY_COLUMNS)
+
+    results = []
+
+    for (_, row) in merged.iterrows():
+        key = (int(row['vector length']), row['optimization'])
+
+        if row['_merge'] == 'left_only':
+            results.append((*key, '', 'missing', 'not in fresh run'))
+            continue
+        if row['_merge'] == 'right_only':
+            results.append((*key, '', 'skipped', 'not in baseline'))
+            continue
+
+        side = lambda suffix: row[[ c for c in row.index if c.endswith(suffix) ]].rename(lambda c: c[:-len(suffix)])
+        (b, f) = (side(' (baseline)'), side(' (fresh)'))
+
+        for col in CONSTRAINT_COLUMNS:
+            diff = int(f[col]) - int(b[col])
+            verdict = 'regression' if diff > tolerance else ('improvement' if diff < 0 else 'ok')
+            results.append((*key, col, verdict, f'{int(b[col])} -> {int(f[col])} ({diff:+d})'))
+
+        for col in TIME_COLUMNS:
+            results.append((*key, col, *compare_times(stats_of(b, col), stats_of(f, col), threshold, alpha)))
+
+    return results
+
+def main(argv:list[str]):
+    '''
+    Main function of the program.
+    Compares the two CSV files given in `argv`, prints one line per compared
+    value and terminates with exit code `EXIT_REGRESSION` if any value regressed.
+    Otherwise, it terminates with exit code `EXIT_INCOMPLETE` if nothing could
+    be compared, or if configurations of the baseline are missing in the fresh
+    run and `--allow-missing` is not given, so that a crashed or truncated
+    sweep never passes as a run without regressions.
+    '''
+    config = parse_cli_arguments(argv)
+
+    try:
+        threshold = float(config.get('time_threshold', 0.1))
+        alpha = float(config.get('alpha', 0.01))
+        tolerance = int(config.get('constraint_tolerance', 0))
+    except ValueError:
+        usage('The time threshold and alpha need to be numbers, the constraint tolerance an integer.')
+
+    results = compare(load_csv(config['baseline']), load_csv(config['fresh']), threshold, alpha, tolerance)
+
+    for (n, opt, col, verdict, explanation) in results:
+        print(f'{n}\t{opt}\t{col:<16}\t{verdict.upper():<11}\t{explanation}')
+
+    regressions = [ r for r in results if r[3] == 'regression' ]
+    missing = [ r for r in results if r[3] == 'missing' ]
+    compared = len([ r for r in results if r[3] not in ['skipped', 'missing'] ])
+
+    print()
+    if len(regressions) > 0:
+        print(f'{len(regressions)} of {compared} compared values regressed.')
+        sys.exit(EXIT_REGRESSION)
+
+    if compared == 0:
+        print('Nothing was compared, the fresh run has no configuration of the baseline.')
+        sys.exit(EXIT_INCOMPLETE)
+
+    print(f'No regression in {compared} compared values.')
+
+    if len(missing) > 0:
+        print(f'{len(missing)} configurations of the baseline are missing in the fresh run.')
+        if 'allow_missing' not in config:
+            sys.exit(EXIT_INCOMPLETE)
+
+if __name__ == '__main__':
+    main(sys.argv)
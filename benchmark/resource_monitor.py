@@ -0,0 +1,190 @@
+'''
+Measures wall time, CPU time and peak RSS of a process and all of its descendants.
+
+The module only depends on the standard library, so it can also run inside
+the docker container of the circuit compilation. Used as a script, it runs a
+command and prints a summary line that `benchmark.py` parses:
+
+    python3 resource_monitor.py <phase> <command> [args...]
+
+prints (after the output of the command)
+
+    phase <phase>: wall 1234.5 ms, cpu 2345.6 ms, peak rss 123456 kB
+
+and exits with the exit code of the command.
+'''
+
+import subprocess
+import threading
+import resource
+import time
+import sys
+import os
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE_KB = os.sysconf('SC_PAGE_SIZE') // 1024
+
+def read_proc_stats() -> dict[int, tuple[int, float, int]]:
+    '''
+        Reads `/proc/<pid>/stat` of all processes.
+
+        :return: a dictionary mapping every pid to a tuple (ppid, cpu time in ms, rss in kB)
+    '''
+    stats = {}
+
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                stat = f.read()
+        except OSError: # the process terminated in the meantime
+            continue
+
+        # the command name may contain spaces and parentheses, so split after the last ')'
+        fields = stat[stat.rindex(')')+2:].split(' ')
+        ppid = int(fields[1])
+        cpu = (int(fields[11]) + int(fields[12])) * 1000 / CLOCK_TICKS # utime + stime
+        rss = int(fields[21]) * PAGE_SIZE_KB
+
+        stats[int(entry)] = (ppid, cpu, rss)
+
+    return stats
+
+def descendants(root:int, stats:dict[int, tuple[int, float, int]]) -> list[int]:
+    '''
+        :param root: pid of the root process
+        :param stats: process statistics as returned by `read_proc_stats`
+        :return: the pids of `root` and all of its (living) descendants
+    '''
+    children = {}
+    for (pid, (ppid, _, _)) in stats.items():
+        children.setdefault(ppid, []).append(pid)
+
+    tree = []
+    todo = [root] if root in stats else []
+    while len(todo) > 0:
+        pid = todo.pop()
+        tree.append(pid)
+        todo += children.get(pid, [])
+
+    return tree
+
+class ProcessTreeMonitor:
+    '''
+        Samples the process tree below a given process in the background.
+
+        Every `interval` seconds, the CPU time and the resident set size of the
+        process and all of its descendants are read from `/proc`. The CPU time
+        of the tree is the sum of the last CPU time seen for every process, the
+        peak RSS is the largest sum of the RSS over the tree at one sample.
+        Processes that live shorter than one interval may be missed.
+
+        Usage:
+            with ProcessTreeMonitor(pid) as monitor:
+                ...
+            monitor.result() # {'wall': ..., 'cpu': ..., 'peak_rss': ...}
+
+        :param pid: pid of the root process
+        :param interval: sampling interval in seconds
+    '''
+
+    def __init__(self, pid:int, interval:float=0.05):
+        self.pid = pid
+        self.interval = interval
+
+        self._cpu = {}
+        self._peak_rss = 0
+        self._wall = 0.0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        '''
+            Takes one sample of the process tree
+        '''
+        stats = read_proc_stats()
+        tree = descendants(self.pid, stats)
+
+        for pid in tree:
+            self._cpu[pid] = stats[pid][1]
+        self._peak_rss = max(self._peak_rss, sum([ stats[pid][2] for pid in tree ]))
+
+    def _run(self):
+        '''
+            Samples the process tree until `stop` is called
+        '''
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        '''
+            Starts sampling. CPU times are counted relative to the start.
+        '''
+        self._t0 = time.perf_counter()
+        self._sample()
+        self._cpu_offset = dict(self._cpu)
+        self._thread.start()
+
+    def stop(self):
+        '''
+            Takes a last sample and stops sampling
+        '''
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        self._wall = (time.perf_counter() - self._t0) * 1000
+
+    def result(self) -> dict[str, float]:
+        '''
+            :return: a dictionary with the wall time and CPU time in ms and the peak RSS in kB
+        '''
+        return {
+            'wall': self._wall,
+            'cpu': sum([ cpu - self._cpu_offset.get(pid, 0) for (pid, cpu) in self._cpu.items() ]),
+            'peak_rss': self._peak_rss,
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+def run_phase(phase:str, command:list[str]) -> int:
+    '''
+        Runs a command while monitoring its process tree and prints a summary line.
+
+        Since this process has no other children, the CPU time and the peak RSS
+        reported by `getrusage` for the terminated children are exact and are
+        used in favor of the sampled values where they are larger.
+
+        :param phase: name of the phase for the summary line
+        :param command: the command and its arguments
+        :return: the exit code of the command
+    '''
+    process = subprocess.Popen(command)
+
+    with ProcessTreeMonitor(process.pid) as monitor:
+        process.wait()
+
+    res = monitor.result()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    cpu = max(res['cpu'], (usage.ru_utime + usage.ru_stime) * 1000)
+    peak_rss = max(res['peak_rss'], usage.ru_maxrss)
+
+    print(f'phase {phase}: wall {res["wall"]:.1f} ms, cpu {cpu:.1f} ms, peak rss {peak_rss} kB', flush=True)
+
+    return process.returncode
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(f'Usage: {sys.argv[0]} <phase> <command> [args...]', file=sys.stderr)
+        sys.exit(1)
+
+    sys.exit(run_phase(sys.argv[1], sys.argv[2:]))
@@ -0,0 +1,170 @@
+import sqlite3
+import socket
+import json
+import time
+
+class ResultsStore:
+    '''
+        A local SQLite database of benchmark results, so that an interrupted
+        sweep can be resumed instead of restarted.
+
+        Every result is one CSV row of `benchmark.py`, stored as a JSON object
+        that maps the column names to the values. This way, rows of older runs
+        stay readable when columns are added. A result is identified by
+            - the hash of the circuit sources (cf. `circuit_source_hash` in `benchmark.py`)
+            - the vector length `n`
+            - the compilation flags
+            - the host name
+            - the run id
+        where a run is one invocation of the sweep (or several, if it is resumed).
+
+        Before results are looked up or saved, a run has to be started with
+        `begin_run`, which fixes the source hash, the host and the run id for
+        all further calls.
+
+        :param path: path to the database file, which is created if it does not exist
+    '''
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            host TEXT NOT NULL,
+            source_hash TEXT NOT NULL,
+            started REAL NOT NULL,
+            parameters TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS results (
+            source_hash TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            cflags TEXT NOT NULL,
+            host TEXT NOT NULL,
+            run_id TEXT NOT NULL REFERENCES runs(run_id),
+            finished REAL NOT NULL,
+            row TEXT NOT NULL,
+            PRIMARY KEY (source_hash, n, cflags, host, run_id)
+        );
+    '''
+
+    def __init__(self, path:str):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(ResultsStore.SCHEMA)
+
+        self.run_id = None
+        self.host = None
+        self.source_hash = None
+
+    def new_run_id() -> str:
+        '''
+            :return: a new run id, derived from the current time
+        '''
+        return time.strftime('%Y%m%d-%H%M%S')
+
+    def latest_run_id(self, source_hash:str, host:str|None=None) -> str|None:
+        '''
+            Looks up the most recently started run for the given circuit sources on a host.
+
+            :param source_hash: hash of the circuit sources
+            :param host: host name, defaults to the name of this host
+            :return: the run id, or None if there is no such run
+        '''
+        res = self.connection.execute(
+            'SELECT run_id FROM runs WHERE source_hash = ? AND host = ? ORDER BY started DESC LIMIT 1',
+            (source_hash, host or socket.gethostname())
+        ).fetchone()
+
+        return None if res is None else res[0]
+
+    def begin_run(self, run_id:str, source_hash:str, parameters:dict, host:str|None=None, force:bool=False):
+        '''
+            Starts a run or continues it, if a run with this id already exists.
+            In the latter case, the source hash and the host have to match, and
+            so do the parameters of the sweep, unless `force` is set. Otherwise,
+            one run would mix rows measured under different settings.
+
+            :param run_id: id of the run, e.g. from `new_run_id`
+            :param source_hash: hash of the circuit sources
+            :param parameters: parameters of the sweep (JSON-serializable), stored with the run
+            :param host: host name, defaults to the name of this host
+            :param force: whether to continue a run even if its parameters differ
+        '''
+        host = host or socket.gethostname()
+
+        existing = self.connection.execute(
+            'SELECT source_hash, host, parameters FROM runs WHERE run_id = ?', (run_id,)
+        ).fetchone()
+
+        if existing is None:
+            with self.connection:
+                self.connection.execute(
+                    'INSERT INTO runs VALUES (?, ?, ?, ?, ?)',
+                    (run_id, host, source_hash, time.time(), json.dumps(parameters))
+                )
+        elif existing[:2] != (source_hash, host):
+            raise ValueError(f'Run "{run_id}" was started on host "{existing[1]}" with different circuit sources and cannot be continued')
+        else:
+            stored = json.loads(existing[2])
+            # round trip through JSON, so that e.g. tuples compare equal to the stored lists
+            differences = ResultsStore.parameter_differences(stored, json.loads(json.dumps(parameters)))
+            if len(differences) > 0 and not force:
+                raise ValueError(f'Run "{run_id}" was started with different parameters ({", ".join(differences)}) and cannot be continued without --force')
+
+        self.run_id = run_id
+        self.host = host
+        self.source_hash = source_hash
+
+    def parameter_differences(stored:dict, parameters:dict) -> list[str]:
+        '''
+            :param stored: the parameters a run was started with
+            :param parameters: the parameters of the current invocation
+            :return: a description `name: stored -> current` of every parameter that differs
+        '''
+        return [
+            f'{key}: {stored.get(key)} -> {parameters.get(key)}'
+            for key in sorted(set(stored) | set(parameters))
+            if stored.get(key) != parameters.get(key)
+        ]
+
+    def lookup(self, n:int, cflags:str) -> dict|None:
+        '''
+            :param n: vector length
+            :param cflags: compilation flags
+            :return: the stored row of the current run as dictionary from column names to values, or None
+        '''
+        res = self.connection.execute(
+            'SELECT row FROM results WHERE source_hash = ? AND n = ? AND cflags = ? AND host = ? AND run_id = ?',
+            (self.source_hash, n, cflags, self.host, self.run_id)
+        ).fetchone()
+
+        return None if res is None else json.loads(res[0])
+
+    def save(self, n:int, cflags:str, row:dict):
+        '''
+            Stores the result of a configuration in the current run and commits it
+            immediately, so it survives if the sweep dies afterwards.
+
+            :param n: vector length
+            :param cflags: compilation flags
+            :param row: the CSV row as dictionary from column names to values
+        '''
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self.source_hash, n, cflags, self.host, self.run_id, time.time(), json.dumps(row))
+            )
+
+    def export(self, run_id:str, columns:list[str]) -> list[list]:
+        '''
+            Exports all results of a run, ordered by vector length and compilation flags.
+
+            :param run_id: id of the run
+            :param columns: the columns to export, in order. Columns a row does not have are left empty.
+            :return: one list of values per result
+        '''
+        rows = self.connection.execute(
+            'SELECT row FROM results WHERE run_id = ? ORDER BY n, cflags', (run_id,)
+        ).fetchall()
+
+        return [ [ row.get(col, '') for col in columns ] for row in map(lambda r: json.loads(r[0]), rows) ]
+
+    def close(self):
+        self.connection.close()
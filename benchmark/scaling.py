@@ -0,0 +1,304 @@
+import numpy as np
+import pandas as pd
+import math
+import sys
+
+DEFAULT_COLUMNS = ['P time', 'V time', 'lin. constr.', 'non-lin. constr.']
+
+MODELS = {
+    'linear': {
+        'formula': 'a + b*n',
+        'basis': lambda n: [np.ones_like(n), n],
+    },
+    'n log n': {
+        'formula': 'a + b*n*log2(n)',
+        'basis': lambda n: [np.ones_like(n), n * np.log2(n)],
+    },
+    'quadratic': {
+        'formula': 'a + b*n + c*n^2',
+        'basis': lambda n: [np.ones_like(n), n, n**2],
+    },
+}
+
+OPTIONS = [
+    {
+        'options': ['--help', '-h'],
+        'needs_parameter': False,
+        'maps_to': 'help',
+        'description': 'Prints this message'
+    },
+    {
+        'options': ['--column', '-c'],
+        'needs_parameter': True,
+        'maps_to': 'columns',
+        'description': 'Column to fit, may be given several times\n\t\t\t(default: ' + ', '.join(DEFAULT_COLUMNS) + ').'
+    },
+    {
+        'options': ['--target', '-t'],
+        'needs_parameter': True,
+        'maps_to': 'targets',
+        'description': 'Vector length to extrapolate to, may be given several times\n\t\t\t(default: 2^14 to 2^20).'
+    },
+    {
+        'options': ['--optimization', '-O'],
+        'needs_parameter': True,
+        'maps_to': 'optimization',
+        'description': 'Only fit rows with these compilation flags, e.g. --O2.\n\t\t\tOtherwise, every optimization is fitted separately.'
+    },
+    {
+        'options': ['--output', '-o'],
+        'needs_parameter': True,
+        'maps_to': 'output_file',
+        'description': 'Plot the data points together with the best fits and\n\t\t\tstore the plot in the given file.'
+    },
+]
+
+OPTIONS_DICT = { o:opt for opt in OPTIONS for o in opt['options'] }
+
+def eprint(*args, **kwargs):
+    '''
+    Print an error message to stderr. (Simple wrapper around `print()`)
+    '''
+    print(*args, file=sys.stderr, **kwargs)
+
+def usage(*args):
+    '''
+    Prints the usage message (and the given error message, if any) to stderr
+    and terminates the execution with exit code 1.
+    '''
+    if len(args) > 0:
+        eprint(*args)
+        eprint()
+
+    eprint(f'Usage: {sys.argv[0]} [Options] <CSV file> [CSV file...]')
+    eprint()
+    eprint('Fits the complexity models ' + ', '.join(MODELS.keys()) + ' to the columns')
+    eprint('of benchmark CSV files and extrapolates them to larger vector lengths.')
+    eprint()
+    eprint('Options:')
+    for opt in OPTIONS:
+        eprint(f'\t{", ".join(opt["options"])}\t{opt["description"]}')
+
+    sys.exit(1)
+
+def parse_cli_arguments(argv:list[str]) -> dict:
+    '''
+    Parses the command-line arguments: options (cf. `OPTIONS`) followed by
+    at least one CSV file. Options that can be given several times
+    (`--column`, `--target`) are collected in lists.
+
+    :param argv: The CLI arguments as obtained by e.g. `sys.argv`
+    :return: the configuration dictionary, with the CSV files under `input_files`
+    '''
+    config = {'columns': [], 'targets': []}
+
+    i = 1
+    while i < len(argv) and argv[i].startswith('-'):
+        if argv[i] not in OPTIONS_DICT:
+            usage(f'Unable to parse option "{argv[i]}"')
+
+        opt = OPTIONS_DICT[argv[i]]
+
+        if opt['needs_parameter']:
+            if i+1 >= len(argv):
+                usage(f'Option "{argv[i]}" needs a parameter')
+            if isinstance(config.get(opt['maps_to']), list):
+                config[opt['maps_to']].append(argv[i+1])
+            else:
+                config[opt['maps_to']] = argv[i+1]
+            i += 2
+        else:
+            config[opt['maps_to']] = True
+            i += 1
+
+    if 'help' in config:
+        usage()
+
+    if i >= len(argv):
+        usage('No input files specified.')
+
+    config['input_files'] = argv[i:]
+
+    return config
+
+def fit_model(model:str, n:np.ndarray, y:np.ndarray) -> dict:
+    '''
+    Fits one model of `MODELS` to the data by least squares on the relative
+    errors, i.e. every point is weighted with `1/y`. Otherwise, the largest
+    sizes would dominate the fit, although the times span several orders of
+    magnitude. If `y` contains zeros, the fit is unweighted.
+
+    The quality of the fit is given by the RMS of the relative residuals and
+    by the Bayesian information criterion (BIC) of these residuals, which
+    penalizes the additional parameter of the quadratic model.
+
+    A fit is marked as not plausible if one of its growth terms has a negative
+    coefficient, since its extrapolation eventually decreases or even becomes
+    negative, which no cost of a circuit does.
+
+    :param model: name of the model in `MODELS`
+    :param n: vector lengths
+    :param y: measured values
+    :return: a dictionary with the model name, its coefficients, the relative residuals, their RMS, the BIC and the plausibility
+    '''
+    X = np.stack(MODELS[model]['basis'](n), axis=1)
+    w = 1/y if np.all(y > 0) else np.ones_like(y)
+
+    (coefficients, *_) = np.linalg.lstsq(X * w[:, None], y * w, rcond=None)
+
+    residuals = (X @ coefficients - y) * w
+    rss = float(np.sum(residuals**2))
+    (points, params) = X.shape
+
+    return {
+        'model': model,
+        'coefficients': coefficients,
+        'residuals': residuals,
+        'rms': math.sqrt(rss / points),
+        'bic': points * math.log(max(rss, 1e-300) / points) + params * math.log(points),
+        'plausible': bool(np.all(coefficients[1:] >= -1e-9 * np.abs(coefficients).max())), # no decreasing term
+    }
+
+def predict(fit:dict, n) -> np.ndarray:
+    '''
+    :param fit: a fit as returned by `fit_model`
+    :param n: vector lengths
+    :return: the values of the fitted model at `n`
+    '''
+    n = np.asarray(n, dtype=np.float64)
+    return np.stack(MODELS[fit['model']]['basis'](n), axis=-1) @ fit['coefficients']
+
+def fit_column(df:pd.DataFrame, column:str) -> list[dict]:
+    '''
+    Fits all models of `MODELS` to one column. Rows with the same vector length
+    are averaged first. Models with more parameters than data points are skipped.
+    The best fit is the plausible one with the lowest BIC (cf. `fit_model`),
+    implausible fits are only chosen if no other fit is left.
+
+    :param df: benchmark data of one optimization
+    :param column: the column to fit
+    :return: the fits, the best one first
+    '''
+    data = df.groupby('vector length')[column].mean()
+    n = data.index.to_numpy(dtype=np.float64)
+    y = data.to_numpy(dtype=np.float64)
+
+    fits = [
+        fit_model(model, n, y) for model in MODELS
+        if len(MODELS[model]['basis'](n)) < len(n)
+    ]
+
+    return sorted(fits, key=lambda fit: (not fit['plausible'], fit['bic']))
+
+def format_fit(fit:dict) -> str:
+    '''
+    :param fit: a fit as returned by `fit_model`
+    :return: the fitted formula with its coefficients
+    '''
+    formula = MODELS[fit['model']]['formula']
+    for (name, value) in zip('abc', fit['coefficients']):
+        formula = formula.replace(name, f'({value:.4g})', 1)
+
+    return formula
+
+def report(source:str, optimization:str, column:str, fits:list[dict], targets:list[int]) -> str:
+    '''
+    Formats the fits of one column as text: all models with the RMS of their
+    relative residuals and their BIC, the residuals of the best model and its
+    extrapolation to the target sizes.
+
+    :return: the report
+    '''
+    best = fits[0]
+    lines = [f'{source} [{optimization}] {column}']
+
+    for fit in fits:
+        marker = '*' if fit is best else ' '
+        note = '' if fit['plausible'] else '   (decreasing term)'
+        lines.append(f'  {marker} {fit["model"]:<10} rms rel. residual {fit["rms"]*100:7.2f}%   BIC {fit["bic"]:9.2f}   {format_fit(fit)}{note}')
+
+    lines.append('    residuals of best fit: ' + ', '.join([ f'{r*100:+.1f}%' for r in best['residuals'] ]))
+
+    for t in targets:
+        lines.append(f'    n = {t:>9}: {predict(best, t):.4g}')
+
+    return '\n'.join(lines)
+
+def plot_fits(curves:list[tuple], output_file:str):
+    '''
+    Plots the data points and the best fits, extended to the largest target,
+    with one subplot per column.
+
+    :param curves: list of (label, column, data frame, best fit, largest vector length)
+    :param output_file: file to store the plot in
+    '''
+    import matplotlib.pyplot as plt
+
+    columns = list(dict.fromkeys([ column for (_, column, _, _, _) in curves ]))
+    (fig, axes) = plt.subplots(len(columns), 1, figsize=(10, 4*len(columns)), squeeze=False)
+
+    for (label, column, df, fit, n_max) in curves:
+        ax = axes[columns.index(column)][0]
+        data = df.groupby('vector length')[column].mean()
+
+        n = np.geomspace(data.index.min(), n_max, 200)
+        line = ax.plot(n, predict(fit, n), '--', label=f'{label}: {fit["model"]}')[0]
+        ax.plot(data.index, data.values, 'o', color=line.get_color())
+
+        ax.set_title(column, loc='left')
+        ax.set_xscale('log', base=2)
+        ax.set_yscale('log')
+        ax.legend()
+
+    axes[-1][0].set_xlabel('vector length')
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=200)
+
+def main(argv:list[str]):
+    '''
+    Main function of the program.
+    Fits the requested columns of every input file and optimization,
+    prints the reports to stdout and optionally plots the best fits.
+    '''
+    config = parse_cli_arguments(argv)
+
+    columns = config['columns'] or DEFAULT_COLUMNS
+    try:
+        targets = [ int(t) for t in config['targets'] ] or [ 2**i for i in range(14, 21) ]
+    except ValueError:
+        usage('Target vector lengths need to be integers')
+
+    curves = []
+
+    for path in config['input_files']:
+        try:
+            df = pd.read_csv(path, sep=';')
+        except FileNotFoundError:
+            usage(f'Unable to open file "{path}"')
+
+        for col in ['vector length', 'optimization'] + columns:
+            if col not in df.columns:
+                usage(f'Couldn\'t find column "{col}" in "{path}".')
+
+        if 'optimization' in config:
+            df = df[ df['optimization'] == config['optimization'] ]
+
+        for (optimization, group) in df.groupby('optimization'):
+            for column in columns:
+                if (group[column] == 0).all():
+                    print(f'{path} [{optimization}] {column}\n    all values are 0\n')
+                    continue
+
+                fits = fit_column(group, column)
+                if len(fits) == 0:
+                    print(f'{path} [{optimization}] {column}\n    too few vector lengths to fit\n')
+                    continue
+
+                print(report(path, optimization, column, fits, targets) + '\n')
+                curves.append((f'{path} [{optimization}]', column, group, fits[0], max(targets + [group['vector length'].max()])))
+
+    if 'output_file' in config:
+        plot_fits(curves, config['output_file'])
+
+if __name__ == '__main__':
+    main(sys.argv)
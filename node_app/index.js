@@ -11,6 +11,7 @@ import {performance} from 'perf_hooks';
 
 const snarkjs = require("snarkjs");
 import fs from 'fs';
+import readline from 'readline';
 
 /**
  * This is the (prime) order of the field over the BN128 elliptic curve
@@ -18,11 +19,26 @@ import fs from 'fs';
 const max_r = 21888242871839275222246405745257275088548364400416034343698204186575808495617;
 
 /**
- * Absolute path to the wasm file of the SNARK circuit (generated by SnarkJS)
+ * Absolute path to the default wasm file of the SNARK circuit (generated by SnarkJS).
+ * It is used unless another wasm file is set with {@link set_wasm_file}.
  */
-const wasm_file = import.meta.dirname + "/../circom_snarkjs_workdir/build/main_js/main.wasm";
+const default_wasm_file = import.meta.dirname + "/../circom_snarkjs_workdir/build/main_js/main.wasm";
 
-storage.initSync();
+/**
+ * Directory of the persistant storage. By default, node-persist uses a directory in the
+ * current working directory. Setting the environment variable VEINSNARK_STORAGE allows
+ * several instances (e.g. for different circuits) to keep their key files apart.
+ */
+const storage_dir = process.env.VEINSNARK_STORAGE;
+
+storage.initSync(storage_dir == undefined ? {} : { dir: storage_dir });
+
+/**
+ * Keys of the circuit, loaded into memory by {@link load_keys}.
+ * As long as this is undefined, {@link prove_internal} and {@link verify_internal}
+ * read the key files from disk on every call.
+ */
+var loaded_keys = undefined;
 
 program.version("1.0.0").description("A SNARK for proving matching finger vein patterns over committed data");
 
@@ -49,6 +65,18 @@ async function set_vkey_file(file_path) {
     console.log( chalk.green("Success"));
 }
 
+/**
+ * Takes the path to a file and stores it in persistant storage as wasm file of the circuit
+ *
+ * @param {string} file_path - path to the wasm file (generated by SnarkJS)
+ */
+async function set_wasm_file(file_path) {
+    storage.setItem('wasm_file', file_path);
+
+    console.log( "Setting wasm file to " + file_path);
+    console.log( chalk.green("Success"));
+}
+
 /**
  * Prints the status of persistant storage.
  * That is, it prints all key-value pairs stored with node-persistant
@@ -98,113 +126,117 @@ async function extract_testcase_from_testpattern(mypattern, i){
 }
 
 /**
- * Takes the path to a JSON file describing a test pattern and executes all contained test cases
- *
- * For each test case, the public output of the circuit checked against the
- * expected value (with a small error tolerance defined by EPSILON) and the time
- * for proof generation and verification is measured. In the end, the average
- * prover and verifier time is computed.
- * 
- * If all test cases passed, the average execution times are printed.
- * Otherwise, an according error report is printed.
+ * Takes one test case, proves it, checks the public output of the circuit
+ * against the expected values (with a small error tolerance defined by EPSILON)
+ * and verifies the proof. The time for proof generation and verification is measured.
  *
  * If a generated proof fails to be verified, this is considered a fatal
  * error and the further execution is aborted.
  *
- * @param {string} file_path - path to the JSON file describing a test pattern
+ * @param {JSON} testcase - the test case, e.g. obtained by {@link extract_testcase_from_testpattern}
+ * @param {int} i - index of the test case (zero-indexed), only used for reporting
+ * @param {int} len - total number of test cases, only used for reporting
+ * @return {JSON} An object stating whether the test case passed, together with the prover and verifier time (cf. {@link prove_internal} for the phases of the prover)
  */
-async function test(file_path){
+async function run_testcase(testcase, i, len){
     const EPSILON = 0.000001;
 
-    var pattern = await load_testpattern_file(file_path);
-    var len = pattern.probes.length;
+    // Sample random field elements for commitments
+    var r_model = Math.floor(Math.random() * max_r);
+    // var r_probe = Math.floor(Math.random() * max_r);
 
-    var testcases_failed = 0;
-    var prover_times = [];
-    var verifier_times = [];
-    
-    for (var i = 0; i < len; i += 1){
-        process.stdout.write("Running test case " + (i+1) + "/" + len + "...\r");
-
-        var testcase = await extract_testcase_from_testpattern(pattern, i);
-
-        // Sample random field elements for commitments
-        var r_model = Math.floor(Math.random() * max_r);
-        // var r_probe = Math.floor(Math.random() * max_r);
-
-        var input_json = {
-            "model": testcase.model,
-            "probe": testcase.probe,
-            "r_model": r_model,
-            // "r_probe" : r_probe
-        };
-
-        // Generate Witness + Proof (aka full proof)
+    var input_json = {
+        "model": testcase.model,
+        "probe": testcase.probe,
+        "r_model": r_model,
+        // "r_probe" : r_probe
+    };
 
-        var resP = await prove_internal(input_json);
-        var ps = resP.public_signals;
-        prover_times.push(resP.prover_time);
+    // Generate Witness + Proof (aka full proof)
+
+    var resP = await prove_internal(input_json);
+    var ps = resP.public_signals;
+
+    var res = {
+        "passed" : false,
+        "prover_time" : resP.prover_time,
+        "witness_time" : resP.witness_time,
+        "witness_cpu_time" : resP.witness_cpu_time,
+        "proving_time" : resP.proving_time,
+        "proving_cpu_time" : resP.proving_cpu_time,
+        "witness_peak_rss" : resP.witness_peak_rss,
+        "proving_peak_rss" : resP.proving_peak_rss,
+        "verifier_time" : undefined
+    };
 
-        // Extract public values from circuit output
+    // Extract public values from circuit output
 
-        var num = ps[1];
-        var den = ps[2];
-        var miura = num/den;
+    var num = ps[1];
+    var den = ps[2];
+    var miura = num/den;
 
-        var convolution = resP.public_signals.slice(3); 
+    var convolution = resP.public_signals.slice(3); 
 
-        // Check if computed Miura score matched expected value
+    // Check if computed Miura score matched expected value
 
-        if (Math.abs(miura-testcase.miura) > EPSILON) {
-            testcases_failed += 1;
+    if (Math.abs(miura-testcase.miura) > EPSILON) {
+        console.log(chalk.red("Testcase Failed: "));
+        console.log("\tTest case ", (i+1), "/", len, " failed because the Miura score was incorrect.");
+        console.log("\tExpected ", testcase.miura, ", got ", num, "/", den, "=", miura);
 
-            console.log(chalk.red("Testcase Failed: "));
-            console.log("\tTest case ", (i+1), "/", len, " failed because the Miura score was incorrect.");
-            console.log("\tExpected ", testcase.miura, ", got ", num, "/", den, "=", miura);
+        return res;
+    }
 
-            continue;
-        }
+    // Check that convolution is correct
+    
+    if (convolution.length != testcase.convolution.length){
+        console.log(chalk.red("Testcase Failed: "));
+        console.log("\tTest case ", (i+1), "/", len, " failed because the length of the convolution did not match the expected length.");
+        console.log("\tExpected ", testcase.convolution.length, ", got ", convolution.length);
 
-        // Check that convolution is correct
-        
-        if (convolution.length != testcase.convolution.length){
-            testcases_failed += 1;
+        return res;
+    }
 
+    for (var j = 0; j < convolution.length; j += 1){
+        if (convolution[j] != testcase.convolution[j]){
             console.log(chalk.red("Testcase Failed: "));
-            console.log("\tTest case ", (i+1), "/", len, " failed because the length of the convolution did not match the expected length.");
-            console.log("\tExpected ", testcase.convolution.length, ", got ", convolution.length);
+            console.log("\tTest case ", (i+1), "/", len, " failed because the convolution is incorrect at index ", j, ".");
+            console.log("\tExpected ", testcase.convolution[j], ", got ", convolution[j]);
 
-            continue;
+            return res;
         }
+    }
 
-        for (var i = 0; i < convolution.length; i += 1){
-            if (convolution[i] != testcase.convolution[i]){
-                testcases_failed += 1;
-
-                console.log(chalk.red("Testcase Failed: "));
-                console.log("\tTest case ", (i+1), "/", len, " failed because the convolution is incorrect at index ", i, ".");
-                console.log("\tExpected ", testcase.convolution[i], ", got ", convolution[i]);
-
-                continue;
-            }
-        }
-
-
-        // Verify proof
 
-        var resV = await verify_internal(resP.proof, resP.public_signals);
-        verifier_times.push(resV.verifier_time);
+    // Verify proof
 
-        if (!resV.accept){
-            console.log(chalk.red("FATAL ERROR:"));
-            console.log("\tTest case ", (i+1), "/", len, " failed because the verifier did not accept the proof by the prover.");
-            console.log("\t", resP.proof);
+    var resV = await verify_internal(resP.proof, resP.public_signals);
+    res.verifier_time = resV.verifier_time;
 
-            process.exit(1);
-        }
+    if (!resV.accept){
+        console.log(chalk.red("FATAL ERROR:"));
+        console.log("\tTest case ", (i+1), "/", len, " failed because the verifier did not accept the proof by the prover.");
+        console.log("\t", resP.proof);
 
+        process.exit(1);
     }
 
+    res.passed = true;
+    return res;
+}
+
+/**
+ * Prints the summary of a test run and terminates the process.
+ *
+ * If all test cases passed, the average execution times are printed.
+ * Otherwise, an according error report is printed.
+ *
+ * @param {int} testcases_failed - number of failed test cases
+ * @param {int} len - number of test cases that were run
+ * @param {Array} prover_times - the measured prover times in ms
+ * @param {Array} verifier_times - the measured verifier times in ms
+ */
+function report_results(testcases_failed, len, prover_times, verifier_times){
     console.log(); // needed to go to next line after carriage return for progress indicator
 
     if (testcases_failed == 0){
@@ -222,32 +254,194 @@ async function test(file_path){
     process.exit( testcases_failed == 0 ? 1 : 0 );
 }
 
+/**
+ * Takes the path to a JSON file describing a test pattern and executes all contained test cases
+ *
+ * Each test case is run with {@link run_testcase}. In the end, the average
+ * prover and verifier time is computed and reported with {@link report_results}.
+ *
+ * @param {string} file_path - path to the JSON file describing a test pattern
+ */
+async function test(file_path){
+    var pattern = await load_testpattern_file(file_path);
+    var len = pattern.probes.length;
+
+    var testcases_failed = 0;
+    var prover_times = [];
+    var verifier_times = [];
+    
+    for (var i = 0; i < len; i += 1){
+        process.stdout.write("Running test case " + (i+1) + "/" + len + "...\r");
+
+        var testcase = await extract_testcase_from_testpattern(pattern, i);
+        var res = await run_testcase(testcase, i, len);
+
+        prover_times.push(res.prover_time);
+        if (!res.passed){
+            testcases_failed += 1;
+            continue;
+        }
+        verifier_times.push(res.verifier_time);
+    }
+
+    report_results(testcases_failed, len, prover_times, verifier_times);
+}
+
+/**
+ * Takes the path to an NDJSON file describing a test pattern (e.g. generated with
+ * the `test_pattern_stream` command of the pattern generator) and executes all
+ * contained test cases while the file is still being read.
+ *
+ * The first line is a header with the model and the number of test cases,
+ * every following line holds one probe together with its expected Miura score
+ * and convolution. If the path is "-", the lines are read from stdin, so the
+ * output of the pattern generator can be piped in directly.
+ *
+ * @param {string} file_path - path to the NDJSON file describing a test pattern, or "-" for stdin
+ */
+async function test_stream(file_path){
+    var input = (file_path == "-") ? process.stdin : fs.createReadStream(file_path, 'utf8');
+    var lines = readline.createInterface({ input: input, crlfDelay: Infinity });
+
+    var header = undefined;
+    var len = 0;
+    var i = 0;
+
+    var testcases_failed = 0;
+    var prover_times = [];
+    var verifier_times = [];
+
+    for await (const line of lines){
+        if (line.trim().length == 0){
+            continue;
+        }
+
+        var record = JSON.parse(line);
+
+        if (header == undefined){
+            header = record;
+            len = header.n_test_cases;
+            continue;
+        }
+
+        process.stdout.write("Running test case " + (i+1) + "/" + len + "...\r");
+
+        var testcase = {
+            "model" : header.model,
+            "probe" : record.probe,
+            "miura" : record.miura,
+            "convolution" : record.convolution
+        };
+        var res = await run_testcase(testcase, i, len);
+        i += 1;
+
+        prover_times.push(res.prover_time);
+        if (!res.passed){
+            testcases_failed += 1;
+            continue;
+        }
+        verifier_times.push(res.verifier_time);
+    }
+
+    report_results(testcases_failed, i, prover_times, verifier_times);
+}
+
+
+/**
+ * Resets the peak resident set size (VmHWM) of this process to its current
+ * resident set size, so that {@link peak_rss} afterwards reports the peak of
+ * what runs in between. This needs Linux (writing 5 to /proc/self/clear_refs).
+ *
+ * @returns {boolean} Whether the peak could be reset
+ */
+function reset_peak_rss(){
+    try {
+        fs.writeFileSync("/proc/self/clear_refs", "5");
+        return true;
+    }
+    catch (e) {
+        return false;
+    }
+}
+
+/**
+ * Reads the peak resident set size (VmHWM) of this process, including all its
+ * threads (e.g. the worker threads of snarkjs), since the last {@link reset_peak_rss}.
+ *
+ * @returns {number|null} The peak RSS in kB, or null if it is not available
+ */
+function peak_rss(){
+    try {
+        const match = fs.readFileSync("/proc/self/status", "utf8").match(/VmHWM:\s+(\d+) kB/);
+        return match == null ? null : parseInt(match[1]);
+    }
+    catch (e) {
+        return null;
+    }
+}
+
 /**
  * Takes a JSON object describing the inputs to the circuit of the SNARK
  * and computes the witness (remaining wire values) and a proof.
- * While doing so, the prover time is measured.
+ * While doing so, the prover time is measured, both in total and separately
+ * for the witness computation and the Groth16 prover (wall time and CPU time
+ * of the whole process, including worker threads, all in ms). On Linux, the
+ * peak RSS of each of the two phases is measured as well (in kB, cf. {@link reset_peak_rss}).
  * In the end, the proof, the public outputs of the circuit and
- * the prover time are returned as a JSON object
+ * the times are returned as a JSON object
  *
  * @param {JSON} input - A JSON object defining the input to the circuit
- * @returns {JSON} A JSON object with the public output of the circuit, the proof and the prover time
+ * @returns {JSON} A JSON object with the public output of the circuit, the proof and the prover times
  */
 async function prove_internal(input_json){
-    var zkey_file = await storage.getItem('zkey_file');
-    if (zkey_file == undefined){
-        console.log(chalk.red("Error:") + "You first have to set a zkey file.");
-        process.exit(1);
+    var zkey_file;
+    var wasm_file;
+
+    if (loaded_keys != undefined){
+        zkey_file = loaded_keys.zkey;
+        wasm_file = loaded_keys.wasm;
+    }
+    else {
+        zkey_file = await storage.getItem('zkey_file');
+        if (zkey_file == undefined){
+            console.log(chalk.red("Error:") + "You first have to set a zkey file.");
+            process.exit(1);
+        }
+
+        wasm_file = await storage.getItem('wasm_file');
+        if (wasm_file == undefined){
+            wasm_file = default_wasm_file;
+        }
     }
 
+    // Same steps as snarkjs.groth16.fullProve, but timed separately
+    const wtns = { type: "mem" };
+
+    const rss_available = reset_peak_rss();
     const t0 = performance.now(); // https://developer.mozilla.org/en-US/docs/Web/API/Performance/now
-    const { proof, publicSignals } = await snarkjs.groth16.fullProve( input_json, wasm_file, zkey_file);
+    const cpu0 = process.cpuUsage();
+    await snarkjs.wtns.calculate(input_json, wasm_file, wtns);
     const t1 = performance.now();
-    const prover_time = t1-t0;
+    const cpu1 = process.cpuUsage();
+    const witness_peak_rss = rss_available ? peak_rss() : null;
+    reset_peak_rss();
+    const { proof, publicSignals } = await snarkjs.groth16.prove(zkey_file, wtns);
+    const t2 = performance.now();
+    const cpu2 = process.cpuUsage();
+    const proving_peak_rss = rss_available ? peak_rss() : null;
+
+    const cpu_time = (from, to) => (to.user - from.user + to.system - from.system) / 1000; // in ms
 
     return {
         "proof" : proof,
         "public_signals" : publicSignals,
-        "prover_time" : prover_time
+        "prover_time" : t2-t0,
+        "witness_time" : t1-t0,
+        "witness_cpu_time" : cpu_time(cpu0, cpu1),
+        "proving_time" : t2-t1,
+        "proving_cpu_time" : cpu_time(cpu1, cpu2),
+        "witness_peak_rss" : witness_peak_rss,
+        "proving_peak_rss" : proving_peak_rss
     };
 }
 
@@ -284,14 +478,20 @@ async function prove(file_path) {
  * @returns {JSON} An object with the verification time and the result of the verification
  */
 async function verify_internal(proof, public_signals) {
-    var vkey_file = await storage.getItem('vkey_file');
-    if (vkey_file == undefined){
-        console.log(chalk.red("Error: ") + "You first have to set a vkey file.");
-        process.exit(1);
+    var vKey;
+
+    if (loaded_keys != undefined){
+        vKey = loaded_keys.vkey;
     }
+    else {
+        var vkey_file = await storage.getItem('vkey_file');
+        if (vkey_file == undefined){
+            console.log(chalk.red("Error: ") + "You first have to set a vkey file.");
+            process.exit(1);
+        }
 
-    var vkey_path = await storage.getItem("vkey_file");
-    const vKey = JSON.parse(fs.readFileSync(vkey_path));
+        vKey = JSON.parse(fs.readFileSync(vkey_file));
+    }
 
     const t0 = performance.now();
     const res = await snarkjs.groth16.verify(vKey, public_signals, proof);
@@ -304,6 +504,97 @@ async function verify_internal(proof, public_signals) {
     };
 }
 
+/**
+ * Reads the prover key and the wasm file into memory and parses the verifier key,
+ * so that subsequent calls of {@link prove_internal} and {@link verify_internal}
+ * do not touch the disk anymore. The file paths are taken from persistant storage,
+ * unless they are given explicitly.
+ *
+ * @param {JSON} files - optional object with the keys zkey_file, vkey_file and wasm_file
+ * @returns {JSON} An object with the time in ms it took to load the keys
+ */
+async function load_keys(files = {}) {
+    var zkey_file = files.zkey_file ?? await storage.getItem('zkey_file');
+    var vkey_file = files.vkey_file ?? await storage.getItem('vkey_file');
+    var wasm_file = files.wasm_file ?? await storage.getItem('wasm_file') ?? default_wasm_file;
+
+    if (zkey_file == undefined || vkey_file == undefined){
+        throw new Error("You first have to set a zkey file and a vkey file.");
+    }
+
+    const t0 = performance.now();
+    loaded_keys = {
+        "zkey" : new Uint8Array(fs.readFileSync(zkey_file)),
+        "wasm" : new Uint8Array(fs.readFileSync(wasm_file)),
+        "vkey" : JSON.parse(fs.readFileSync(vkey_file))
+    };
+    const t1 = performance.now();
+
+    return {
+        "load_time" : t1-t0
+    };
+}
+
+/**
+ * Runs the app as a long-lived prover and verifier worker, e.g. for benchmarking.
+ * Requests are read from stdin and answered on stdout, one JSON object per line each.
+ *
+ * After startup, the worker writes {"ready": true, "startup_time": ms}, where the
+ * startup time is measured from the start of the process. Afterwards, each request
+ * is answered with exactly one line. The following requests are understood:
+ *     - {"cmd": "load", "zkey_file": ..., "vkey_file": ..., "wasm_file": ...} loads the keys with {@link load_keys} (all paths optional)
+ *     - {"cmd": "test", "testcase": ...} runs a test case with {@link run_testcase}
+ *     - {"cmd": "prove", "input": ...} calls {@link prove_internal}
+ *     - {"cmd": "verify", "proof": ..., "public_signals": ...} calls {@link verify_internal}
+ *     - {"cmd": "exit"} terminates the worker
+ *
+ * Every answer contains "ok", which is false if the request failed, together with an "error" message.
+ * Since stdout is reserved for answers, everything else the app prints goes to stderr.
+ */
+async function serve(){
+    const write = (obj) => process.stdout.write(JSON.stringify(obj) + "\n");
+    console.log = console.error;
+
+    var lines = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+
+    write({ "ready" : true, "startup_time" : performance.now() });
+
+    for await (const line of lines){
+        if (line.trim().length == 0){
+            continue;
+        }
+
+        try {
+            var request = JSON.parse(line);
+
+            switch (request.cmd){
+                case "load":
+                    write({ "ok" : true, ...await load_keys(request) });
+                    break;
+                case "test":
+                    write({ "ok" : true, ...await run_testcase(request.testcase, 0, 1) });
+                    break;
+                case "prove":
+                    write({ "ok" : true, ...await prove_internal(request.input) });
+                    break;
+                case "verify":
+                    write({ "ok" : true, ...await verify_internal(request.proof, request.public_signals) });
+                    break;
+                case "exit":
+                    write({ "ok" : true });
+                    process.exit(0);
+                default:
+                    write({ "ok" : false, "error" : "Unknown command " + request.cmd });
+            }
+        }
+        catch (e) {
+            write({ "ok" : false, "error" : String(e) });
+        }
+    }
+
+    process.exit(0);
+}
+
 /**
  * Takes a proof and public inputs of a circuit as strings and verifies the validity of
  * the proof with respect to the inputs and the circuit.
@@ -346,6 +637,11 @@ program
     .description('Takes a path to the verification key file (circuit specific)')
     .action((file) => set_vkey_file(file))
 
+program
+    .command('set_wasm_file <file>')
+    .description('Takes a path to the wasm file of the circuit (circuit specific, defaults to the one in circom_snarkjs_workdir/build)')
+    .action((file) => set_wasm_file(file))
+
 program
     .command('prove <file>')
     .description('Takes a JSON file with the input parameters to the circuit, computes the output of the circuit and provides a proof of correctness')
@@ -356,6 +652,16 @@ program
     .description('Takes the path to a JSON file with test patterns and performs tests and benchmarkings')
     .action((file) => test(file))
 
+program
+    .command('test_stream <file>')
+    .description('Takes the path to an NDJSON file with a streamed test pattern (or "-" for stdin) and performs tests and benchmarkings while reading it')
+    .action((file) => test_stream(file))
+
+program
+    .command('serve')
+    .description('Runs as a worker that keeps the keys in memory and answers prove, verify and test requests (JSON lines on stdin/stdout)')
+    .action(() => serve())
+
 program
     .command('verify <proof> <publicSignals>')
     .description('takes a proof and public signals as stringified JSON objects and verifies the SNARK')
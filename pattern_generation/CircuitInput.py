@@ -9,24 +9,32 @@ class CircuitInput:
     This is somewhat different from a test case, as it also includes the randomness
     for the commitment, but not the expected Miura score.
 
+    If a seed is given, the input is reproducible: The model and the probe are
+    generated by `TestPattern` with this seed, and the randomness for the
+    commitments is drawn from a `random.Random` instance seeded with it.
+
     :param n: Vector length
+    :param seed: Seed for the random number generators, if any
     '''
-    def __init__(self, n:int):
-        pattern = TestPattern(n, 1)
+    def __init__(self, n:int, seed:int=None):
+        pattern = TestPattern(n, 1, seed=seed)
+        rng = random.Random(seed)
 
         self.model = pattern.model
         self.probe = pattern.probes[0]
-        self.r_model = CircuitInput._random_field_element()
-        self.r_probe = CircuitInput._random_field_element()
+        self.r_model = CircuitInput._random_field_element(rng)
+        self.r_probe = CircuitInput._random_field_element(rng)
 
-    def _random_field_element():
+    def _random_field_element(rng:random.Random=random):
         '''
         Generate a random element of the finite field over the BN128 elliptic curve.
 
+        :param rng: The random number generator to draw from, defaults to the global one of the `random` module
+
         :important: As this is only a Proof of Concept, we do not use "good" randomness. Do not use the `random` library in deployed cryptographic implementations!
         '''
         bn128_p = 21888242871839275222246405745257275088548364400416034343698204186575808495617; # order of the bn128 curve
-        return random.randrange(0, bn128_p)
+        return rng.randrange(0, bn128_p)
 
     def __str__(self):
         return json.dumps(self.__dict__)
@@ -0,0 +1,160 @@
+import numpy as np
+
+FIELD_P = 21888242871839275222246405745257275088548364400416034343698204186575808495617 # order of the bn128 curve
+GENERATOR = 5 # multiplicative generator of the field, as used in main.circom
+TWO_ADICITY = 28 # FIELD_P-1 is divisible by 2**28
+
+class FieldNTT:
+    '''
+    This class is a Python reference for the number theoretic transform (NTT)
+    over the scalar field of the BN128 curve as it is implemented in
+    `ntt.circom`, and for the way `main.circom` uses it to compute the `conv`
+    output of the circuit.
+
+    The roots of unity are derived exactly as in `MainComponent(len)`: A
+    primitive 2^28-th root of unity is obtained as `GENERATOR**((FIELD_P-1)/2**28)`
+    and squared `28 - bitlength(len)` times. For a power of two `len`, this
+    gives a primitive `2*len`-th root of unity, which is the size of the
+    zero-extended vectors the circuit transforms.
+
+    All transforms work on batches: the input is a matrix whose rows are
+    transformed independently. The entries are Python integers stored in
+    NumPy arrays of dtype `object`, so every butterfly stage processes all
+    rows with a few array operations.
+
+    :param len: Vector length of the circuit, i.e. the parameter of `MainComponent`
+    '''
+
+    def __init__(self, len:int):
+        assert len > 0 and len & (len-1) == 0, 'The vector length must be a power of two'
+        assert (FIELD_P-1) % 2**TWO_ADICITY == 0
+
+        self.len = len
+        self.size = 2*len # length of the zero-extended vectors
+
+        two_to_the_28_th_root = pow(GENERATOR, (FIELD_P-1) // 2**TWO_ADICITY, FIELD_P)
+        power = TWO_ADICITY - len.bit_length() # power x for when computing generator^2^x
+
+        self.nth_root = pow(two_to_the_28_th_root, 2**power, FIELD_P)
+        self.nth_root_inverse = pow(self.nth_root, -1, FIELD_P)
+        self.size_inverse = pow(self.size, -1, FIELD_P)
+
+    def _to_field(a) -> np.ndarray:
+        '''
+        Converts a vector or matrix of integers (or their string representations,
+        as found in public signals) to a matrix of field elements of dtype `object`
+
+        :param a: A vector or matrix
+        :return: A matrix with at least one row, reduced modulo `FIELD_P`
+        '''
+        a = np.array(a, dtype=object, ndmin=2)
+        return np.vectorize(lambda x: int(x) % FIELD_P, otypes=[object])(a)
+
+    def _bit_reversal(size:int) -> np.ndarray:
+        '''
+        :param size: A power of two
+        :return: The bit-reversal permutation of the indices `0..size-1`
+        '''
+        bits = size.bit_length() - 1
+        return np.array([ int(format(i, f'0{bits}b')[::-1], 2) if bits > 0 else 0 for i in range(size) ])
+
+    def transform(a, root:int) -> np.ndarray:
+        '''
+        Computes the NTT of every row of `a` with the given root of unity,
+        i.e. `out[k] = sum(a[j] * root**(j*k))`. This is the same function as
+        the recursive even/odd decomposition of the `NTT` template computes,
+        evaluated iteratively with radix-2 butterflies.
+
+        :param a: A matrix of shape `(batch, size)` where `size` is a power of two
+        :param root: A primitive `size`-th root of unity
+        :return: A matrix of shape `(batch, size)` with the transformed rows
+        '''
+        a = FieldNTT._to_field(a)
+        (batch, size) = a.shape
+
+        a = a[:, FieldNTT._bit_reversal(size)]
+
+        half = 1
+        while half < size:
+            step = pow(root, size // (2*half), FIELD_P) # primitive (2*half)-th root of unity
+            omegas = np.array([ pow(step, i, FIELD_P) for i in range(half) ], dtype=object)
+
+            a = a.reshape(batch, size // (2*half), 2, half)
+            even = a[:, :, 0, :]
+            odd = (a[:, :, 1, :] * omegas) % FIELD_P
+
+            a = np.stack(((even + odd) % FIELD_P, (even - odd) % FIELD_P), axis=2).reshape(batch, size)
+            half *= 2
+
+        return a
+
+    def ntt(self, a) -> np.ndarray:
+        '''
+        Zero-extends every row of `a` to length `2*len` and transforms it,
+        as the `NTTextended(len, 2*len)` template of `main.circom` does
+
+        :param a: A matrix of shape `(batch, len)` or a single vector
+        :return: A matrix of shape `(batch, 2*len)`
+        '''
+        a = FieldNTT._to_field(a)
+        extended = np.zeros((a.shape[0], self.size), dtype=object)
+        extended[:, :a.shape[1]] = a
+
+        return FieldNTT.transform(extended, self.nth_root)
+
+    def intt(self, a) -> np.ndarray:
+        '''
+        Computes the inverse NTT of every row of `a`, as the `iNTT(2*len)` template does:
+        A forward transform with the inverse root of unity, divided by `2*len` in the field.
+
+        :param a: A matrix of shape `(batch, 2*len)`
+        :return: A matrix of shape `(batch, 2*len)`
+        '''
+        return (FieldNTT.transform(a, self.nth_root_inverse) * self.size_inverse) % FIELD_P
+
+    def convolve(self, model, probes) -> dict[str, np.ndarray]:
+        '''
+        Computes the convolutions of many probes with the reversed model
+        exactly as `MainComponent` does, including the intermediate values.
+
+        The returned dictionary contains the following entries, named after
+        the signals of `MainComponent`:
+            - `ntt_model`: NTT of the reversed model, shape `(2*len,)`
+            - `ntt_probe`: NTTs of the probes, shape `(batch, 2*len)`
+            - `ntt_conv`: pointwise products of the above, shape `(batch, 2*len)`
+            - `conv`: inverse NTTs of the products, shape `(batch, 2*len)`
+
+        :param model: The model as vector of length `len`
+        :param probes: The probes as matrix of shape `(batch, len)` or a single vector
+        :return: A dictionary of object arrays with the values described above
+        '''
+        model = FieldNTT._to_field(model)[0]
+
+        ntt_model = self.ntt(model[::-1])[0]
+        ntt_probe = self.ntt(probes)
+        ntt_conv = (ntt_probe * ntt_model) % FIELD_P
+
+        return {
+            'ntt_model': ntt_model,
+            'ntt_probe': ntt_probe,
+            'ntt_conv': ntt_conv,
+            'conv': self.intt(ntt_conv),
+        }
+
+    def check_public_signals(self, model, probes, public_signals) -> np.ndarray:
+        '''
+        Checks the `conv` outputs in the public signals of many proofs against
+        the reference values, without going through the prover.
+
+        The public signals are expected in the order the circuit outputs them,
+        i.e. `C_model`, `miura_dividend`, `miura_divisor` and then `conv`.
+
+        :param model: The model as vector of length `len`
+        :param probes: The probes as matrix of shape `(batch, len)`
+        :param public_signals: One list of public signals per probe, as integers or strings
+        :return: A boolean vector of shape `(batch,)` stating which proofs output the expected convolution
+        '''
+        expected = self.convolve(model, probes)['conv']
+        actual = FieldNTT._to_field([ ps[3:3+self.size] for ps in public_signals ])
+
+        return (actual == expected).all(axis=1)
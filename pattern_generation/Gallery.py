@@ -0,0 +1,260 @@
+import os
+import struct
+import numpy as np
+
+SCAN_CHUNK_SIZE = 2**14 # models scored at once by `Gallery.scores` and `Gallery.search`
+
+class Gallery:
+    '''
+    This class is an index of enrolled models for 1:N identification, i.e.
+    for finding the models that match a probe best before a match is proven.
+
+    The models are stored bit-packed in 64-bit words, as a matrix `words` of
+    shape `(count, ceil(n/64))` and dtype `uint64`, where unused bits at the
+    end of every row are zero. The number of set bits of every model is
+    precomputed in `popcounts`. Since all vectors are binary, the Miura score
+    between a probe `p` and a model `q` is
+
+        popcount(p & q) / (popcount(p) + popcount(q))
+
+    so scoring the probe against the gallery needs one AND and one popcount
+    per word and model (cf. `Gallery._popcount`). The scores are the same as
+    the ones of `TestPattern._miura` and `PatternBatch._batched_miura`,
+    which also score two empty vectors 0.
+
+    A gallery either lives in memory (cf. `Gallery.from_models`) or is
+    memory-mapped from a file (cf. `Gallery.write` and `Gallery.open`). All
+    queries scan the models in chunks of `SCAN_CHUNK_SIZE`, so galleries
+    that do not fit into memory only need one chunk at a time.
+
+    :param words: The packed models, a `uint64` matrix of shape `(count, ceil(n/64))`
+    :param n: Length of the vectors
+    :param popcounts: Number of set bits of every model, computed from `words` if not given
+    '''
+
+    MAGIC = b'VEINGAL\0'
+    VERSION = 1
+    HEADER = struct.Struct('<8sHxxIQ') # magic, version, padding, n, count
+    ALIGNMENT = 8
+
+    def __init__(self, words:np.ndarray, n:int, popcounts:np.ndarray=None):
+        self.n = n
+        self.words = words
+        self.popcounts = Gallery._popcount(words).sum(axis=1, dtype=np.uint32) if popcounts is None else popcounts
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def from_models(models:np.ndarray) -> 'Gallery':
+        '''
+        Creates an in-memory gallery
+
+        :param models: The models as bit matrix of shape `(count, n)`
+        :return: A new `Gallery`
+        '''
+        models = np.asarray(models, dtype=np.uint8)
+        return Gallery(Gallery._pack(models), models.shape[1])
+
+    def _n_words(n:int) -> int:
+        '''
+        :param n: Length of a bit vector
+        :return: Number of 64-bit words needed to store `n` bits
+        '''
+        return (n+63) // 64
+
+    def _pack(bits:np.ndarray) -> np.ndarray:
+        '''
+        Packs bit vectors into 64-bit words
+
+        :param bits: Bit matrix of shape `(rows, n)`
+        :return: A `uint64` matrix of shape `(rows, ceil(n/64))`, the unused bits being zero
+        '''
+        (rows, n) = bits.shape
+        packed = np.zeros((rows, 8*Gallery._n_words(n)), dtype=np.uint8)
+        packed[:, :(n+7)//8] = np.packbits(bits, axis=1)
+
+        return packed.view('<u8')
+
+    def _popcount(words:np.ndarray) -> np.ndarray:
+        '''
+        Counts the set bits of every word, with `np.bitwise_count` where
+        available (NumPy 2.0 and later) and a lookup table otherwise.
+
+        :param words: An array of unsigned integers
+        :return: An array of the same shape with the number of set bits of every entry
+        '''
+        if hasattr(np, 'bitwise_count'):
+            return np.bitwise_count(words)
+
+        table = np.array([ bin(i).count('1') for i in range(256) ], dtype=np.uint8)
+        bytes_ = np.ascontiguousarray(words).view(np.uint8).reshape(*words.shape, words.itemsize)
+        return table[bytes_].sum(axis=-1, dtype=np.uint8)
+
+    def scores(self, probe:np.ndarray, start:int=0, stop:int=None) -> np.ndarray:
+        '''
+        Computes the Miura scores between a probe and the models with indices
+        `start` to `stop` (exclusive), chunk by chunk.
+
+        :param probe: Bit vector of shape `(n,)`
+        :param start: Index of the first model
+        :param stop: Index after the last model, defaults to the size of the gallery
+        :return: A `float64` vector with the score of every model
+        '''
+        stop = len(self) if stop is None else stop
+        return np.concatenate([ scores for (_, scores) in self._scan(probe, start, stop) ] + [np.zeros(0)])
+
+    def _scan(self, probe:np.ndarray, start:int=0, stop:int=None):
+        '''
+        Scores a probe against the gallery in chunks of `SCAN_CHUNK_SIZE` models
+
+        :param probe: Bit vector of shape `(n,)`
+        :param start: Index of the first model
+        :param stop: Index after the last model, defaults to the size of the gallery
+        :return: A generator of tuples of the index of the first model of the chunk and the scores of the chunk
+        '''
+        probe = np.asarray(probe, dtype=np.uint8)
+        if probe.shape != (self.n,):
+            raise ValueError(f'Expected a probe of length {self.n}, got shape {probe.shape}')
+
+        packed_probe = Gallery._pack(probe[None, :])[0]
+        probe_popcount = int(np.count_nonzero(probe))
+        stop = len(self) if stop is None else stop
+
+        for chunk in range(start, stop, SCAN_CHUNK_SIZE):
+            end = min(chunk+SCAN_CHUNK_SIZE, stop)
+
+            dot = Gallery._popcount(self.words[chunk:end] & packed_probe).sum(axis=1, dtype=np.uint32)
+            divisor = self.popcounts[chunk:end].astype(np.float64) + probe_popcount
+
+            yield (chunk, np.divide(dot, divisor, out=np.zeros(end-chunk), where=divisor > 0))
+
+    def search(self, probe:np.ndarray, k:int=None, threshold:float=None) -> list[tuple[int, float]]:
+        '''
+        Finds the models that match a probe best. With `k`, only the `k` best
+        models are returned; with `threshold`, only the models with a score
+        of at least `threshold`; with both, the `k` best of these. Ties are
+        broken in favor of the lower index.
+
+        The gallery is scanned chunk by chunk, and only the candidates of
+        the chunks seen so far are kept, so the memory footprint does not
+        depend on the size of the gallery (unless all models pass the threshold).
+
+        :param probe: Bit vector of shape `(n,)`
+        :param k: Number of models to return, all if not given
+        :param threshold: Minimal score of the returned models
+        :return: A list of tuples (index, score), best first
+        '''
+        best_indices = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0)
+
+        for (start, scores) in self._scan(probe):
+            indices = np.arange(start, start+len(scores))
+
+            if threshold is not None:
+                passed = scores >= threshold
+                (indices, scores) = (indices[passed], scores[passed])
+
+            best_indices = np.concatenate((best_indices, indices))
+            best_scores = np.concatenate((best_scores, scores))
+
+            if k is not None and len(best_scores) > k:
+                keep = np.lexsort((best_indices, -best_scores))[:k]
+                (best_indices, best_scores) = (best_indices[keep], best_scores[keep])
+
+        order = np.lexsort((best_indices, -best_scores))
+
+        return [ (int(i), float(s)) for (i, s) in zip(best_indices[order], best_scores[order]) ]
+
+    def _layout(n:int, count:int) -> dict[str, int]:
+        '''
+        Computes the byte offsets of the sections of a gallery file
+
+        :param n: Length of the vectors
+        :param count: Number of models
+        :return: A dictionary mapping section names to offsets, with the total file size under the key `end`
+        '''
+        align = lambda offset: -(-offset // Gallery.ALIGNMENT) * Gallery.ALIGNMENT
+
+        popcounts = align(Gallery.HEADER.size)
+        words = align(popcounts + 4*count)
+
+        return {
+            'popcounts': popcounts,
+            'words': words,
+            'end': words + 8*Gallery._n_words(n)*count,
+        }
+
+    def write(path:str, n:int, blocks) -> int:
+        '''
+        Writes a gallery file, block by block, so that galleries larger than
+        the memory can be built. The file consists of a header (magic number,
+        format version, `n` and the number of models), the popcounts as
+        little-endian `uint32` and the packed models as little-endian `uint64`
+        words, each section starting at a multiple of `ALIGNMENT`.
+
+        :param path: Path of the file to write
+        :param n: Length of the vectors
+        :param blocks: An iterable of bit matrices of shape `(rows, n)`, e.g. the probes of `PatternBatch` objects
+        :return: The number of models written
+        '''
+        tmp_path = path + '.words'
+        count = 0
+
+        with open(tmp_path, 'wb') as words, open(path, 'wb') as f:
+            f.write(b'\0' * Gallery._layout(n, 0)['popcounts'])
+
+            for block in blocks:
+                block = np.asarray(block, dtype=np.uint8).reshape(-1, n)
+                packed = Gallery._pack(block)
+                f.write(Gallery._popcount(packed).sum(axis=1, dtype='<u4').tobytes())
+                words.write(packed.astype('<u8').tobytes())
+                count += len(block)
+
+        layout = Gallery._layout(n, count)
+
+        with open(path, 'r+b') as f, open(tmp_path, 'rb') as words:
+            f.write(Gallery.HEADER.pack(Gallery.MAGIC, Gallery.VERSION, n, count))
+            f.seek(0, os.SEEK_END)
+            f.write(b'\0' * (layout['words'] - f.tell()))
+            while len(chunk := words.read(2**24)) > 0:
+                f.write(chunk)
+
+        os.remove(tmp_path)
+
+        return count
+
+    def open(path:str) -> 'Gallery':
+        '''
+        Opens a gallery file written by `Gallery.write`. The popcounts and the
+        packed models are memory-mapped read-only, so only the chunks that are
+        scanned are read.
+
+        :param path: Path to the gallery file
+        :return: A new `Gallery`
+        '''
+        with open(path, 'rb') as f:
+            header = f.read(Gallery.HEADER.size)
+
+        if len(header) < Gallery.HEADER.size:
+            raise ValueError(f'"{path}" is too short to be a gallery file')
+
+        (magic, version, n, count) = Gallery.HEADER.unpack(header)
+
+        if magic != Gallery.MAGIC:
+            raise ValueError(f'"{path}" is not a gallery file')
+        if version != Gallery.VERSION:
+            raise ValueError(f'Unsupported version {version} of gallery file "{path}"')
+
+        layout = Gallery._layout(n, count)
+
+        if os.path.getsize(path) < layout['end']:
+            raise ValueError(f'Gallery file "{path}" is truncated')
+
+        if count == 0:
+            return Gallery(np.zeros((0, Gallery._n_words(n)), dtype=np.uint64), n, np.zeros(0, dtype=np.uint32))
+
+        return Gallery(
+            np.memmap(path, dtype='<u8', mode='r', offset=layout['words'], shape=(count, Gallery._n_words(n))),
+            n,
+            np.memmap(path, dtype='<u4', mode='r', offset=layout['popcounts'], shape=(count,)),
+        )
@@ -0,0 +1,261 @@
+import json
+import numpy as np
+
+from multiprocessing import Pool
+
+from PatternBatch import *
+
+PAIR_BLOCK_SIZE = 1024 # pairs per random stream, changing it changes the pairs generated for a seed
+
+class PairBatch:
+    '''
+    This class holds labelled pairs of enrolled models and probes with
+    realistic score distributions. In contrast to the probes of `TestPattern`
+    and `PatternBatch`, which are unrelated to the model, every probe is a
+    distorted capture of one of the models, its `source`:
+        - translation: the pattern is moved by a random offset of at most `max_shift` (per axis), the bits moved in are zero
+        - dropout: every set bit is cleared with probability `dropout` (vein segments that were not captured)
+        - bit flips: every bit is flipped with probability `flip` (sensor noise)
+
+    Like finger vein patterns, the models are spatially correlated: they are
+    thresholded moving averages of white noise over `correlation` bits per
+    axis (cf. `PairBatch._generate_models`). Hence, a genuine probe still
+    overlaps with its model after small translations, whereas the models
+    are independent of each other.
+
+    Every pair claims one of the models. The pair is genuine if the probe is
+    derived from the claimed model and an impostor pair if it is derived from
+    another model, which happens with probability `impostor_fraction`.
+
+    The vectors are either of length `n`, or images of shape `(h, w)` that
+    are flattened row by row (cf. `PatternBatch2D`), in which case the
+    translations are two-dimensional and do not wrap across rows.
+
+    :param models: The models as bit matrix of shape `(k, n)`
+    :param probes: The probes as bit matrix of shape `(m, n)`
+    :param claims: Index of the model every pair claims, shape `(m,)`
+    :param sources: Index of the model every probe is derived from, shape `(m,)`
+    :param seed: The seed the batch was generated with, if any
+    :param miura: Precomputed Miura scores of the pairs, computed if not given
+    '''
+
+    def __init__(self, models:np.ndarray, probes:np.ndarray, claims:np.ndarray, sources:np.ndarray, seed:int=None, miura:np.ndarray=None):
+        self.seed = seed
+        self.models = np.asarray(models, dtype=np.uint8)
+        self.probes = np.asarray(probes, dtype=np.uint8).reshape(-1, self.models.shape[1])
+        self.claims = np.asarray(claims, dtype=np.int64)
+        self.sources = np.asarray(sources, dtype=np.int64)
+
+        self.miura = PairBatch._pair_miura(self.models, self.probes, self.claims) if miura is None else miura
+
+    def __len__(self) -> int:
+        return len(self.probes)
+
+    @property
+    def genuine(self) -> np.ndarray:
+        '''
+        :return: A boolean vector that is `True` for the genuine pairs
+        '''
+        return self.claims == self.sources
+
+    def generate(shape:int|tuple[int, int], k:int, m:int, flip:float=0.02, dropout:float=0.2, max_shift:int|tuple[int, int]=4, impostor_fraction:float=0.5, density:float=0.5, correlation:int=8, seed:int=None, processes:int=1) -> 'PairBatch':
+        '''
+        Generates `k` random models and `m` labelled pairs.
+
+        Every bit of a model is set with probability `density`, the default
+        being the one of the models of `TestPattern`. The claimed model of
+        every pair is uniform, and so is the source of an impostor probe
+        among the other models.
+
+        As in `PatternBatch.generate`, the models and every block of
+        `PAIR_BLOCK_SIZE` pairs are drawn from independent random streams
+        (cf. `PatternBatch._rng`), so the result for a given seed is
+        bit-identical for every number of `processes`.
+
+        :param shape: Length `n` of the vectors, or shape `(h, w)` of the images
+        :param k: Number of models
+        :param m: Number of pairs
+        :param flip: Probability of a bit flip
+        :param dropout: Probability that a set bit is cleared
+        :param max_shift: Largest translation in either direction, a tuple `(dy, dx)` for images
+        :param impostor_fraction: Probability that a pair is an impostor pair (needs `k >= 2`)
+        :param density: Probability of a set bit in the models
+        :param correlation: Length over which the models are correlated, 1 for independent bits
+        :param seed: Seed for the random number generator, drawn randomly if not given
+        :param processes: Number of worker processes, `None` for the number of CPUs
+        :return: A new `PairBatch`
+        '''
+        shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        max_shift = (max_shift,) * len(shape) if isinstance(max_shift, int) else tuple(max_shift)
+
+        if len(max_shift) != len(shape):
+            raise ValueError(f'Expected {len(shape)} maximal shifts for vectors of shape {shape}, got {max_shift}')
+        max_shift = tuple( min(s, size-1) for (s, size) in zip(max_shift, shape) )
+        if k < 1 or (k < 2 and impostor_fraction > 0):
+            raise ValueError(f'Impostor pairs need at least 2 models, got {k}')
+
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1, np.uint64)[0])
+
+        models = PairBatch._generate_models(PatternBatch._rng(seed, 0), k, shape, density, correlation)
+        distortion = (flip, dropout, max_shift, impostor_fraction)
+        blocks = [ (models, shape, distortion, m, seed, start) for start in range(0, m, PAIR_BLOCK_SIZE) ]
+
+        if processes == 1 or len(blocks) <= 1:
+            results = [ PairBatch._generate_block(block) for block in blocks ]
+        else:
+            with Pool(processes) as pool:
+                results = pool.map(PairBatch._generate_block, blocks)
+
+        if len(results) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return PairBatch(models, np.zeros((0, models.shape[1])), empty, empty, seed)
+
+        (probes, claims, sources, miura) = [ np.concatenate(parts) for parts in zip(*results) ]
+
+        return PairBatch(models, probes, claims, sources, seed, miura)
+
+    def _generate_models(rng:np.random.Generator, k:int, shape:tuple, density:float, correlation:int) -> np.ndarray:
+        '''
+        Generates spatially correlated models: white noise is averaged over
+        windows of `correlation` bits along every axis, and the largest
+        averages of every model are set, so that the fraction of set bits is
+        `density`. For `correlation` 1, the bits are independent Bernoulli(`density`).
+
+        :param rng: The random number generator to draw from
+        :param k: Number of models
+        :param shape: `(n,)` or `(h, w)`
+        :param density: Fraction of set bits
+        :param correlation: Length of the windows
+        :return: A `uint8` bit matrix of shape `(k, prod(shape))`
+        '''
+        noise = rng.random((k, *shape))
+
+        if correlation <= 1:
+            return (noise < density).reshape(k, -1).astype(np.uint8)
+
+        for axis in range(1, noise.ndim):
+            sums = np.cumsum(noise, axis=axis)
+            sums = np.concatenate((np.zeros_like(sums.take([0], axis=axis)), sums), axis=axis)
+            size = noise.shape[axis]
+            ends = np.minimum(np.arange(size) + (correlation+1) // 2, size)
+            starts = np.maximum(np.arange(size) - correlation // 2, 0)
+            noise = (sums.take(ends, axis=axis) - sums.take(starts, axis=axis)) / (ends - starts).reshape(-1, *[1]*(noise.ndim-axis-1))
+
+        noise = noise.reshape(k, -1)
+        thresholds = np.quantile(noise, 1-density, axis=1, method='higher')
+
+        return (noise > thresholds[:, None]).astype(np.uint8)
+
+    def _generate_block(args:tuple) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Generates the block of pairs starting at index `start` and computes
+        their Miura scores. This is the unit of work of the process pool in
+        `PairBatch.generate`.
+
+        :param args: A tuple `(models, shape, (flip, dropout, max_shift, impostor_fraction), m, seed, start)`
+        :return: A tuple of the probes, claims, sources and Miura scores of the block
+        '''
+        (models, shape, (flip, dropout, max_shift, impostor_fraction), m, seed, start) = args
+        size = min(start+PAIR_BLOCK_SIZE, m) - start
+        k = len(models)
+
+        rng = PatternBatch._rng(seed, start // PAIR_BLOCK_SIZE + 1)
+
+        claims = rng.integers(0, k, size)
+        impostor = rng.random(size) < impostor_fraction
+        sources = np.where(impostor, (claims + rng.integers(1, max(k, 2), size)) % k, claims)
+
+        shifts = np.stack([ rng.integers(-s, s+1, size) for s in max_shift ], axis=1)
+        probes = PairBatch._distort(rng, models[sources], shape, shifts, flip, dropout)
+
+        return (probes, claims, sources, PairBatch._pair_miura(models, probes, claims))
+
+    def _translate(bits:np.ndarray, shape:tuple, shifts:np.ndarray) -> np.ndarray:
+        '''
+        Translates every row of a bit matrix by its own offset. Bits that are
+        moved out are lost, bits that are moved in are zero. For images, the
+        rows are translated as images of shape `(h, w)`, so nothing wraps
+        across the rows of an image.
+
+        :param bits: Bit matrix of shape `(rows, prod(shape))`
+        :param shape: `(n,)` or `(h, w)`
+        :param shifts: Offset of every row, an integer matrix of shape `(rows, len(shape))`
+        :return: The translated bit matrix
+        '''
+        source = bits.reshape(-1, *shape)
+        res = np.zeros_like(source)
+
+        # there are only few distinct offsets, so the rows are copied by slices, offset by offset
+        (offsets, inverse) = np.unique(shifts, axis=0, return_inverse=True)
+        for (i, offset) in enumerate(offsets):
+            selected = np.flatnonzero(inverse.ravel() == i)
+            target = tuple( slice(max(s, 0), size + min(s, 0)) for (s, size) in zip(offset, shape) )
+            origin = tuple( slice(max(-s, 0), size - max(s, 0)) for (s, size) in zip(offset, shape) )
+            res[(selected, *target)] = source[(selected, *origin)]
+
+        return res.reshape(bits.shape)
+
+    def _distort(rng:np.random.Generator, bits:np.ndarray, shape:tuple, shifts:np.ndarray, flip:float, dropout:float) -> np.ndarray:
+        '''
+        Derives probes from patterns by translation, dropout and bit flips,
+        in this order (cf. `PairBatch`). The probabilities are quantized to
+        multiples of `2^-16`, and a bit is never both dropped and flipped,
+        which requires `dropout + flip <= 1`.
+
+        :param rng: The random number generator to draw from
+        :param bits: The patterns as bit matrix of shape `(rows, prod(shape))`
+        :param shape: `(n,)` or `(h, w)`
+        :param shifts: Translation of every row, an integer matrix of shape `(rows, len(shape))`
+        :param flip: Probability of a bit flip
+        :param dropout: Probability that a set bit is cleared
+        :return: A `uint8` bit matrix of the same shape as `bits`
+        '''
+        probes = PairBatch._translate(bits, shape, shifts)
+
+        # one 16-bit draw per bit decides both, the low values drop and the high values flip
+        noise = rng.integers(0, 2**16, probes.shape, dtype=np.uint16)
+        probes &= noise >= round(dropout * 2**16)
+        probes ^= noise >= 2**16 - round(flip * 2**16)
+
+        return probes
+
+    def _pair_miura(models:np.ndarray, probes:np.ndarray, claims:np.ndarray, chunk_size:int=PAIR_BLOCK_SIZE) -> np.ndarray:
+        '''
+        Computes the Miura score of every probe against its claimed model,
+        in chunks of `chunk_size` pairs (cf. `PatternBatch._batched_miura`)
+
+        :param models: Bit matrix of shape `(k, n)`
+        :param probes: Bit matrix of shape `(m, n)`
+        :param claims: Index of the claimed model of every probe, shape `(m,)`
+        :param chunk_size: Number of pairs scored at once
+        :return: A vector of shape `(m,)` with the Miura score of every pair, 0 for an empty probe and model
+        '''
+        popcounts = np.count_nonzero(models, axis=1)
+        res = np.zeros(len(probes))
+
+        for start in range(0, len(probes), chunk_size):
+            (chunk, claimed) = (probes[start:start+chunk_size], claims[start:start+chunk_size])
+            dot = np.count_nonzero(chunk & models[claimed], axis=1)
+            divisor = popcounts[claimed] + np.count_nonzero(chunk, axis=1)
+            res[start:start+len(chunk)] = np.divide(dot, divisor, out=np.zeros(len(chunk)), where=divisor > 0)
+
+        return res
+
+    def to_dict(self) -> dict:
+        '''
+        Converts the batch to plain Python types
+
+        :return: A dictionary with the keys `models`, `probes`, `claims`, `genuine`, `miura` and `seed`
+        '''
+        return {
+            'models': self.models.tolist(),
+            'probes': self.probes.tolist(),
+            'claims': self.claims.tolist(),
+            'genuine': self.genuine.tolist(),
+            'miura': self.miura.tolist(),
+            'seed': self.seed,
+        }
+
+    def __str__(self):
+        return json.dumps(self.to_dict())
@@ -0,0 +1,400 @@
+import json
+import numpy as np
+
+from multiprocessing import Pool
+
+VERIFICATION_MODES = ['full', 'fft', 'spot', 'off']
+PROBE_BLOCK_SIZE = 32 # probes per random stream, changing it changes the patterns generated for a seed
+
+class PatternBatch:
+    '''
+    This class is the NumPy-backed counterpart of `TestPattern`. Instead of
+    Python lists, it holds the model as a vector of shape `(n,)` and all
+    probes as one matrix of shape `(m, n)`, both of dtype `uint8`. The Miura
+    scores and the convolutions with the reversed model are computed for all
+    probes at once using batched array operations.
+
+    The `convolutions` matrix has shape `(m, 2n)`. As for `TestPattern`, the
+    last column is always zero so that its rows match the length of the `conv`
+    output of the circuit.
+
+    :param model: The model as bit vector of shape `(n,)`
+    :param probes: The probes as bit matrix of shape `(m, n)`
+    :param seed: The seed the batch was generated with, if any
+    :param miura: Precomputed Miura scores, computed from model and probes if not given
+    :param convolutions: Precomputed convolutions, computed from model and probes if not given
+    '''
+
+    def __init__(self, model:np.ndarray, probes:np.ndarray, seed:int=None, miura:np.ndarray=None, convolutions:np.ndarray=None):
+        self.seed = seed
+        self.model = np.asarray(model, dtype=np.uint8)
+        self.probes = np.asarray(probes, dtype=np.uint8).reshape(-1, len(self.model))
+
+        self.miura = PatternBatch._batched_miura(self.model, self.probes) if miura is None else miura
+        self.convolutions = PatternBatch._batched_convolution(self.model, self.probes) if convolutions is None else convolutions
+
+    def generate(n:int, m:int, seed:int=None, processes:int=1) -> 'PatternBatch':
+        '''
+        Generates a random pattern batch with the same distributions as `TestPattern`:
+        The model is distributed as Bernoulli(0.5) and the i-th probe (zero-indexed)
+        as Bernoulli((i+1)/(m+1)).
+
+        If no seed is given, a fresh 64-bit seed is drawn from the operating
+        system, so that the batch can always be regenerated from its `seed`.
+
+        The model and every block of `PROBE_BLOCK_SIZE` probes are drawn from
+        independent random streams (see `PatternBatch._rng`). Hence, the
+        blocks can be generated in any order and by any process, and the
+        result for a given seed is bit-identical for every number of
+        `processes`. With more than one process, the blocks are generated,
+        scored and convolved in parallel in a process pool.
+
+        :param n: Length of the vectors
+        :param m: Number of probes (i.e. test cases)
+        :param seed: Seed for the random number generator
+        :param processes: Number of worker processes, `None` for the number of CPUs
+        :return: A new `PatternBatch`
+        '''
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1, np.uint64)[0])
+
+        model = PatternBatch._generate_model(n, seed)
+        blocks = [ (model, n, m, seed, start) for start in range(0, m, PROBE_BLOCK_SIZE) ]
+
+        if processes == 1 or len(blocks) <= 1:
+            results = [ PatternBatch._generate_block(block) for block in blocks ]
+        else:
+            with Pool(processes) as pool:
+                results = pool.map(PatternBatch._generate_block, blocks)
+
+        if len(results) == 0:
+            return PatternBatch(model, np.zeros((0, n)), seed)
+
+        (probes, miura, convolutions) = [ np.concatenate(parts) for parts in zip(*results) ]
+
+        return PatternBatch(model, probes, seed, miura, convolutions)
+
+    def _rng(seed:int, stream:int) -> np.random.Generator:
+        '''
+        Creates the random number generator of one of the independent streams
+        of a seed. Stream 0 generates the model, stream `b+1` generates the
+        `b`-th block of probes. The streams are the children that
+        `np.random.SeedSequence(seed).spawn()` would produce, constructed
+        directly by their spawn key.
+
+        :param seed: The seed of the test pattern
+        :param stream: Index of the stream
+        :return: A random number generator for the stream
+        '''
+        return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(stream,)))
+
+    def _generate_model(n:int, seed:int) -> np.ndarray:
+        '''
+        :param n: Length of the vectors
+        :param seed: The seed of the test pattern
+        :return: The model of the test pattern, distributed as Bernoulli(0.5)
+        '''
+        return (PatternBatch._rng(seed, 0).random(n) <= 0.5).astype(np.uint8)
+
+    def _generate_block(args:tuple) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Generates the block of probes starting at index `start` and computes
+        their Miura scores and convolutions. This is the unit of work of the
+        process pool in `PatternBatch.generate`.
+
+        :param args: A tuple `(model, n, m, seed, start)`
+        :return: A tuple of the probes, the Miura scores and the convolutions of the block
+        '''
+        (model, n, m, seed, start) = args
+        stop = min(start+PROBE_BLOCK_SIZE, m)
+
+        rng = PatternBatch._rng(seed, start // PROBE_BLOCK_SIZE + 1)
+        block = PatternBatch(model, PatternBatch._generate_probes(rng, n, m, start, stop))
+
+        return (block.probes, block.miura, block.convolutions)
+
+    def _generate_probes(rng:np.random.Generator, n:int, m:int, start:int, stop:int) -> np.ndarray:
+        '''
+        Generates the probes with indices `start` to `stop` (exclusive) of a
+        test pattern with `m` probes, where the i-th probe is distributed as
+        Bernoulli((i+1)/(m+1)).
+
+        :param rng: The random number generator to draw from
+        :param n: Length of the vectors
+        :param m: Total number of probes of the test pattern
+        :param start: Index of the first probe to generate
+        :param stop: Index after the last probe to generate
+        :return: A boolean matrix of shape `(stop-start, n)`
+        '''
+        p = np.arange(start+1, stop+1) / (m+1)
+        return rng.random((stop-start, n)) <= p[:, None]
+
+    def stream(n:int, m:int, verification:str='full', spot_checks:int=16, seed:int=None):
+        '''
+        Generates a test pattern lazily and yields it as a sequence of JSON-serializable records.
+
+        The first record is a header with the keys `model`, `n_test_cases`,
+        `verification` and `seed`. Every following record describes one test
+        case with the keys `probe`, `miura` and `convolution`, i.e. the same
+        entries as the test cases the node app extracts from a `TestPattern`.
+
+        Only one block of `PROBE_BLOCK_SIZE` probes is held in memory at a
+        time, so the memory footprint does not depend on `m`. Every block is
+        verified with the given verification mode (see `PatternBatch.verify`)
+        before any of its records is yielded. For the same seed, the test
+        cases are identical to the ones of `PatternBatch.generate`.
+
+        :param n: Length of the vectors
+        :param m: Number of probes (i.e. test cases)
+        :param verification: Verification mode, one of `VERIFICATION_MODES`
+        :param spot_checks: Number of offsets checked per probe if `verification` is `spot`
+        :param seed: Seed for the random number generator, drawn randomly if not given
+        :return: A generator of dictionaries, the header first
+        '''
+        if verification not in VERIFICATION_MODES:
+            raise ValueError(f'Unknown verification mode "{verification}", expected one of {VERIFICATION_MODES}')
+
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1, np.uint64)[0])
+
+        model = PatternBatch._generate_model(n, seed)
+
+        header = {
+            'model': model.tolist(),
+            'n_test_cases': m,
+            'verification': verification,
+            'seed': seed,
+        }
+
+        if m == 0:
+            yield header
+
+        for start in range(0, m, PROBE_BLOCK_SIZE):
+            (probes, miura, convolutions) = PatternBatch._generate_block((model, n, m, seed, start))
+            batch = PatternBatch(model, probes, seed, miura, convolutions)
+            report = batch.verify(verification, spot_checks)
+
+            if start == 0:
+                header['verification'] = report
+                yield header
+
+            for (probe, miura, convolution) in zip(batch.probes, batch.miura, batch.convolutions):
+                yield {
+                    'probe': probe.tolist(),
+                    'miura': float(miura),
+                    'convolution': convolution.tolist(),
+                }
+
+    def _batched_miura(model:np.ndarray, probes:np.ndarray) -> np.ndarray:
+        '''
+        Computes the Miura scores between one model and many probes
+
+        Since all vectors are binary, the inner products reduce to counting
+        the positions where both vectors are set. An empty probe scores 0
+        against an empty model (instead of NaN, which is not valid JSON).
+
+        :param model: Bit vector of shape `(n,)`
+        :param probes: Bit matrix of shape `(m, n)`
+        :return: A vector of shape `(m,)` with the Miura score of every probe
+        '''
+        dot = np.count_nonzero(probes & model, axis=1)
+        divisor = np.count_nonzero(model) + np.count_nonzero(probes, axis=1)
+
+        return np.divide(dot, divisor, out=np.zeros(len(probes)), where=divisor > 0)
+
+    def _batched_convolution(model:np.ndarray, probes:np.ndarray, chunk_size:int=2**22) -> np.ndarray:
+        '''
+        Convolves every probe with the reversed model using real FFTs.
+
+        All entries of the result are integers of magnitude at most `n`, so the
+        rounding after the inverse FFT recovers them exactly. The probes are
+        transformed in chunks of roughly `chunk_size` spectrum entries to keep
+        the memory footprint bounded for large `m` (cf. `PatternBatch._convolution_chunks`).
+
+        :param model: Bit vector of shape `(n,)`
+        :param probes: Bit matrix of shape `(m, n)`
+        :param chunk_size: Approximate number of complex values held at once
+        :return: An `int64` matrix of shape `(m, 2n)` whose last column is zero
+        '''
+        (m, n) = probes.shape
+        fft_len = 1 << max(2*n-2, 0).bit_length() # power of two >= 2n-1
+
+        res = np.zeros((m, 2*n), dtype=np.int64)
+        for (start, conv) in PatternBatch._convolution_chunks(model, probes, fft_len, chunk_size):
+            res[start:start+len(conv), :2*n-1] = np.rint(conv[:, :2*n-1])
+
+        return res
+
+    def _convolution_chunks(model:np.ndarray, probes:np.ndarray, fft_len:int, chunk_size:int=2**22):
+        '''
+        Computes the cyclic convolutions of length `fft_len` of the probes with
+        the reversed model, chunk by chunk. Entry `i` of a row is the inner
+        product of the probe shifted by `i-n+1` against the model (cf. `verify`),
+        plus the entries that wrap around from `i+fft_len` and `i-fft_len`.
+        For `fft_len >= 2n-1`, nothing wraps around and the rows are the full
+        convolutions.
+
+        :param model: Bit vector of shape `(n,)`
+        :param probes: Bit matrix of shape `(m, n)`
+        :param fft_len: Length of the FFTs
+        :param chunk_size: Approximate number of complex values held at once
+        :return: A generator of tuples of the index of the first probe of the chunk and the unrounded `float64` convolutions of shape `(rows, fft_len)`
+        '''
+        m = len(probes)
+        model_spectrum = np.fft.rfft(model[::-1], fft_len)
+        rows_per_chunk = max(1, chunk_size // fft_len)
+
+        for start in range(0, m, rows_per_chunk):
+            chunk = probes[start:start+rows_per_chunk]
+            yield (start, np.fft.irfft(np.fft.rfft(chunk, fft_len, axis=1) * model_spectrum, fft_len, axis=1))
+
+    def _fast_len(n:int) -> int:
+        '''
+        Rounds a length up to the next product of powers of 2, 3 and 5, for which
+        the FFT is fast. This wastes much less than rounding up to a power of
+        two, e.g. 288 instead of 512 for 272 rows, and 65610 instead of 131072
+        for the window of 64 shifts of vectors of length `2^16`.
+
+        :param n: Minimal length
+        :return: The smallest length `>= n` of the form `2^a * 3^b * 5^c`
+        '''
+        best = 1 << max(n-1, 0).bit_length()
+        p5 = 1
+        while p5 < best:
+            p35 = p5
+            while p35 < best:
+                p = p35 << max(0, (-(-n // p35) - 1).bit_length()) # smallest p35 * 2^a >= n
+                best = min(best, p)
+                p35 *= 3
+            p5 *= 5
+
+        return best
+
+    def _batched_shifted_miura(model:np.ndarray, probes:np.ndarray, max_shift:int=None, chunk_size:int=2**22) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Computes the shift-tolerant Miura scores between one model and many
+        probes: the largest inner product of a probe and the model over all
+        shifts `s` with `|s| <= max_shift`, divided by the sum of their
+        popcounts. This is the largest entry of the window of the `conv`
+        output of the circuit, divided by the `miura_divisor`, so the score
+        for shift 0 is the one of `PatternBatch._batched_miura`.
+
+        The inner products at all shifts are computed with real FFTs (cf.
+        `PatternBatch._convolution_chunks`), in chunks of probes, without
+        ever holding all convolutions in memory. Since only the shifts of the
+        window are needed, the FFTs are just long enough that no shift of
+        the window wraps around, i.e. of length `n + max_shift` rounded up to a
+        length the FFT handles efficiently (cf. `PatternBatch._fast_len`),
+        instead of `2n-1`. Rounding up to a power of two instead would undo
+        this for the power-of-two lengths of the circuit.
+
+        :param model: Bit vector of shape `(n,)`
+        :param probes: Bit matrix of shape `(m, n)`
+        :param max_shift: Largest shift in either direction, defaults to `n-1` (all shifts)
+        :param chunk_size: Approximate number of complex values held at once
+        :return: A tuple of the scores (`float64`, shape `(m,)`, 0 for an empty probe and model) and the shifts at which they are attained (`int64`, shape `(m,)`), ties broken in favor of the smaller absolute shift
+        '''
+        (m, n) = probes.shape
+        max_shift = n-1 if max_shift is None else min(max_shift, n-1)
+        fft_len = PatternBatch._fast_len(n + max_shift)
+
+        # the window, ordered by absolute shift, so that argmax prefers small shifts
+        shifts = np.arange(-max_shift, max_shift+1)
+        shifts = shifts[np.argsort(np.abs(shifts), kind='stable')]
+        columns = (shifts + n-1) % fft_len
+
+        best = np.zeros(m, dtype=np.int64)
+        best_shift = np.zeros(m, dtype=np.int64)
+        for (start, conv) in PatternBatch._convolution_chunks(model, probes, fft_len, chunk_size):
+            window = np.rint(conv[:, columns]).astype(np.int64)
+            arg = np.argmax(window, axis=1)
+            best[start:start+len(conv)] = window[np.arange(len(conv)), arg]
+            best_shift[start:start+len(conv)] = shifts[arg]
+
+        divisor = np.count_nonzero(model) + np.count_nonzero(probes, axis=1)
+
+        return (np.divide(best, divisor, out=np.zeros(m), where=divisor > 0), best_shift)
+
+    def shifted_miura(self, max_shift:int=None) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Computes the shift-tolerant Miura scores of all probes (cf. `PatternBatch._batched_shifted_miura`)
+
+        :param max_shift: Largest shift in either direction, defaults to all shifts
+        :return: A tuple of the scores and the shifts at which they are attained
+        '''
+        return PatternBatch._batched_shifted_miura(self.model, self.probes, max_shift)
+
+    def verify(self, mode:str='full', spot_checks:int=16) -> str:
+        '''
+        Checks that the convolutions actually match the inner products between
+        the model and the probes at every offset. That is, entry `i` of the
+        convolution of a probe `p` must equal the sum over `p[j+i-n+1]*model[j]`
+        for all `j` where the index into `p` is valid.
+
+        The following verification modes are available (cf. `VERIFICATION_MODES`):
+            - `full`: recomputes every entry directly with `np.correlate`, i.e. without FFTs. Quadratic in `n` per probe.
+            - `fft`: recomputes every entry as cross-correlation via an FFT of different length and checks the row sums against the popcounts. Quasi-linear in `n` per probe.
+            - `spot`: recomputes `spot_checks` randomly chosen offsets directly for every probe. Linear in `n` per probe.
+            - `off`: performs no verification at all.
+
+        Any mismatch raises an `AssertionError`.
+
+        :param mode: One of `VERIFICATION_MODES`
+        :param spot_checks: Number of offsets checked per probe in `spot` mode
+        :return: A short report naming the verification that ran, e.g. `spot:16`
+        '''
+        n = len(self.model)
+
+        # the appended column is not part of the convolution, it must always be zero
+        assert not self.convolutions[:, 2*n-1].any()
+
+        match mode:
+            case 'full':
+                model = self.model.astype(np.int64)
+                for p, c in zip(self.probes, self.convolutions):
+                    assert np.array_equal(np.correlate(p.astype(np.int64), model, 'full'), c[:2*n-1])
+                return 'full'
+
+            case 'fft':
+                fft_len = 4*n # deliberately differs from the length used for generation
+                model_spectrum = np.conj(np.fft.rfft(self.model, fft_len))
+                for p, c in zip(self.probes, self.convolutions):
+                    corr = np.fft.irfft(np.fft.rfft(p, fft_len) * model_spectrum, fft_len)
+                    corr = np.roll(corr, n-1)[:2*n-1] # negative offsets wrap around to the end
+                    assert np.allclose(corr, c[:2*n-1], rtol=0, atol=0.25)
+                    assert c.sum() == np.count_nonzero(p) * np.count_nonzero(self.model)
+                return 'fft'
+
+            case 'spot':
+                rng = np.random.default_rng()
+                offsets = rng.choice(2*n-1, size=min(spot_checks, 2*n-1), replace=False)
+                for i in offsets:
+                    s = i-n+1 # shift of the probe against the model
+                    if s >= 0:
+                        inner_products = np.count_nonzero(self.probes[:, s:] & self.model[:n-s], axis=1)
+                    else:
+                        inner_products = np.count_nonzero(self.probes[:, :n+s] & self.model[-s:], axis=1)
+                    assert np.array_equal(inner_products, self.convolutions[:, i])
+                return f'spot:{len(offsets)}'
+
+            case 'off':
+                return 'off'
+
+            case _:
+                raise ValueError(f'Unknown verification mode "{mode}", expected one of {VERIFICATION_MODES}')
+
+    def to_dict(self) -> dict:
+        '''
+        Converts the batch to plain Python types, following the JSON schema of `TestPattern`
+
+        :return: A dictionary with the keys `model`, `probes`, `miura` and `convolutions`
+        '''
+        return {
+            'model': self.model.tolist(),
+            'probes': self.probes.tolist(),
+            'miura': self.miura.tolist(),
+            'convolutions': self.convolutions.tolist(),
+        }
+
+    def __str__(self):
+        return json.dumps(self.to_dict())
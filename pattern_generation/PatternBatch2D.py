@@ -0,0 +1,156 @@
+import random
+import json
+import numpy as np
+
+from CircuitInput import *
+
+class PatternBatch2D:
+    '''
+    This class is the two-dimensional counterpart of `PatternBatch`. A finger
+    vein image is a binary pattern of shape `(h, w)`, so the model has shape
+    `(h, w)` and the probes are stacked to an array of shape `(m, h, w)`,
+    all of dtype `uint8`.
+
+    Since the finger is placed differently at every capture, a probe is
+    compared to the model under all translations `(dy, dx)` within a bounded
+    window (cf. `PatternBatch2D._batched_shifted_miura`). In contrast to
+    shifts of the flattened vectors, translations do not wrap across rows.
+
+    The circuit only knows flat vectors. `flatten` converts the batch to a
+    `PatternBatch` of length `h*w` (row-major), whose Miura scores,
+    convolutions and JSON output are the ones the circuit `MainComponent(h*w)`
+    is tested with. `circuit_input` does the same for the input of the circuit.
+
+    :param model: The model as bit matrix of shape `(h, w)`
+    :param probes: The probes as bit array of shape `(m, h, w)`
+    :param seed: The seed the batch was generated with, if any
+    '''
+
+    def __init__(self, model:np.ndarray, probes:np.ndarray, seed:int=None):
+        self.seed = seed
+        self.model = np.asarray(model, dtype=np.uint8)
+        self.probes = np.asarray(probes, dtype=np.uint8).reshape(-1, *self.model.shape)
+
+    def generate(h:int, w:int, m:int, seed:int=None, processes:int=1) -> 'PatternBatch2D':
+        '''
+        Generates a random pattern batch of `h x w` images with the distributions
+        of `PatternBatch.generate`. For the same seed, the flattened batch is
+        identical to `PatternBatch.generate(h*w, m, seed)`.
+
+        :param h: Height of the images
+        :param w: Width of the images
+        :param m: Number of probes (i.e. test cases)
+        :param seed: Seed for the random number generator, drawn randomly if not given
+        :param processes: Number of worker processes (see `PatternBatch.generate`)
+        :return: A new `PatternBatch2D`
+        '''
+        batch = PatternBatch.generate(h*w, m, seed, processes)
+        return PatternBatch2D(batch.model.reshape(h, w), batch.probes.reshape(m, h, w), batch.seed)
+
+    def _batched_shifted_miura(model:np.ndarray, probes:np.ndarray, max_shift:tuple[int, int]=(8, 8), chunk_size:int=2**22) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Computes the shift-tolerant Miura scores between one model and many
+        probes in 2D: the largest inner product of a probe translated by
+        `(dy, dx)` and the model, over all `|dy| <= max_shift[0]` and
+        `|dx| <= max_shift[1]`, divided by the sum of their popcounts. For the
+        translation `(0, 0)`, this is the Miura score of the flattened vectors.
+
+        The inner products at all translations are computed as 2D cross-correlation
+        with `np.fft.rfft2`, in chunks of roughly `chunk_size` spectrum entries.
+        As in `PatternBatch._batched_shifted_miura`, the FFTs are only as large
+        as needed for no translation of the window to wrap around, i.e. of shape
+        `(h + max_shift[0], w + max_shift[1])`, rounded up to sizes the FFT
+        handles efficiently (cf. `PatternBatch._fast_len`).
+
+        :param model: Bit matrix of shape `(h, w)`
+        :param probes: Bit array of shape `(m, h, w)`
+        :param max_shift: Largest translation `(dy, dx)` in either direction
+        :param chunk_size: Approximate number of complex values held at once
+        :return: A tuple of the scores (`float64`, shape `(m,)`, 0 for an empty probe and model) and the translations at which they are attained (`int64`, shape `(m, 2)`), ties broken in favor of the smaller translation
+        '''
+        (m, h, w) = probes.shape
+        max_shift = (min(max_shift[0], h-1), min(max_shift[1], w-1))
+        fft_shape = tuple( PatternBatch._fast_len(size + shift) for (size, shift) in zip((h, w), max_shift) )
+
+        # the window, ordered by the length of the translation, so that argmax prefers small translations
+        (dy, dx) = np.meshgrid(np.arange(-max_shift[0], max_shift[0]+1), np.arange(-max_shift[1], max_shift[1]+1), indexing='ij')
+        order = np.argsort(dy.ravel()**2 + dx.ravel()**2, kind='stable')
+        (dy, dx) = (dy.ravel()[order], dx.ravel()[order])
+        (rows, cols) = ((dy + h-1) % fft_shape[0], (dx + w-1) % fft_shape[1])
+
+        model_spectrum = np.fft.rfft2(model[::-1, ::-1], fft_shape)
+        images_per_chunk = max(1, chunk_size // (fft_shape[0] * fft_shape[1]))
+
+        best = np.zeros(m, dtype=np.int64)
+        best_shift = np.zeros((m, 2), dtype=np.int64)
+        for start in range(0, m, images_per_chunk):
+            chunk = probes[start:start+images_per_chunk]
+            corr = np.fft.irfft2(np.fft.rfft2(chunk, fft_shape) * model_spectrum, fft_shape)
+
+            window = np.rint(corr[:, rows, cols]).astype(np.int64)
+            arg = np.argmax(window, axis=1)
+            best[start:start+len(chunk)] = window[np.arange(len(chunk)), arg]
+            best_shift[start:start+len(chunk)] = np.stack((dy[arg], dx[arg]), axis=1)
+
+        divisor = np.count_nonzero(model) + np.count_nonzero(probes.reshape(m, -1), axis=1)
+
+        return (np.divide(best, divisor, out=np.zeros(m), where=divisor > 0), best_shift)
+
+    def shifted_miura(self, max_shift:tuple[int, int]=(8, 8)) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Computes the shift-tolerant Miura scores of all probes (cf. `PatternBatch2D._batched_shifted_miura`)
+
+        :param max_shift: Largest translation `(dy, dx)` in either direction
+        :return: A tuple of the scores and the translations at which they are attained
+        '''
+        return PatternBatch2D._batched_shifted_miura(self.model, self.probes, max_shift)
+
+    def flatten(self) -> PatternBatch:
+        '''
+        Flattens the images row by row to the vectors the circuit works on
+
+        :return: A `PatternBatch` of vector length `h*w`, with Miura scores and convolutions of the flattened vectors
+        '''
+        return PatternBatch(self.model.ravel(), self.probes.reshape(len(self.probes), -1), self.seed)
+
+    def circuit_input(self, i:int=0, seed:int=None) -> dict:
+        '''
+        Converts the model and the i-th probe to input for the circuit
+        `MainComponent(h*w)`, with the keys of `CircuitInput`.
+
+        :param i: Index of the probe (zero-indexed)
+        :param seed: Seed for the randomness of the commitments, drawn randomly if not given
+        :return: A dictionary with the keys `model`, `probe`, `r_model` and `r_probe`
+        '''
+        rng = random.Random(seed)
+
+        return {
+            'model': self.model.ravel().tolist(),
+            'probe': self.probes[i].ravel().tolist(),
+            'r_model': CircuitInput._random_field_element(rng),
+            'r_probe': CircuitInput._random_field_element(rng),
+        }
+
+    def to_dict(self, max_shift:tuple[int, int]=(8, 8)) -> dict:
+        '''
+        Converts the batch to plain Python types. The keys `model`, `probes`,
+        `miura` and `convolutions` contain the flattened batch, following the
+        JSON schema of `TestPattern`, so the node app can test the circuit
+        with it. The keys `height` and `width` give the shape of the images,
+        and `shifted_miura` and `shifts` the 2D shift-tolerant scores.
+
+        :param max_shift: Largest translation `(dy, dx)` for the shift-tolerant scores
+        :return: A dictionary as described above
+        '''
+        (scores, shifts) = self.shifted_miura(max_shift)
+
+        return {
+            **self.flatten().to_dict(),
+            'height': self.model.shape[0],
+            'width': self.model.shape[1],
+            'shifted_miura': scores.tolist(),
+            'shifts': shifts.tolist(),
+        }
+
+    def __str__(self):
+        return json.dumps(self.to_dict())
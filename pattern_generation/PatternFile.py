@@ -0,0 +1,183 @@
+import os
+import struct
+import numpy as np
+
+from PatternBatch import *
+
+class PatternFile:
+    '''
+    This class represents a test pattern stored in a compact binary container
+    and gives memory-mapped access to its contents.
+
+    The container consists of a fixed-size header followed by four sections,
+    each of which starts at an offset that is a multiple of `ALIGNMENT`:
+        - the model, bit-packed with `np.packbits` (`ceil(n/8)` bytes)
+        - the probes, bit-packed row by row (`m` rows of `ceil(n/8)` bytes)
+        - the Miura scores as little-endian `float64` (`m` values)
+        - the convolutions as little-endian unsigned integers of fixed width (`m` rows of `2n` values)
+
+    The header stores a magic number, the format version, the width of the
+    convolution entries in bytes, `n`, `m`, the seed the pattern was
+    generated with, a flag whether there is a seed at all and the
+    verification that ran (cf. `PatternBatch.verify`), as index into
+    `VERIFICATION_MODES` and number of spot checks. All multi-byte values are little-endian. The width of the
+    convolution entries is 2 bytes if `n` fits into a `uint16` and 4 bytes
+    otherwise, since no entry can exceed `n`.
+
+    Opening a file only reads the header and unpacks the model. The other
+    sections are exposed as read-only `np.memmap` arrays (`packed_probes`,
+    `miura` and `convolutions`), so even large files are available in
+    milliseconds and only the parts that are actually accessed are read.
+
+    :param path: Path to a file written by `PatternFile.write`
+    '''
+
+    MAGIC = b'VEINPAT\0'
+    VERSION = 2
+    HEADER = struct.Struct('<8sHHIIQBB2xI4x') # magic, version, conv width, n, m, seed, has seed, verification mode, padding, spot checks, padding
+    ALIGNMENT = 8
+
+    def __init__(self, path:str):
+        with open(path, 'rb') as f:
+            header = f.read(PatternFile.HEADER.size)
+
+        if len(header) < PatternFile.HEADER.size:
+            raise ValueError(f'"{path}" is too short to be a test pattern file')
+
+        (magic, version, conv_width, n, m, seed, has_seed, mode, spot_checks) = PatternFile.HEADER.unpack(header)
+
+        if magic != PatternFile.MAGIC:
+            raise ValueError(f'"{path}" is not a test pattern file')
+        if version != PatternFile.VERSION:
+            raise ValueError(f'Unsupported version {version} of test pattern file "{path}"')
+        if mode >= len(VERIFICATION_MODES):
+            raise ValueError(f'Unknown verification mode {mode} in test pattern file "{path}"')
+
+        self.n = n
+        self.m = m
+        self.seed = seed if has_seed else None
+        self.verification = f'spot:{spot_checks}' if VERIFICATION_MODES[mode] == 'spot' else VERIFICATION_MODES[mode]
+
+        layout = PatternFile._layout(n, m, conv_width)
+
+        if os.path.getsize(path) < layout['end']:
+            raise ValueError(f'Test pattern file "{path}" is truncated')
+
+        map_section = lambda name, dtype, shape: np.memmap(path, dtype=dtype, mode='r', offset=layout[name], shape=shape)
+
+        self.packed_model = map_section('model', np.uint8, (PatternFile._packed_len(n),))
+        self.model = np.unpackbits(self.packed_model, count=n)
+        self.packed_probes = map_section('probes', np.uint8, (m, PatternFile._packed_len(n)))
+        self.miura = map_section('miura', '<f8', (m,))
+        self.convolutions = map_section('convolutions', f'<u{conv_width}', (m, 2*n))
+
+    def _packed_len(n:int) -> int:
+        '''
+        :param n: Length of a bit vector
+        :return: Number of bytes needed to store `n` bits with `np.packbits`
+        '''
+        return (n+7) // 8
+
+    def _conv_width(n:int) -> int:
+        '''
+        :param n: Length of the vectors
+        :return: Width in bytes of the convolution entries of a pattern with vectors of length `n`
+        '''
+        return 2 if n <= np.iinfo(np.uint16).max else 4
+
+    def _layout(n:int, m:int, conv_width:int) -> dict[str, int]:
+        '''
+        Computes the byte offsets of the sections of a test pattern file
+
+        :param n: Length of the vectors
+        :param m: Number of probes
+        :param conv_width: Width in bytes of the convolution entries
+        :return: A dictionary mapping section names to offsets, with the total file size under the key `end`
+        '''
+        align = lambda offset: -(-offset // PatternFile.ALIGNMENT) * PatternFile.ALIGNMENT
+        sizes = [
+            ('model', PatternFile._packed_len(n)),
+            ('probes', m * PatternFile._packed_len(n)),
+            ('miura', m * 8),
+            ('convolutions', m * 2*n * conv_width),
+        ]
+
+        layout = {}
+        offset = PatternFile.HEADER.size
+        for (name, size) in sizes:
+            offset = align(offset)
+            layout[name] = offset
+            offset += size
+        layout['end'] = offset
+
+        return layout
+
+    def write(path:str, batch:PatternBatch, verification:str='off') -> None:
+        '''
+        Writes a pattern batch to a binary test pattern file.
+        The seed of the batch, if any, and the verification are stored in the header.
+
+        :param path: Path of the file to write
+        :param batch: The pattern batch to store
+        :param verification: The report of the verification that ran, as returned by `PatternBatch.verify`
+        '''
+        (m, n) = batch.probes.shape
+        (mode, _, spot_checks) = verification.partition(':')
+        conv_width = PatternFile._conv_width(n)
+        layout = PatternFile._layout(n, m, conv_width)
+
+        sections = {
+            'model': np.packbits(batch.model),
+            'probes': np.packbits(batch.probes, axis=1),
+            'miura': batch.miura.astype('<f8'),
+            'convolutions': batch.convolutions.astype(f'<u{conv_width}'),
+        }
+
+        with open(path, 'wb') as f:
+            f.write(PatternFile.HEADER.pack(
+                PatternFile.MAGIC, PatternFile.VERSION, conv_width, n, m,
+                batch.seed or 0, batch.seed is not None,
+                VERIFICATION_MODES.index(mode), int(spot_checks or 0)
+            ))
+            for (name, data) in sections.items():
+                f.write(b'\0' * (layout[name] - f.tell()))
+                f.write(data.tobytes())
+
+    def probes(self, start:int=0, stop:int=None) -> np.ndarray:
+        '''
+        Unpacks the probes with indices `start` to `stop` (exclusive)
+
+        :param start: Index of the first probe
+        :param stop: Index after the last probe, defaults to `m`
+        :return: A bit matrix of shape `(stop-start, n)`
+        '''
+        return np.unpackbits(self.packed_probes[start:stop], axis=1, count=self.n)
+
+    def test_case(self, i:int) -> dict:
+        '''
+        Extracts the i-th test case, with the same keys as the node app uses for test cases
+
+        :param i: Index of the test case (zero-indexed)
+        :return: A dictionary with the keys `model`, `probe`, `miura` and `convolution`
+        '''
+        return {
+            'model': self.model.tolist(),
+            'probe': self.probes(i, i+1)[0].tolist(),
+            'miura': float(self.miura[i]),
+            'convolution': self.convolutions[i].tolist(),
+        }
+
+    def to_dict(self) -> dict:
+        '''
+        Converts the whole file to plain Python types, following the JSON schema of `TestPattern`
+
+        :return: A dictionary with the keys `seed`, `model`, `probes`, `miura`, `convolutions` and `verification`
+        '''
+        return {
+            'seed': self.seed,
+            'model': self.model.tolist(),
+            'probes': self.probes().tolist(),
+            'miura': self.miura.tolist(),
+            'convolutions': self.convolutions.tolist(),
+            'verification': self.verification,
+        }
@@ -0,0 +1,214 @@
+import os
+import re
+import numpy as np
+
+from multiprocessing import Pool
+
+FIELD_P = 21888242871839275222246405745257275088548364400416034343698204186575808495617 # order of the bn128 curve
+BITS_PER_FIELD_ELEMENT = 253 # as in CommitToBits, floor(log(p)) bits fit into one field element
+
+POSEIDON_CONSTANTS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '../circom_snarkjs_workdir/circomlib/circuits/poseidon_constants.circom'
+)
+
+class PoseidonCommitment:
+    '''
+    This class is a Python implementation of the commitment pipeline of
+    `commit.circom`. It computes the same value as the `C_model` output of
+    the circuit, without computing a witness.
+
+    The pipeline consists of the following templates, all of which are
+    mirrored by a method of the same name:
+        - `bin2field` packs up to `BITS_PER_FIELD_ELEMENT` bits into one field element (least significant bit first)
+        - `Poseidon` is the optimized Poseidon hash of circomlib (`PoseidonEx` with one output)
+        - `LongPoseidon` hashes arbitrarily many field elements with a cascade of `Poseidon(16)`
+        - `CommitToBits` packs a bit vector and hashes the field elements together with the randomness
+
+    The round constants and matrices are parsed from the very file that the
+    circuit includes, so both always use the same parameters. All methods
+    work on batches: every row of the input is one independent instance,
+    stored as Python integers in NumPy arrays of dtype `object`.
+
+    :param constants_file: Path to `poseidon_constants.circom` of circomlib
+    '''
+
+    N_ROUNDS_F = 8
+    N_ROUNDS_P = [56, 57, 56, 60, 60, 63, 64, 63, 60, 66, 60, 65, 70, 60, 64, 68] # indexed by t-2, as in poseidon.circom
+
+    def __init__(self, constants_file:str=POSEIDON_CONSTANTS_FILE):
+        with open(constants_file, 'r') as f:
+            source = f.read()
+
+        self.constants = {
+            name: PoseidonCommitment._parse_constants(source, name)
+            for name in ['POSEIDON_C', 'POSEIDON_S', 'POSEIDON_M', 'POSEIDON_P']
+        }
+
+    def _parse_constants(source:str, name:str) -> dict[int, list[int]]:
+        '''
+        Extracts the constants that a function of `poseidon_constants.circom`
+        returns for every state width `t`. Nested arrays are flattened.
+
+        :param source: Content of `poseidon_constants.circom`
+        :param name: Name of the function, e.g. `POSEIDON_C`
+        :return: A dictionary mapping `t` to the flat list of constants
+        '''
+        start = source.index(f'function {name}(t)')
+        end = source.find('function ', start+1)
+        body = source[start:end if end >= 0 else len(source)]
+
+        branches = re.split(r't\s*==\s*(\d+)', body)
+
+        return {
+            int(t): [ int(x, 16) for x in re.findall(r'0x[0-9a-fA-F]+', branch) ]
+            for (t, branch) in zip(branches[1::2], branches[2::2])
+        }
+
+    def _sigma(x:np.ndarray) -> np.ndarray:
+        '''
+        :param x: An array of field elements
+        :return: The S-box `x**5`, applied element-wise
+        '''
+        x2 = (x * x) % FIELD_P
+        return (x2 * x2 % FIELD_P) * x % FIELD_P
+
+    def Poseidon(self, inputs) -> np.ndarray:
+        '''
+        Computes the Poseidon hash of every row of `inputs`, following
+        `PoseidonEx(nInputs, 1)` with an initial state of 0 step by step.
+
+        :param inputs: A matrix of shape `(batch, nInputs)` with `1 <= nInputs <= 16`
+        :return: A vector of shape `(batch,)` with the hashes
+        '''
+        inputs = np.array(inputs, dtype=object, ndmin=2)
+        (batch, n_inputs) = inputs.shape
+
+        t = n_inputs + 1
+        n_rounds_f = PoseidonCommitment.N_ROUNDS_F
+        n_rounds_p = PoseidonCommitment.N_ROUNDS_P[t-2]
+
+        C = np.array(self.constants['POSEIDON_C'][t], dtype=object)
+        S = np.array(self.constants['POSEIDON_S'][t], dtype=object)
+        M = np.array(self.constants['POSEIDON_M'][t], dtype=object).reshape(t, t)
+        P = np.array(self.constants['POSEIDON_P'][t], dtype=object).reshape(t, t)
+
+        ark = lambda state, r: (state + C[r:r+t]) % FIELD_P
+        mix = lambda state, matrix: (state @ matrix) % FIELD_P # out[i] = sum_j matrix[j][i]*in[j]
+
+        state = np.zeros((batch, t), dtype=object)
+        state[:, 1:] = inputs % FIELD_P
+        state = ark(state, 0)
+
+        for r in range(n_rounds_f//2 - 1):
+            state = mix(ark(PoseidonCommitment._sigma(state), (r+1)*t), M)
+
+        state = mix(ark(PoseidonCommitment._sigma(state), (n_rounds_f//2)*t), P)
+
+        for r in range(n_rounds_p):
+            state[:, 0] = (PoseidonCommitment._sigma(state[:, 0]) + C[(n_rounds_f//2+1)*t + r]) % FIELD_P
+
+            s = S[(t*2-1)*r : (t*2-1)*(r+1)]
+            first = (state @ s[:t]) % FIELD_P
+            state[:, 1:] = (state[:, 1:] + state[:, :1] * s[t:]) % FIELD_P
+            state[:, 0] = first
+
+        for r in range(n_rounds_f//2 - 1):
+            state = mix(ark(PoseidonCommitment._sigma(state), (n_rounds_f//2+1)*t + n_rounds_p + r*t), M)
+
+        return (PoseidonCommitment._sigma(state) @ M[:, 0]) % FIELD_P
+
+    def LongPoseidon(self, inputs) -> np.ndarray:
+        '''
+        Hashes every row of `inputs` with the cascade of `LongPoseidon(len)`:
+        Rows of at most 16 elements are hashed directly. Otherwise, the last 16
+        elements are hashed in reverse order and replaced by their hash.
+
+        :param inputs: A matrix of shape `(batch, len)`
+        :return: A vector of shape `(batch,)` with the hashes
+        '''
+        inputs = np.array(inputs, dtype=object, ndmin=2)
+        length = inputs.shape[1]
+
+        while length > 16:
+            h = self.Poseidon(inputs[:, :length-17:-1])
+            inputs = np.concatenate((inputs[:, :length-16], h[:, None]), axis=1)
+            length = inputs.shape[1]
+
+        return self.Poseidon(inputs)
+
+    def bin2field(bits) -> np.ndarray:
+        '''
+        Packs every row of `bits` into one integer, least significant bit first
+
+        :param bits: A bit matrix of shape `(batch, len)`
+        :return: A vector of shape `(batch,)` of dtype `object`
+        '''
+        packed = np.packbits(np.array(bits, dtype=np.uint8, ndmin=2), axis=1, bitorder='little')
+
+        res = np.empty(packed.shape[0], dtype=object)
+        res[:] = [ int.from_bytes(row.tobytes(), 'little') for row in packed ]
+        return res
+
+    def CommitToBits(self, bits, r) -> np.ndarray:
+        '''
+        Commits to every row of `bits` with the randomness `r`, as `CommitToBits(len)` does:
+        The bits are packed into field elements with `bin2field` in chunks of
+        `BITS_PER_FIELD_ELEMENT`, and the field elements followed by `r` are
+        hashed with `LongPoseidon`.
+
+        :param bits: A bit matrix of shape `(batch, len)`
+        :param r: The randomness, either one integer or one per row
+        :return: A vector of shape `(batch,)` with the commitments
+        '''
+        bits = np.array(bits, dtype=np.uint8, ndmin=2)
+        (batch, length) = bits.shape
+
+        field_elements = [
+            PoseidonCommitment.bin2field(bits[:, i:i+BITS_PER_FIELD_ELEMENT])
+            for i in range(0, length, BITS_PER_FIELD_ELEMENT)
+        ]
+
+        r = np.broadcast_to(np.array(r, dtype=object), (batch,))
+
+        return self.LongPoseidon(np.stack(field_elements + [r], axis=1))
+
+_worker_commitment = None
+
+def _init_worker(constants_file:str) -> None:
+    '''
+    Initializes a worker process of `commit_models` by parsing the constants once
+    '''
+    global _worker_commitment
+    _worker_commitment = PoseidonCommitment(constants_file)
+
+def _commit_chunk(args:tuple) -> list[int]:
+    '''
+    Commits to one chunk of models inside a worker process of `commit_models`
+    '''
+    (models, r) = args
+    return _worker_commitment.CommitToBits(models, r).tolist()
+
+def commit_models(models, r, processes:int=None, chunk_size:int=256, constants_file:str=POSEIDON_CONSTANTS_FILE) -> list[int]:
+    '''
+    Computes the commitments `C_model` for many models across a pool of
+    worker processes. The models are split into chunks of `chunk_size`, each
+    of which is committed as one batch.
+
+    :param models: A bit matrix of shape `(batch, len)`, one model per row
+    :param r: The randomness, either one integer or one per model
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :param chunk_size: Number of models committed by a worker at once
+    :param constants_file: Path to `poseidon_constants.circom` of circomlib
+    :return: A list with one commitment per model, in order
+    '''
+    models = np.array(models, dtype=np.uint8, ndmin=2)
+    r = np.broadcast_to(np.array(r, dtype=object), (models.shape[0],))
+
+    chunks = [
+        (models[i:i+chunk_size], r[i:i+chunk_size])
+        for i in range(0, models.shape[0], chunk_size)
+    ]
+
+    with Pool(processes, initializer=_init_worker, initargs=(constants_file,)) as pool:
+        return [ c for chunk in pool.map(_commit_chunk, chunks) for c in chunk ]
@@ -0,0 +1,251 @@
+import json
+import numpy as np
+
+from fractions import Fraction
+from multiprocessing import Pool
+
+from Gallery import *
+
+EVALUATION_BLOCK_SIZE = 256 # probes scored against the gallery per task of `ScoreHistogram.evaluate`
+EVALUATION_CHUNK_BITS = 2**24 # bits of the models unpacked at once per task, at most `SCAN_CHUNK_SIZE` models
+
+_worker_gallery = None # the gallery of the worker processes of `ScoreHistogram.evaluate`
+
+class ScoreHistogram:
+    '''
+    This class accumulates the Miura scores of genuine and impostor pairs in
+    fixed bins, so that the acceptance threshold of the verifier can be
+    calibrated on far more pairs than fit into memory.
+
+    Since all vectors are binary, a Miura score `miura_dividend / miura_divisor`
+    is at most 1/2. The scores are sorted into `bins` bins of width
+    `1/(2*bins)`, where bin `i` holds the scores in `[i/(2*bins), (i+1)/(2*bins))`
+    and the extra bin `bins` holds the score 1/2. The bin of a score is
+    computed from its integer dividend and divisor, without rounding errors,
+    so a threshold `t_i = i/(2*bins)` accepts exactly the pairs of the bins
+    `i` and above, just like the check
+
+        2*bins * miura_dividend >= i * miura_divisor
+
+    of the verifier. Pairs whose vectors are both empty score 0 (cf. `Gallery`).
+
+    Histograms of disjoint sets of pairs are merged with `+`.
+
+    :param bins: Number of bins of the scores below 1/2
+    :param genuine: Counts of the genuine pairs per bin, zero if not given
+    :param impostor: Counts of the impostor pairs per bin, zero if not given
+    '''
+
+    def __init__(self, bins:int=4096, genuine:np.ndarray=None, impostor:np.ndarray=None):
+        self.bins = bins
+        self.genuine = np.zeros(bins+1, dtype=np.int64) if genuine is None else np.asarray(genuine, dtype=np.int64)
+        self.impostor = np.zeros(bins+1, dtype=np.int64) if impostor is None else np.asarray(impostor, dtype=np.int64)
+
+    def __add__(self, other:'ScoreHistogram') -> 'ScoreHistogram':
+        if self.bins != other.bins:
+            raise ValueError(f'Cannot merge histograms with {self.bins} and {other.bins} bins')
+
+        return ScoreHistogram(self.bins, self.genuine + other.genuine, self.impostor + other.impostor)
+
+    def _bin(self, dividends:np.ndarray, divisors:np.ndarray) -> np.ndarray:
+        '''
+        :param dividends: Inner products of the pairs
+        :param divisors: Sums of the popcounts of the pairs
+        :return: The bin of every score, as `int64` array of the same shape
+        '''
+        dividends = np.asarray(dividends, dtype=np.int64)
+        divisors = np.asarray(divisors, dtype=np.int64)
+
+        return np.where(divisors > 0, (2*self.bins * dividends) // np.maximum(divisors, 1), 0)
+
+    def add(self, dividends:np.ndarray, divisors:np.ndarray, genuine:np.ndarray):
+        '''
+        Adds the scores of labelled pairs to the histogram
+
+        :param dividends: Inner products of the pairs (`miura_dividend`)
+        :param divisors: Sums of the popcounts of the pairs (`miura_divisor`)
+        :param genuine: Boolean array of the same shape, `True` for the genuine pairs
+        '''
+        bins = self._bin(dividends, divisors)
+        genuine = np.asarray(genuine, dtype=bool)
+
+        all_pairs = np.bincount(bins.ravel(), minlength=self.bins+1)
+        genuine_pairs = np.bincount(bins[genuine], minlength=self.bins+1)
+
+        self.genuine += genuine_pairs
+        self.impostor += all_pairs - genuine_pairs
+
+    def evaluate(gallery:Gallery, probes:np.ndarray, sources:np.ndarray, bins:int=4096, processes:int=None) -> 'ScoreHistogram':
+        '''
+        Scores every probe against every model of a gallery and accumulates
+        the scores. A pair is genuine if the probe was captured from the
+        model, i.e. if the index of the model is the source of the probe.
+
+        The gallery × probe score matrix is never materialized: the probes are
+        processed in blocks of `EVALUATION_BLOCK_SIZE`, in parallel by a
+        process pool, and every block is scored against the gallery in chunks
+        of at most `SCAN_CHUNK_SIZE` models (cf. `ScoreHistogram._evaluate_block`).
+        File-backed galleries (cf. `Gallery.open`) are reopened by every
+        worker instead of being copied to it.
+
+        :param gallery: The enrolled models
+        :param probes: The probes as bit matrix of shape `(m, n)`
+        :param sources: Index of the model every probe was captured from, `-1` for probes of fingers that are not enrolled
+        :param bins: Number of bins, cf. `ScoreHistogram`
+        :param processes: Number of worker processes, `None` for the number of CPUs
+        :return: A new `ScoreHistogram` of all `len(gallery) * m` pairs
+        '''
+        probes = np.asarray(probes, dtype=np.uint8)
+        sources = np.asarray(sources, dtype=np.int64)
+
+        if probes.ndim != 2 or probes.shape[1] != gallery.n:
+            raise ValueError(f'Expected probes of length {gallery.n}, got shape {probes.shape}')
+
+        blocks = [ (probes[start:start+EVALUATION_BLOCK_SIZE], sources[start:start+EVALUATION_BLOCK_SIZE], bins) for start in range(0, len(probes), EVALUATION_BLOCK_SIZE) ]
+        source = gallery.words.filename if isinstance(gallery.words, np.memmap) else gallery
+
+        if processes == 1 or len(blocks) <= 1:
+            ScoreHistogram._init_worker(gallery)
+            results = [ ScoreHistogram._evaluate_block(block) for block in blocks ]
+        else:
+            with Pool(processes, ScoreHistogram._init_worker, (source,)) as pool:
+                results = pool.map(ScoreHistogram._evaluate_block, blocks)
+
+        return sum(results, ScoreHistogram(bins))
+
+    def _init_worker(gallery:Gallery|str):
+        '''
+        Makes the gallery available to `ScoreHistogram._evaluate_block`
+
+        :param gallery: The gallery, or the path to a gallery file
+        '''
+        global _worker_gallery
+        _worker_gallery = Gallery.open(gallery) if isinstance(gallery, str) else gallery
+
+    def _evaluate_block(args:tuple) -> 'ScoreHistogram':
+        '''
+        Scores a block of probes against the gallery of the worker. This is
+        the unit of work of the process pool in `ScoreHistogram.evaluate`.
+
+        The inner products of the block with a chunk of models are one matrix
+        product of the unpacked bits in `float32`, which is exact for vectors
+        shorter than `2^24` and much faster than popcounts of the packed words.
+        The chunks are limited to `EVALUATION_CHUNK_BITS` unpacked bits.
+
+        :param args: A tuple `(probes, sources, bins)`
+        :return: The histogram of the scores of the block
+        '''
+        (probes, sources, bins) = args
+        gallery = _worker_gallery
+        histogram = ScoreHistogram(bins)
+
+        probe_bits = probes.astype(np.float32)
+        probe_popcounts = np.count_nonzero(probes, axis=1)
+        chunk_size = min(SCAN_CHUNK_SIZE, max(1, EVALUATION_CHUNK_BITS // max(gallery.n, 1)))
+
+        for start in range(0, len(gallery), chunk_size):
+            stop = min(start+chunk_size, len(gallery))
+            words = np.ascontiguousarray(gallery.words[start:stop])
+            models = np.unpackbits(words.view(np.uint8), axis=1, count=gallery.n).astype(np.float32)
+
+            dividends = np.rint(probe_bits @ models.T).astype(np.int64)
+            divisors = probe_popcounts[:, None] + gallery.popcounts[start:stop].astype(np.int64)[None, :]
+            genuine = sources[:, None] == np.arange(start, stop)[None, :]
+
+            histogram.add(dividends, divisors, genuine)
+
+        return histogram
+
+    @property
+    def thresholds(self) -> np.ndarray:
+        '''
+        :return: The lower edges `i/(2*bins)` of all bins, the candidate thresholds
+        '''
+        return np.arange(self.bins+1) / (2*self.bins)
+
+    def far_frr(self) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Computes the error rates of the verifier for every threshold
+        `t_i = i/(2*bins)`, i.e. when it accepts the scores of at least `t_i`.
+
+        :return: A tuple of the false acceptance rates (impostor pairs accepted) and the false rejection rates (genuine pairs rejected), each of shape `(bins+1,)`
+        '''
+        accepted_impostors = np.cumsum(self.impostor[::-1])[::-1]
+        rejected_genuine = np.cumsum(self.genuine) - self.genuine
+
+        far = accepted_impostors / max(self.impostor.sum(), 1)
+        frr = rejected_genuine / max(self.genuine.sum(), 1)
+
+        return (far, frr)
+
+    def roc(self) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        :return: The ROC curve as tuple of the false acceptance rates and the true acceptance rates `1 - FRR`, from the lowest threshold to the highest
+        '''
+        (far, frr) = self.far_frr()
+        return (far, 1 - frr)
+
+    def eer(self) -> tuple[float, float]:
+        '''
+        Computes the equal error rate, where FAR and FRR coincide. Since
+        both are only known at the thresholds `t_i`, they are interpolated
+        linearly between the two thresholds where FAR - FRR changes sign.
+
+        :return: A tuple of the equal error rate and the (interpolated) threshold at which it is attained
+        '''
+        (far, frr) = self.far_frr()
+        diff = far - frr
+
+        i = int(np.argmax(diff <= 0)) # FAR decreases and FRR increases with the threshold, and diff[bins] <= 0
+        if i == 0:
+            return (float(far[0]), 0.0)
+
+        w = diff[i-1] / (diff[i-1] - diff[i])
+        eer = far[i-1] + w * (far[i] - far[i-1])
+
+        return (float(eer), float((i-1 + w) / (2*self.bins)))
+
+    def threshold(self, far:float) -> Fraction:
+        '''
+        Finds the lowest threshold whose false acceptance rate is at most `far`,
+        which is the threshold with the lowest FRR under this constraint.
+
+        :param far: The largest acceptable false acceptance rate
+        :return: The threshold `t = p/q` as a fraction, so the verifier accepts iff `q * miura_dividend >= p * miura_divisor`
+        '''
+        (rates, _) = self.far_frr()
+        i = int(np.argmax(rates <= far)) if (rates <= far).any() else self.bins + 1
+
+        return Fraction(i, 2*self.bins)
+
+    def to_dict(self, far_targets:tuple[float, ...]=(1e-2, 1e-3, 1e-4)) -> dict:
+        '''
+        Converts the histogram and its evaluation to plain Python types
+
+        :param far_targets: False acceptance rates for which the thresholds are reported
+        :return: A dictionary with the keys `bins`, `genuine`, `impostor`, `eer`, `eer_threshold` and `thresholds`, the latter mapping every target FAR to the threshold, its FAR and its FRR
+        '''
+        (eer, eer_threshold) = self.eer()
+        (far, frr) = self.far_frr()
+
+        thresholds = {}
+        for target in far_targets:
+            t = self.threshold(target)
+            i = min(int(t * 2*self.bins), self.bins)
+            thresholds[str(target)] = {
+                'threshold': [t.numerator, t.denominator],
+                'far': float(far[i]) if t <= Fraction(1, 2) else 0.0,
+                'frr': float(frr[i]) if t <= Fraction(1, 2) else 1.0,
+            }
+
+        return {
+            'bins': self.bins,
+            'genuine': self.genuine.tolist(),
+            'impostor': self.impostor.tolist(),
+            'eer': eer,
+            'eer_threshold': eer_threshold,
+            'thresholds': thresholds,
+        }
+
+    def __str__(self):
+        return json.dumps(self.to_dict())
@@ -1,21 +1,21 @@
-import random
 import json
 import numpy as np
 
 from operator import mul
 
+from PatternBatch import *
+
 class TestPattern:
     '''
     This class is used to generate and represent test patterns. It contains one
     model and many probes and their respective miura scores. That is, one test
     pattern contains many test cases.
 
-    Initializes a test pattern by filling it with random bits.
-
-    The `model` is always filled with a vector that is distributed as Bernoulli(0.5)
+    The `model` is a vector that is distributed as Bernoulli(0.5).
 
-    The individual `probes` are also Bernoulli distributed, but the a probability
-    that gradually increases from 0 to 1.
+    The individual `probes` are also Bernoulli distributed, but with a probability
+    that gradually increases from `1/(m+1)` for the first probe to `m/(m+1)`
+    for the last one (cf. `PatternBatch._generate_probes`).
 
     The `miura` property is an array containing all the Miura scores between
     the model and the (many) probes.
@@ -24,39 +24,36 @@ class TestPattern:
     the probes, where the order of the entries in the model are reversed.
     Effectively, this gives us vectors containing the inner products between the
     model and probes for all possible offsets. (See project report for detaisl).
-    This property is enforced with assertions.
+    This property is enforced with assertions. How thoroughly it is checked is
+    selected with the `verification` parameter (see `PatternBatch.verify`),
+    and the `verification` property records which check actually ran.
+
+    The generation itself is delegated to `PatternBatch`, which produces all
+    probes, Miura scores and convolutions with batched NumPy operations. The
+    results are converted to plain Python lists afterwards, so the JSON output
+    is unchanged. For a given seed, the test pattern is reproducible, no
+    matter how many worker processes generate it.
 
     :param n: Length of the vectors
     :param m: Number of probes (i.e. test cases)
+    :param verification: Verification mode, one of `VERIFICATION_MODES`
+    :param spot_checks: Number of offsets checked per probe if `verification` is `spot`
+    :param seed: Seed for the random number generator, drawn randomly if not given and recorded in the `seed` property
+    :param processes: Number of worker processes for the generation (see `PatternBatch.generate`)
     '''
 
-    def __init__(self, n:int, m:int):
-        self.model = TestPattern._generate_bit_vector(n, 0.5)
-        self.probes = [ TestPattern._generate_bit_vector(n, (i+1)/(m+1)) for i in range(m) ]
+    def __init__(self, n:int, m:int, verification:str='full', spot_checks:int=16, seed:int=None, processes:int=1):
+        batch = PatternBatch.generate(n, m, seed, processes)
 
-        self.miura = [ TestPattern._miura(self.model, probe) for probe in self.probes]
-        self.convolutions = [ np.convolve(self.model[::-1], p) for p in self.probes] # convolve with reversed model
-        self.convolutions = [ [int(x) for x in c] + [0] for c in self.convolutions] # need to convert to int and append zero to match length of output of circuit
+        self.seed = batch.seed
 
-        # test that the convolution actually matches the inner products:
-        for p,c in zip(self.probes, self.convolutions):
-            # print("probe:", p)
-            # print("model:", self.model)
-            # print("conv: ", c)
-            for i in range(len(c)):
-                inner_product = sum([ p[j+i-n+1]*self.model[j] for j in range(len(p)) if j+i-n+1>=0 and j+i-n+1<n])
-                # print(inner_product)
-                assert inner_product == c[i]
-
-    def _generate_bit_vector(n:int, p:float) -> list[int]:
-        '''
-        Generates random bit vectors where each element is distributed Bernoulli(p)
+        self.model = batch.model.tolist()
+        self.probes = batch.probes.tolist()
+        self.miura = batch.miura.tolist()
+        self.convolutions = batch.convolutions.tolist() # convolutions with reversed model, zero appended to match length of output of circuit
 
-        :param n: Vector length
-        :param p: Probability for Bernoulli distribution
-        :return: A Bernoulli(`p`) distributed vector of `n` bits
-        '''
-        return [ int(random.random() <= p) for _ in range(n)]
+        # test that the convolution actually matches the inner products:
+        self.verification = batch.verify(verification, spot_checks)
 
     def _miura(a:list[int], b:list[int]) -> float:
         '''
@@ -64,13 +61,14 @@ class TestPattern:
 
         :param a: First vector
         :param b: second vector
-        :return: The Miura score between `a` and `b`
+        :return: The Miura score between `a` and `b`, 0 if both are zero (cf. `PatternBatch._batched_miura`)
         '''
 
         assert len(a) == len(b)
 
         dot = lambda a, b: sum(map(mul, a, b))
-        return dot(a,b)/(dot(a,a) + dot(b,b))
+        divisor = dot(a,a) + dot(b,b)
+        return dot(a,b)/divisor if divisor > 0 else 0.0
 
     def __str__(self):
         return json.dumps(self.__dict__)
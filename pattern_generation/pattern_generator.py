@@ -3,9 +3,14 @@ A generator for test patterns and random circuit input for the semester project
 '''
 
 import sys
+import json
 
 from CircuitInput import *
 from TestPattern import *
+from PatternFile import *
+from PatternBatch2D import *
+from PairBatch import *
+from ScoreHistogram import *
 
 def usage() -> None:
     '''
@@ -30,6 +35,12 @@ def parse_cli_args(argv:list[str]) -> tuple[str, tuple]:
         - usage
         - die
         - test_pattern
+        - test_pattern_stream
+        - test_pattern_binary
+        - test_pattern_2d
+        - test_pairs
+        - calibrate
+        - unpack
         - random_input
 
     Note that the set of possible return values for the command differs
@@ -48,34 +59,117 @@ def parse_cli_args(argv:list[str]) -> tuple[str, tuple]:
 
     match command_str:
         case "test_pattern":
-            if argc < 3 or argc > 4:
-                return ("die", (f"Error: The command \"test_pattern\" takes 1 or 2 arguments, {argc-2} given."))
+            if argc < 3 or argc > 7:
+                return ("die", (f"Error: The command \"test_pattern\" takes 1 to 5 arguments, {argc-2} given."))
+
+            return parse_test_pattern_args(command_str, argv[2:])
+
+        case "test_pattern_stream":
+            if argc < 3 or argc > 6:
+                return ("die", (f"Error: The command \"test_pattern_stream\" takes 1 to 4 arguments, {argc-2} given."))
+
+            (command, args) = parse_test_pattern_args(command_str, argv[2:])
+            if command == "die":
+                return (command, args)
+
+            return (command, args[:5]) # streams are generated sequentially, there are no processes
+
+        case "test_pattern_binary":
+            if argc < 4 or argc > 8:
+                return ("die", (f"Error: The command \"test_pattern_binary\" takes 2 to 6 arguments, {argc-2} given."))
+
+            output_file = argv[2]
+
+            (command, args) = parse_test_pattern_args(command_str, argv[3:])
+            if command == "die":
+                return (command, args)
+
+            return (command, (output_file, *args))
+
+        case "test_pattern_2d":
+            if argc < 4 or argc > 8:
+                return ("die", (f"Error: The command \"test_pattern_2d\" takes 2 to 6 arguments, {argc-2} given."))
+
+            try:
+                (height, width) = (int(argv[2]), int(argv[3]))
+                n_test_cases = int(argv[4]) if argc >= 5 else 10
+                max_shift = (int(argv[5]), int(argv[6])) if argc >= 7 else (8, 8)
+                seed = int(argv[7]) if argc == 8 else None
+            except ValueError:
+                return ("die", ("Error: All arguments of \"test_pattern_2d\" need to be integers"))
+
+            if argc == 6:
+                return ("die", ("Error: Argument max_shift_y needs to be followed by max_shift_x"))
+
+            return ("test_pattern_2d", (height, width, n_test_cases, max_shift, seed))
+
+        case "test_pairs":
+            if argc < 3 or argc > 7:
+                return ("die", (f"Error: The command \"test_pairs\" takes 1 to 5 arguments, {argc-2} given."))
 
             try:
                 vector_length = int(argv[2])
+                n_models = int(argv[3]) if argc >= 4 else 10
+                n_pairs = int(argv[4]) if argc >= 5 else 10
+                seed = int(argv[5]) if argc >= 6 else None
+                processes = int(argv[6]) if argc == 7 else 1
             except ValueError:
-                return ("die", ("Error: Argument vector_length needs to be an integer"))
+                return ("die", ("Error: All arguments of \"test_pairs\" need to be integers"))
 
-            if argc == 4:
-                try:
-                    n_test_cases = int(argv[3])
-                except ValueError:
-                    return ("die", ("Error: If N_test_cases is spedified, it needs to be an integer, otherwise, 10 will be used as default value."))
-            else:
-                n_test_cases = 10
+            if n_models < 2:
+                return ("die", ("Error: Argument n_models needs to be at least 2"))
+            if processes < 1:
+                return ("die", ("Error: Argument processes needs to be at least 1"))
 
-            return ("test_pattern", (vector_length, n_test_cases))
+            return ("test_pairs", (vector_length, n_models, n_pairs, seed, processes))
 
-        case "random_input":
+        case "calibrate":
+            if argc < 3 or argc > 8:
+                return ("die", (f"Error: The command \"calibrate\" takes 1 to 6 arguments, {argc-2} given."))
+
+            try:
+                vector_length = int(argv[2])
+                n_models = int(argv[3]) if argc >= 4 else 1000
+                n_probes = int(argv[4]) if argc >= 5 else 1000
+                bins = int(argv[5]) if argc >= 6 else 4096
+                seed = int(argv[6]) if argc >= 7 else None
+                processes = int(argv[7]) if argc == 8 else None
+            except ValueError:
+                return ("die", ("Error: All arguments of \"calibrate\" need to be integers"))
+
+            if n_models < 2:
+                return ("die", ("Error: Argument n_models needs to be at least 2"))
+            if bins < 1:
+                return ("die", ("Error: Argument bins needs to be at least 1"))
+            if processes is not None and processes < 1:
+                return ("die", ("Error: Argument processes needs to be at least 1"))
+
+            return ("calibrate", (vector_length, n_models, n_probes, bins, seed, processes))
+
+        case "unpack":
             if argc != 3:
-                return ("die", (f"Error: The command \"random_input\" takes 1 argument, {argc-2} given."))
+                return ("die", (f"Error: The command \"unpack\" takes 1 argument, {argc-2} given."))
+
+            return ("unpack", (argv[2]))
+
+        case "random_input":
+            if argc < 3 or argc > 4:
+                return ("die", (f"Error: The command \"random_input\" takes 1 or 2 arguments, {argc-2} given."))
 
             try:
                 vector_length = int(argv[2])
             except ValueError:
                 return ("die", ("Error: Argument vector_length needs to be an integer"))
 
-            return ("random_input", (vector_length))
+            if argc == 4:
+                try:
+                    seed = int(argv[3])
+                except ValueError:
+                    return ("die", ("Error: If seed is specified, it needs to be an integer"))
+            else:
+                seed = None
+
+            return ("random_input", (vector_length, seed))
 
         case "help":
             return("usage", ())
@@ -83,6 +177,67 @@ def parse_cli_args(argv:list[str]) -> tuple[str, tuple]:
         case _:
             return ("die", ("Error: unrecognized command \"" + command_str + "\""))
 
+def parse_test_pattern_args(command_str:str, args:list[str]) -> tuple[str, tuple]:
+    '''
+    Parses the arguments `<vector_length> [n_test_cases] [verification] [seed] [processes]`
+    shared by the commands that produce test patterns.
+
+    :param command_str: The command the arguments belong to, returned as command on success
+    :param args: The arguments following the command (at most five)
+    :return: A tuple of the command and a tuple of arguments, or of "die" and an error message
+    '''
+
+    try:
+        vector_length = int(args[0])
+    except ValueError:
+        return ("die", ("Error: Argument vector_length needs to be an integer"))
+
+    if len(args) >= 2:
+        try:
+            n_test_cases = int(args[1])
+        except ValueError:
+            return ("die", ("Error: If N_test_cases is spedified, it needs to be an integer, otherwise, 10 will be used as default value."))
+    else:
+        n_test_cases = 10
+
+    verification = "full"
+    spot_checks = 16
+
+    if len(args) >= 3:
+        (verification, _, spot_checks_str) = args[2].partition(":")
+
+        if verification not in VERIFICATION_MODES:
+            return ("die", (f"Error: Argument verification needs to be one of {', '.join(VERIFICATION_MODES)}"))
+
+        if spot_checks_str != "":
+            if verification != "spot":
+                return ("die", ("Error: Only the verification mode \"spot\" takes a number of offsets, e.g. \"spot:16\""))
+            try:
+                spot_checks = int(spot_checks_str)
+            except ValueError:
+                return ("die", ("Error: The number of offsets for verification mode \"spot\" needs to be an integer"))
+
+    seed = None
+
+    if len(args) >= 4:
+        try:
+            seed = int(args[3])
+        except ValueError:
+            return ("die", ("Error: If seed is specified, it needs to be an integer"))
+
+    processes = 1
+
+    if len(args) >= 5:
+        try:
+            processes = int(args[4])
+        except ValueError:
+            return ("die", ("Error: If processes is specified, it needs to be an integer"))
+
+        if processes < 1:
+            return ("die", ("Error: Argument processes needs to be at least 1"))
+
+    return (command_str, (vector_length, n_test_cases, verification, spot_checks, seed, processes))
+
 
 if __name__ == '__main__':
     (command, args) = parse_cli_args(sys.argv)
@@ -99,8 +254,38 @@ if __name__ == '__main__':
             testcase = TestPattern(*args)
             stdout.write(str(testcase))
             stdout.write('\n')
+        case "test_pattern_stream":
+            for record in PatternBatch.stream(*args):
+                stdout.write(json.dumps(record))
+                stdout.write('\n')
+                stdout.flush()
+        case "test_pattern_binary":
+            (output_file, n, m, verification, spot_checks, seed, processes) = args
+            batch = PatternBatch.generate(n, m, seed, processes)
+            report = batch.verify(verification, spot_checks)
+            PatternFile.write(output_file, batch, report)
+        case "test_pattern_2d":
+            (height, width, m, max_shift, seed) = args
+            batch = PatternBatch2D.generate(height, width, m, seed)
+            stdout.write(json.dumps({**batch.to_dict(max_shift), 'seed': batch.seed}))
+            stdout.write('\n')
+        case "test_pairs":
+            (n, k, m, seed, processes) = args
+            pairs = PairBatch.generate(n, k, m, seed=seed, processes=processes)
+            stdout.write(str(pairs))
+            stdout.write('\n')
+        case "calibrate":
+            (n, k, m, bins, seed, processes) = args
+            captures = PairBatch.generate(n, k, m, impostor_fraction=0, seed=seed, processes=processes)
+            histogram = ScoreHistogram.evaluate(Gallery.from_models(captures.models), captures.probes, captures.sources, bins, processes)
+            stdout.write(json.dumps({**histogram.to_dict(), 'seed': captures.seed}))
+            stdout.write('\n')
+        case "unpack":
+            pattern = PatternFile(args)
+            stdout.write(json.dumps(pattern.to_dict()))
+            stdout.write('\n')
         case "random_input":
-            myinput = CircuitInput(args)
+            myinput = CircuitInput(*args)
             stdout.write(str(myinput))
             stdout.write('\n')
 